@@ -2,22 +2,35 @@ from ..node import Node
 import pandas as pd
 import logging
 
+def with_streams(df,streams):
+    # a Stream column for tables of multi stream workflows, one row per item
+    if any(s is not None for s in streams):
+        df.insert(0,"Stream",streams)
+    return df
+
 class ClassCounter(Node):
     def __init__(self, name, keys):
         Node.__init__(self,name)
         self._keys = keys
+        # rows of all the runs, sunk as one table once closed
+        self._table = []
+        self._streams = []
 
     def run(self):
-        table = []
         logging.info(f"Running {self.name} for {self._keys}")
         while self.more():
             logging.info(f"New item for {self.name}")
             item = self.get()
+            self._streams.append(item.stream)
             row = [item.timestamp,item.framestamp]
             for k in self._keys:
                 row.append(item.count_of(k))
-            table.append(row)
-        df = pd.DataFrame(table,columns=["Timestamp","Frame_Order"]+self._keys)
+            self._table.append(row)
+        # fed a few frames at a time by a streaming run until closed
+        if self.partial:
+            return
+        df = with_streams(pd.DataFrame(self._table,columns=["Timestamp","Frame_Order"]+self._keys),self._streams)
+        self._table, self._streams = [], []
         logging.info(f"\n{df}")
         self.sink(df)
 
@@ -26,22 +39,31 @@ class MissingClassCounter(Node):
         Node.__init__(self,name)
         self._keys = keys
         self._maxes = maxes
+        self._table = []
+        self._streams = []
 
     def run(self):
-        table = []
         logging.info(f"Running {self.name} for {self._keys}")
         while self.more():
             logging.info(f"New item for {self.name}")
             item = self.get()
+            self._streams.append(item.stream)
             row = [item.timestamp,item.framestamp]
             for k in self._keys:
                 row.append(max(0,self._maxes[k] - item.count_of(k)))
-            table.append(row)
-        df = pd.DataFrame(table,columns=["Timestamp","Frame_Order"]+self._keys)
+            self._table.append(row)
+        # fed a few frames at a time by a streaming run until closed
+        if self.partial:
+            return
+        df = with_streams(pd.DataFrame(self._table,columns=["Timestamp","Frame_Order"]+self._keys),self._streams)
+        self._table, self._streams = [], []
         logging.info(f"\n{df}")
         self.sink(df)
 
 class ClasstMonitor(Node):
+    stream_state = ("_triggered_once","_trigger_count","_to_miss_counter",
+        "_status","_current_sequence","_buffer")
+
     def __init__(self, name, object_name, min_to_trigger_in, min_to_trigger_out):
         Node.__init__(self,name)
         self._object_name = object_name
@@ -111,16 +133,19 @@ class ClasstMonitor(Node):
         while self.more():
             logging.info(f"New item for {self._name}")
             item = self.get()
-
+            self.switch_stream(item.stream)
             self.process(item)
             
         # if the node is opened by upstream node, then
         # don't sink the current sequence yet
         logging.info(f"Node open? {self._continue }. Current sequence length {len(self._current_sequence)}")
-        if not self._continue and len(self._current_sequence) > 0:
-            logging.info("Stream closed. Flushing current sequence")
-            self.sink(self._current_sequence)
-            self._current_sequence = []
+        if not self._continue:
+            for stream in self.streams():
+                self.switch_stream(stream)
+                if len(self._current_sequence) > 0:
+                    logging.info("Stream closed. Flushing current sequence")
+                    self.sink(self._current_sequence)
+                    self._current_sequence = []
 
 class LeakyClasstMonitor(ClasstMonitor):
     def __init__(self, name, object_name, min_to_trigger_in, min_to_trigger_out):
@@ -5,15 +5,20 @@ import logging
 class PointCounter(Node):
     def __init__(self, name):
         Node.__init__(self,name)
+        # rows of all the runs, sunk as one table once closed
+        self._table = []
 
     def run(self):
-        table = []
         logging.info(f"Running {self.name}")
         while self.more():
             logging.info(f"New item for {self.name}")
             item = self.get()
             row = [item.timestamp,item.framestamp,item.count]
-            table.append(row)
-        df = pd.DataFrame(table,columns=["Timestamp","Frame_Order","Count"])
+            self._table.append(row)
+        # fed a few frames at a time by a streaming run until closed
+        if self.partial:
+            return
+        df = pd.DataFrame(self._table,columns=["Timestamp","Frame_Order","Count"])
+        self._table = []
         logging.info(f"\n{df}")
         self.sink(df)
\ No newline at end of file
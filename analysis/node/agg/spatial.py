@@ -1,11 +1,25 @@
 from ..node import Node
-from PIL import ImageDraw, Image
+from ..zones import ZoneEngine
+from .object import with_streams
 import numpy as np
 import logging
 import pandas as pd
 
+def zone_rows(engine,item,keys):
+    """
+    zones x (2 + keys) rows of the timestamp, framestamp and counts of
+    every key in every zone of engine
+    """
+    counts = engine.counts(item.boxes,item.class_ids,len(item.labels))
+    ids = np.array([item.label_id(k) for k in keys],dtype=np.intp)
+    rows = np.zeros((engine.count,len(keys)+2))
+    rows[:,:2] = [item.timestamp,item.framestamp]
+    # keys the model doesn't have are never counted
+    rows[:,2:] = np.where(ids >= 0,counts[:,ids],0)
+    return rows
+
 class ZoneCounter(Node):
-    def __init__(self, name,points,keys):
+    def __init__(self, name,points,keys,anchor="corners"):
         Node.__init__(self,name)
 
         if type(points) == str:
@@ -14,83 +28,44 @@ class ZoneCounter(Node):
         
         logging.info(f"Creating zone counter around {points} with keys {keys}")
         self._points = points
-        self._mask = None
+        self._engine = ZoneEngine([points],anchor)
         self._keys = keys
         # +2 for Timestamp,Frame_Order
         self._len = len(keys)+2
-        self._keys_index = {k:i+2 for i,k in enumerate(self._keys)}
-        self._initilized = False
+        # rows of all the runs, sunk as one table once closed
+        self._table = []
+        self._streams = []
     
     def initialize(self,width,height):
-        self._mask = Image.new("L", (width, height), 0)
-        ImageDraw.Draw(self._mask).polygon(
-            [tuple(x) for x in self._points], outline=1, fill=1
-        )
-        self._mask = np.array(self._mask).astype(bool)
-        self._width, self._height = width, height
-        self._initilized = True
-
-    def translate_pixel(self, x, y):
-        return int(x * self._width), int(y * self._height)
+        # no-op unless the frame size changed
+        self._engine.rasterize(width,height)
 
     def run(self):
         # expecting items of type FalcoeyeDetction
         logging.info(f"Running {self.name}")
-        c = lambda x, y: self._mask[y, x]
-        table = []
         while self.more():
             item = self.get()
-            
-            # TODO: assert different size, and try to remove somehow
-            if not self._initilized:
-                # assuming object with Falcoeye wrapper
-                height, width,_ = item.size
-                self.initialize(width,height)
-            
-            row = np.zeros(self._len)
-            row[:2] = [item.timestamp,item.framestamp]
-            n = item.count
-            for i in range(n):
-                xmin, ymin, xmax, ymax = item.get_box(i)
-                xmin, ymin = self.translate_pixel(xmin * 0.9999, ymin * 0.9999)
-                xmax, ymax = self.translate_pixel(xmax * 0.9999, ymax * 0.9999)
-                if (c(xmin, ymin) or c(xmin, ymax) or c(xmax, ymin) or c(xmax, ymax)):
-                    cl = item.get_class(i)
-                    if cl in self._keys:
-                        row[self._keys_index[cl]] += 1
-            table.append(row)
-
-        df = pd.DataFrame(table,columns=["Timestamp","Frame_Order"]+self._keys)
+            self._table.append(self.run_once(item))
+            self._streams.append(item.stream)
+        # fed a few frames at a time by a streaming run until closed
+        if self.partial:
+            return
+        df = pd.DataFrame(self._table,columns=["Timestamp","Frame_Order"]+self._keys)
+        with_streams(df,self._streams)
+        self._table, self._streams = [], []
         logging.info(f"\n{df}")
         self.sink(df)
 
     def run_once(self,item):
         # expecting items of type FalcoeyeDetction
         logging.info(f"Running {self.name}")
-        # TODO: move this for god sake
-        c = lambda x, y: self._mask[y, x]    
-        # TODO: assert different size, and try to remove somehow
-        if not self._initilized:
-            # assuming object with Falcoeye wrapper
-            height, width,_ = item.size
-            logging.info(f"Initializing {self._name} with {width}X{height}")
-            self.initialize(width,height)
-
-        row = np.zeros(self._len)
-        row[:2] = [item.timestamp,item.framestamp]
-        n = item.count
-        for i in range(n):
-            xmin, ymin, xmax, ymax = item.get_box(i)
-            xmin, ymin = self.translate_pixel(xmin * 0.9999, ymin * 0.9999)
-            xmax, ymax = self.translate_pixel(xmax * 0.9999, ymax * 0.9999)
-            if (c(xmin, ymin) or c(xmin, ymax) or c(xmax, ymin) or c(xmax, ymax)):
-                cl = item.get_class(i)
-                if cl in self._keys:
-                    row[self._keys_index[cl]] += 1
-        return row
+        # assuming object with Falcoeye wrapper
+        height, width,_ = item.size
+        self.initialize(width,height)
+        return zone_rows(self._engine,item,self._keys)[0]
 
 class ZonesCounter(Node):
-    def __init__(self, name,zones,keys):
+    def __init__(self, name,zones,keys,anchor="corners"):
         Node.__init__(self,name)
         self._zones = []
         self._keys = keys
@@ -100,20 +75,30 @@ class ZonesCounter(Node):
                 name,points = zs.split(":")
                 points = points.split(",")
                 points = [[int(points[i]),int(points[i+1])] for i in range(0,len(points),2)]
-                self._zones.append(ZoneCounter(name,points,keys))
+                self._zones.append((name,points))
+        # all zones are looked up at once
+        self._engine = ZoneEngine([points for _,points in self._zones],anchor)
+        # rows of all the runs, sunk as one table once closed
+        self._rows = []
+        self._row_zones = []
+        self._streams = []
 
     def run(self):
         # expecting items of type FalcoeyeDetction
         logging.info(f"Running {self.name}")
-        data = []
-        zones = []
         while self.more():
             item = self.get()
-            for z in self._zones:
-                data.append(z.run_once(item))
-                zones.append(z.name)
-        if len(data) > 0:
+            height, width,_ = item.size
+            self._engine.rasterize(width,height)
+            self._rows.extend(zone_rows(self._engine,item,self._keys))
+            self._row_zones.extend(name for name,_ in self._zones)
+            self._streams.extend([item.stream]*len(self._zones))
+        # fed a few frames at a time by a streaming run until closed
+        if self.partial:
+            return
+        if len(self._rows) > 0:
             df = pd.DataFrame()
-            df["Zone"] = zones
-            df[["Timestamp","Frame_Order"]+self._keys] = data
-            self.sink(df)
\ No newline at end of file
+            df["Zone"] = self._row_zones
+            df[["Timestamp","Frame_Order"]+self._keys] = self._rows
+            self.sink(with_streams(df,self._streams))
+        self._rows, self._row_zones, self._streams = [], [], []
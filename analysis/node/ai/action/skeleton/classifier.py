@@ -12,6 +12,7 @@ import pickle
 from collections import deque
 import cv2
 from ...wrapper import FalcoeyeAIWrapper
+from ....buffers import pooled_copy
 from .feature_procs import FeatureGenerator
 import logging
 LABEL_UNKNOWN = ['', 0]
@@ -47,7 +48,7 @@ class PersonActionItem(FalcoeyeAIWrapper):
             y_text = ymax - 2
             return xmax, ymax, y_text
         
-        frame = self.frame.copy()
+        frame = pooled_copy(self.frame)
         for index,hid in enumerate(ids):
             track_label = f'{hid} {self._actions[index][0]}'
             x1, y1, x2, y2 = self._tracker.get_box(index).astype(np.int16)
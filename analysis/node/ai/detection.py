@@ -3,87 +3,115 @@ from ..node import Node
 import json
 import logging
 import numpy as np
-from .utils import get_color_from_number,non_max_suppression
+import sys
+from .utils import non_max_suppression
 from PIL import ImageDraw, Image
 from .wrapper import FalcoeyeAIWrapper
+from ..buffers import pooled_copy
 import cv2
 
 class FalcoeyeDetection(FalcoeyeAIWrapper):
-    def __init__(self,frame,detections, category_map,width_height=False):
-        FalcoeyeAIWrapper.__init__(self,frame)
-        self._detections = detections
-        self._category_map = {c:len(v) for c,v in category_map.items()}
+    """
+    Detections of a frame in columns: boxes (N x 4 float32, x1,y1,x2,y2),
+    scores, and class ids indexing labels, the label table of the model
+    shared by all its detections
+    """
+    __slots__ = ("_boxes","_scores","_class_ids","_labels")
 
-        self._boxes = [d["box"] for d in self._detections]
-        self._classes = [d["class"] for d in self._detections]
+    def __init__(self,frame,boxes,scores,class_ids,labels):
+        FalcoeyeAIWrapper.__init__(self,frame)
+        self._boxes = np.asarray(boxes,dtype=np.float32).reshape(-1,4)
+        self._scores = np.asarray(scores,dtype=np.float32)
+        self._class_ids = np.asarray(class_ids,dtype=np.intp)
+        self._labels = labels
 
     @property
     def count(self):
-        return len(self._detections)
+        return len(self._class_ids)
     
     @property
     def boxes(self):
         return self._boxes
 
+    @property
+    def scores(self):
+        return self._scores
+
+    @property
+    def class_ids(self):
+        return self._class_ids
+
+    @property
+    def labels(self):
+        return self._labels
+
     @property
     def classes(self):
-        return self._classes
+        return [self._labels[c] for c in self._class_ids]
+
+    @property
+    def counts(self):
+        # number of detections of every label, in the order of labels
+        return np.bincount(self._class_ids,minlength=len(self._labels))
 
     def translate_pixel(self, x, y):
         height,width,_ = self.size
         return int(x * width), int(y * height)
 
     def iwidth(self,i):
-        return np.abs(self._boxes[i][0]-self._boxes[i][2])
+        return np.abs(self._boxes[i,0]-self._boxes[i,2])
     
     def iheight(self,i):
-        return np.abs(self._boxes[i][1]-self._boxes[i][3])
+        return np.abs(self._boxes[i,1]-self._boxes[i,3])
+
+    def label_id(self,name):
+        # -1 for labels the model doesn't have
+        return self._labels.index(name) if name in self._labels else -1
 
     def count_of(self, category):
-        if category in self._category_map:
-            return self._category_map[category]
-        return -1
+        c = self.label_id(category)
+        if c < 0:
+            return -1
+        return int(np.count_nonzero(self._class_ids == c))
 
     def get_class_instances(self, name):
-        return [i for i, d in enumerate(self._detections) if d["class"] == name]
+        return np.flatnonzero(self._class_ids == self.label_id(name)).tolist()
 
     def get_class(self, i):
-        return self._detections[i]["class"]
+        return self._labels[self._class_ids[i]]
 
     def get_box(self, i):
-        return self._detections[i]["box"]
+        return self._boxes[i]
+
+    def keep_mask(self,mask):
+        # keeps the detections where mask is True
+        self._boxes = self._boxes[mask]
+        self._scores = self._scores[mask]
+        self._class_ids = self._class_ids[mask]
 
     def keep_only(self,keys,inplace=True):
-        # TODO: maybe optimize in one loop 
         if inplace:
-            n = self.count
-            index = 0
-            for _ in range(n):
-                cl = self.get_class(index)
-                if cl not in keys:
-                    self.delete(index)
-                else:
-                    # when deleting, no index increament due to shift in array
-                    index += 1
+            ids = [self.label_id(k) for k in keys]
+            self.keep_mask(np.isin(self._class_ids,ids))
         else:
             raise NotImplementedError
     
     def delete(self,index):
-        item = self._detections.pop(index)
-        self._category_map[item["class"]] -= 1
-        self._boxes.pop(index)
-        self._classes.pop(index)
+        # an index or a list of indices
+        mask = np.ones(self.count,dtype=bool)
+        mask[index] = False
+        self.keep_mask(mask)
     
     def blend(self,image,alpha=0.5,inplace=True):
         return self._frame.blend(image,alpha,inplace)
 
     def draw_bounding_box(self,index,color,inplace=True,translate=True):
+        self.draw_bounding_boxes([index],[color],inplace,translate)
+
+    def draw_bounding_boxes(self,indices,colors,inplace=True,translate=True):
+        # all the boxes go on one copy of the frame
         if inplace:
-            xmin, ymin, xmax, ymax = self.get_box(index)
-            if translate:
-                xmin, ymin = self.translate_pixel(xmin * 0.9999, ymin * 0.9999)
-                xmax, ymax = self.translate_pixel(xmax * 0.9999, ymax * 0.9999)
-            img = self._frame.frame.copy()
+            img = pooled_copy(self._frame.frame)
             thickness = 2
             scale = 0.6 
             font = cv2.FONT_HERSHEY_COMPLEX
@@ -95,12 +123,17 @@ class FalcoeyeDetection(FalcoeyeAIWrapper):
                 y_text = ymax - 2
                 return xmax, ymax, y_text
             
-            label = self.get_class(index)
-            x1, y1, x2, y2 = int(xmin), int(ymin), int(xmax), int(ymax)
-            cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness)
-            label_loc = get_label_position(label)
-            cv2.putText(img, label, (x1+1, label_loc[2]), font,
-                    scale,(0, 0, 0), thickness)
+            for index,color in zip(indices,colors):
+                xmin, ymin, xmax, ymax = self.get_box(index)
+                if translate:
+                    xmin, ymin = self.translate_pixel(xmin * 0.9999, ymin * 0.9999)
+                    xmax, ymax = self.translate_pixel(xmax * 0.9999, ymax * 0.9999)
+                label = self.get_class(index)
+                x1, y1, x2, y2 = int(xmin), int(ymin), int(xmax), int(ymax)
+                cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness)
+                label_loc = get_label_position(label)
+                cv2.putText(img, label, (x1+1, label_loc[2]), font,
+                        scale,(0, 0, 0), thickness)
             self._frame.set_frame(img)
         else:
             raise NotImplementedError
@@ -130,20 +163,52 @@ class FalcoeyeDetectionNode(Node):
                 self._category_index = {int(k):v for k,v in json.load(f).items()}
         elif type(labelmap) == dict:
             self._category_index = {int(k):v for k,v in labelmap.items()}
+        # labels by their position, the class ids of the detections
+        self._labels = tuple(dict.fromkeys(
+            [sys.intern(str(v)) for v in self._category_index.values()] + ["unknown"]))
+        # label position of every model class, unknown for the others
+        unknown = self._labels.index("unknown")
+        self._label_of = np.full(max(self._category_index,default=-1) + 1,unknown,dtype=np.intp)
+        for k,v in self._category_index.items():
+            if k >= 0:
+                self._label_of[k] = self._labels.index(str(v))
     
+    # no state carried between frames, can be fused with its neighbours
+    stateless = True
+
     def translate(self):
         raise NotImplementedError
     
     def run(self):
+        logging.info(f"Running {self.name}")
+        while self.more():
+            fe_detection = self.run_on(self.get())
+            if fe_detection is not None:
+                self.sink(fe_detection)
+
+    def run_on(self,item):
         raise NotImplementedError
     
+    def label_ids(self,classes):
+        classes = np.asarray(classes).astype(np.intp)
+        known = (classes >= 0) & (classes < len(self._label_of))
+        ids = np.full(len(classes),self._labels.index("unknown"),dtype=np.intp)
+        ids[known] = self._label_of[classes[known]]
+        return ids
+
+    def no_detections(self):
+        return np.empty((0,4),dtype=np.float32),np.empty(0,dtype=np.float32),np.empty(0,dtype=np.intp)
+
     def finalize(self,boxes,classes,scores):
-        _detections = []
-        _category_map = {k:[] for k in self._category_index.values()}
-        _category_map["unknown"] = []
-        # TODO: can be optimized with nms suppresion
-        conf_mask = np.where(scores>self._min_score_thresh)
-        logging.info(f"Conf mask {conf_mask[0].shape} min score thresh {self._min_score_thresh} score min {scores.min()}")
+        """
+        Boxes, scores and label ids of the detections scoring more than
+        min_score_thresh left by the non-max suppression
+        """
+        boxes = np.asarray(boxes).reshape(-1,4)
+        classes = np.asarray(classes).reshape(-1)
+        scores = np.asarray(scores).reshape(-1)
+        conf_mask = scores>self._min_score_thresh
+        logging.info(f"Conf mask {np.count_nonzero(conf_mask)} min score thresh {self._min_score_thresh}")
         boxes = boxes[conf_mask]
         classes = classes[conf_mask]
         scores = scores[conf_mask]
@@ -154,24 +219,10 @@ class FalcoeyeDetectionNode(Node):
                 boxes,scores,self._overlap_thresh
             )
         else:
-            nms_picks = range(boxes.shape[0])
+            nms_picks = np.arange(boxes.shape[0])
         logging.info(f"Number of items after non-max suppression is {len(nms_picks)}")
-        for counter,p in enumerate(nms_picks):
-            if classes[p] in self._category_index:
-                class_name = str(self._category_index[classes[p]])
-            else:
-                class_name = "unknown"
-            color = get_color_from_number(int(classes[p]))
-            _detections.append(
-                {
-                    "box": tuple(boxes[p].tolist()),
-                    "color": color,
-                    "class": class_name,
-                    "score": round(scores[p], 2) * 100,
-                }
-            )
-            _category_map[class_name].append(counter)
-        return _detections, _category_map
+        nms_picks = np.asarray(nms_picks,dtype=np.intp)
+        return boxes[nms_picks],scores[nms_picks],self.label_ids(classes[nms_picks])
 
 class FalcoeyeTFDetectionNode(FalcoeyeDetectionNode):
     def __init__(self, name, 
@@ -188,9 +239,9 @@ class FalcoeyeTFDetectionNode(FalcoeyeDetectionNode):
     def translate(self,detections):
         logging.info("Translating detection")
         if detections is None or type(detections) != dict or "detection_boxes" not in detections:
-            return _detections, _category_map
+            return self.no_detections()
         
-        boxes = np.array(detections["detection_boxes"])
+        boxes = np.array(detections["detection_boxes"]).reshape(-1,4)
         # y1,x1,y2,x2 --> x1, y1, x2, y2
         boxes = boxes[:,[1,0,3,2]]
         classes = np.array(detections["detection_classes"]).astype(int)
@@ -200,41 +251,36 @@ class FalcoeyeTFDetectionNode(FalcoeyeDetectionNode):
         return self.finalize(boxes,classes,scores)
         
        
-    def run(self):
+    def run_on(self,item):
         """
         Safe node: the input is assumed to be valid or can be handled properly, no need to catch
         """
-        logging.info(f"Running falcoeye detection")
-        while self.more():
-            item = self.get()
-
-            frame,raw_detections = item
-            try:
-                if type(raw_detections) == dict and "prediction" in raw_detections:
-                    # restful
-                    raw_detections = raw_detections['predictions'][0]
-                elif raw_detections is None:
-                    # TODO: should do failover
-                    raw_detections = {'detection_boxes': np.array([]),
-                    'detection_classes':np.array([]),
-                    'detection_scores': np.array([])}
-                else:
-                    # gRPC response
-                    logging.info("gRPC detection")
-                    boxes = np.array(raw_detections.outputs['detection_boxes'].float_val).reshape((-1,4)).tolist()
-                    classes = raw_detections.outputs['detection_classes'].float_val
-                    scores = raw_detections.outputs['detection_scores'].float_val
-                    raw_detections = {'detection_boxes': boxes,
-                        'detection_classes':classes,
-                        'detection_scores': scores}
-                
-                logging.info(f"New frame for falcoeye detection  {frame.framestamp} {frame.timestamp}")
-                detections, category_map = self.translate(raw_detections)
-                fe_detection = FalcoeyeDetection(frame,detections, 
-                        category_map)
-                self.sink(fe_detection)
-            except Exception as e:
-                logging.error(e)
+        frame,raw_detections = item
+        try:
+            if type(raw_detections) == dict and "prediction" in raw_detections:
+                # restful
+                raw_detections = raw_detections['predictions'][0]
+            elif raw_detections is None:
+                # TODO: should do failover
+                raw_detections = {'detection_boxes': np.array([]),
+                'detection_classes':np.array([]),
+                'detection_scores': np.array([])}
+            else:
+                # gRPC response
+                logging.info("gRPC detection")
+                boxes = np.array(raw_detections.outputs['detection_boxes'].float_val).reshape((-1,4)).tolist()
+                classes = raw_detections.outputs['detection_classes'].float_val
+                scores = raw_detections.outputs['detection_scores'].float_val
+                raw_detections = {'detection_boxes': boxes,
+                    'detection_classes':classes,
+                    'detection_scores': scores}
+            
+            logging.info(f"New frame for falcoeye detection  {frame.framestamp} {frame.timestamp}")
+            boxes, scores, class_ids = self.translate(raw_detections)
+            return FalcoeyeDetection(frame,boxes,scores,class_ids,self._labels)
+        except Exception as e:
+            logging.error(e)
+            return None
     
 class FalcoeyeTorchDetectionNode(FalcoeyeDetectionNode):
     def __init__(self, name, 
@@ -261,31 +307,27 @@ class FalcoeyeTorchDetectionNode(FalcoeyeDetectionNode):
         classes = detections[..., 5]
         return self.finalize(bboxes,classes,scores)
         
-    def run(self):
+    def run_on(self,item):
         """
         Safe node: the input is assumed to be valid or can be handled properly, no need to catch
         """
-        logging.info(f"Running falcoeye detection")
-        while self.more():
-            item = self.get()
-            frame,raw_detections = item
-            try:
-                if type(raw_detections) == bytes:
-                    raw_detections = np.frombuffer(raw_detections,dtype=np.float32).reshape(-1,6)
-                elif type(detections) == list:
-                    raw_detections = np.array(raw_detections)
-                else:
-                    # Acting safe
-                    raw_detections = {'detection_boxes': np.array([]),
-                            'detection_classes':np.array([]),
-                            'detection_scores': np.array([])}
-                
-                detections, category_map = self.translate(raw_detections)
-                fe_detection = FalcoeyeDetection(frame,detections, 
-                            category_map)
-                self.sink(fe_detection)
-            except Exception as e:
-                logging.error(e)
+        frame,raw_detections = item
+        try:
+            if type(raw_detections) == bytes:
+                raw_detections = np.frombuffer(raw_detections,dtype=np.float32).reshape(-1,6)
+            elif type(detections) == list:
+                raw_detections = np.array(raw_detections)
+            else:
+                # Acting safe
+                raw_detections = {'detection_boxes': np.array([]),
+                        'detection_classes':np.array([]),
+                        'detection_scores': np.array([])}
+            
+            boxes, scores, class_ids = self.translate(raw_detections)
+            return FalcoeyeDetection(frame,boxes,scores,class_ids,self._labels)
+        except Exception as e:
+            logging.error(e)
+            return None
 
 class FalcoeyeTritonDetectionNode(FalcoeyeDetectionNode):
     def __init__(self, name, 
@@ -305,7 +347,7 @@ class FalcoeyeTritonDetectionNode(FalcoeyeDetectionNode):
         
         if detections is None or not isinstance(detections, dict):
             logging.warning(f"Invalid detection format received: {type(detections)}")
-            return [], {k:[] for k in self._category_index.values()}
+            return self.no_detections()
         
         try:
             # Get the number of detections (should be a scalar)
@@ -322,45 +364,42 @@ class FalcoeyeTritonDetectionNode(FalcoeyeDetectionNode):
         except Exception as e:
             logging.error(f"Error processing detections: {str(e)}")
             traceback.print_exc()  # Add stack trace for debugging
-            return [], {k:[] for k in self._category_index.values()}
+            return self.no_detections()
     
-    def run(self):
+    def run_on(self, item):
         """
         Processes detection results from Triton server output
         """
-        logging.info("Running Triton detection node")
-        while self.more():
-            item = self.get()
-            frame, raw_detections = item
+        frame, raw_detections = item
+        
+        try:
+            # Handle different input formats
+            if isinstance(raw_detections, dict) and "outputs" in raw_detections:
+                # Handle gRPC response format
+                detections = {
+                    "num_dets": np.array(raw_detections.outputs["num_dets"].as_numpy()),
+                    "det_boxes": np.array(raw_detections.outputs["det_boxes"].as_numpy()),
+                    "det_scores": np.array(raw_detections.outputs["det_scores"].as_numpy()),
+                    "det_classes": np.array(raw_detections.outputs["det_classes"].as_numpy())
+                }
+            elif isinstance(raw_detections, dict) and all(key in raw_detections for key in ["num_dets", "det_boxes", "det_scores", "det_classes"]):
+                # Already in the correct format
+                detections = raw_detections
+            else:
+                # Handle invalid input
+                logging.warning(f"Invalid detection format received: {type(raw_detections)}")
+                detections = {
+                    "num_dets": np.array([0]),
+                    "det_boxes": np.array([]),
+                    "det_scores": np.array([]),
+                    "det_classes": np.array([])
+                }
             
-            try:
-                # Handle different input formats
-                if isinstance(raw_detections, dict) and "outputs" in raw_detections:
-                    # Handle gRPC response format
-                    detections = {
-                        "num_dets": np.array(raw_detections.outputs["num_dets"].as_numpy()),
-                        "det_boxes": np.array(raw_detections.outputs["det_boxes"].as_numpy()),
-                        "det_scores": np.array(raw_detections.outputs["det_scores"].as_numpy()),
-                        "det_classes": np.array(raw_detections.outputs["det_classes"].as_numpy())
-                    }
-                elif isinstance(raw_detections, dict) and all(key in raw_detections for key in ["num_dets", "det_boxes", "det_scores", "det_classes"]):
-                    # Already in the correct format
-                    detections = raw_detections
-                else:
-                    # Handle invalid input
-                    logging.warning(f"Invalid detection format received: {type(raw_detections)}")
-                    detections = {
-                        "num_dets": np.array([0]),
-                        "det_boxes": np.array([]),
-                        "det_scores": np.array([]),
-                        "det_classes": np.array([])
-                    }
-                
-                logging.info(f"Processing frame for Triton detection: {frame.framestamp} {frame.timestamp}")
-                detections, category_map = self.translate(detections)
-                fe_detection = FalcoeyeDetection(frame, detections, category_map)
-                self.sink(fe_detection)
-                
-            except Exception as e:
-                logging.error(f"Error processing Triton detection: {str(e)}")
-                continue
\ No newline at end of file
+            logging.info(f"Processing frame for Triton detection: {frame.framestamp} {frame.timestamp}")
+            boxes, scores, class_ids = self.translate(detections)
+            fe_detection = FalcoeyeDetection(frame, boxes, scores, class_ids, self._labels)
+            return fe_detection
+            
+        except Exception as e:
+            logging.error(f"Error processing Triton detection: {str(e)}")
+            return None
\ No newline at end of file
@@ -110,6 +110,12 @@ class FalcoeyeOpenPoseHPE(FalcoeyeAIWrapper):
             self._frame.set_frame(draw(BODY_CONFIG, self._frame.frame,
                 self._coordinates, self._skeletons, resize_fac=8))
     
+    def keep_mask(self,mask):
+        keep = np.flatnonzero(mask)
+        self._skeletons = [self._skeletons[i] for i in keep]
+        self._boxes = [self._boxes[i] for i in keep]
+        self._keypoints = [self._keypoints[i] for i in keep]
+
     def delete(self,index):
         if type(index) == int:
             del self._skeletons[index]
@@ -146,6 +152,8 @@ class FalcoeyeHPENode(Node):
         raise NotImplementedError
 
 class FalcoeyeTFOpenPoseNode(FalcoeyeHPENode):
+    stateless = True
+
     def __init__(self, name,resize_factor=8):
         FalcoeyeHPENode.__init__(self,name)
         self._resize_factor = resize_factor
@@ -158,34 +166,38 @@ class FalcoeyeTFOpenPoseNode(FalcoeyeHPENode):
         """
         logging.info(f"Running TF OpenPose Node")
         while self.more():
-            item = self.get()
-
-            frame,raw_estimation = item
-            try:
-                if raw_estimation is None:
-                    # TODO: should do failover
-                    # since open pose has 3 max pooling layers, resize_fac = 8
-                    logging.warning(f"No pose estimation for frame {frame.framestamp}")
-                    heatmap = np.zeros((frame.size[0]//8,frame.size[1]//8,self._njoints))
-                    paf = np.zeros((frame.size[0]//8,frame.size[1]//8,self._nlimbs))
-                else:
-                    # gRPC response
-                    logging.info("gRPC detection")
-                    # [1:] for skipping batch axis, we assume 1 input
-                    paf_shape = raw_estimation.outputs['output_11'].tensor_shape.dim
-                    htm_shape = raw_estimation.outputs['output_12'].tensor_shape.dim
-                    #logging.info(f"frame {frame.framestamp} paf shape {paf_shape} htm shape {htm_shape}")
-                    paf_shape = tuple([i.size for i in list(paf_shape)][1:])
-                    htm_shape = tuple([i.size for i in list(htm_shape)][1:])
-                    #logging.info(f"frame {frame.framestamp} paf shape {paf_shape} htm shape {htm_shape}")
-                    paf = np.array(
-                        raw_estimation.outputs['output_11'].float_val,
-                        dtype=np.float32).reshape(paf_shape)
-                    heatmap = np.array(
-                        raw_estimation.outputs['output_12'].float_val,
-                        dtype=np.float32).reshape(htm_shape)
-                
-                ophpe = FalcoeyeOpenPoseHPE(frame,heatmap,paf,self._resize_factor)
+            ophpe = self.run_on(self.get())
+            if ophpe is not None:
                 self.sink(ophpe)
-            except Exception as e:
-                logging.exception(e)
+
+    def run_on(self,item):
+        frame,raw_estimation = item
+        try:
+            if raw_estimation is None:
+                # TODO: should do failover
+                # since open pose has 3 max pooling layers, resize_fac = 8
+                logging.warning(f"No pose estimation for frame {frame.framestamp}")
+                heatmap = np.zeros((frame.size[0]//8,frame.size[1]//8,self._njoints))
+                paf = np.zeros((frame.size[0]//8,frame.size[1]//8,self._nlimbs))
+            else:
+                # gRPC response
+                logging.info("gRPC detection")
+                # [1:] for skipping batch axis, we assume 1 input
+                paf_shape = raw_estimation.outputs['output_11'].tensor_shape.dim
+                htm_shape = raw_estimation.outputs['output_12'].tensor_shape.dim
+                #logging.info(f"frame {frame.framestamp} paf shape {paf_shape} htm shape {htm_shape}")
+                paf_shape = tuple([i.size for i in list(paf_shape)][1:])
+                htm_shape = tuple([i.size for i in list(htm_shape)][1:])
+                #logging.info(f"frame {frame.framestamp} paf shape {paf_shape} htm shape {htm_shape}")
+                paf = np.array(
+                    raw_estimation.outputs['output_11'].float_val,
+                    dtype=np.float32).reshape(paf_shape)
+                heatmap = np.array(
+                    raw_estimation.outputs['output_12'].float_val,
+                    dtype=np.float32).reshape(htm_shape)
+            
+            # the post processing (peaks, connections, poses) runs here
+            return FalcoeyeOpenPoseHPE(frame,heatmap,paf,self._resize_factor)
+        except Exception as e:
+            logging.exception(e)
+            return None
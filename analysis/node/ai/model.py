@@ -14,6 +14,27 @@ from tritonclient.utils import InferenceServerException
 from tritonclient.grpc import InferenceServerClient, InferInput, InferRequestedOutput
 
 
+def payload_bytes(payload):
+    """
+    Best effort size of a model request or response
+    """
+    if payload is None:
+        return 0
+    if isinstance(payload,np.ndarray):
+        return payload.nbytes
+    if isinstance(payload,(bytes,bytearray)):
+        return len(payload)
+    if isinstance(payload,dict):
+        return sum(payload_bytes(v) for v in payload.values())
+    if isinstance(payload,(list,tuple)):
+        return sum(payload_bytes(v) for v in payload)
+    if hasattr(payload,"get_response"):
+        # triton InferResult
+        payload = payload.get_response()
+    if hasattr(payload,"ByteSize"):
+        # protobuf messages
+        return payload.ByteSize()
+    return 0
 
 class Model(Node):
     
@@ -50,6 +71,14 @@ class Model(Node):
     def get_input_size(self):
         return self._input_size
 
+    def _record_rpc(self,request,response,error=None):
+        self._metrics.count("rpc_calls")
+        self._metrics.count("rpc_bytes_sent",payload_bytes(request))
+        if error is not None or response is None:
+            self._metrics.count("rpc_failures")
+        else:
+            self._metrics.count("rpc_bytes_received",payload_bytes(response))
+
     def run(self,session):
         if not self._is_ready:
             return
@@ -60,6 +89,7 @@ class Model(Node):
             
             logging.info(f"New frame to post to container {item.framestamp} {item.timestamp} {item.frame.shape}")
             raw_detections =  self._model_server.post(session,item.frame)
+            self._record_rpc(item.frame,raw_detections)
             logging.info(f"Prediction received {item.framestamp}")
             self.sink([item,raw_detections])
         
@@ -74,9 +104,12 @@ class Model(Node):
         try:
             logging.info(f"New frame to post to container {item.framestamp} {item.timestamp}")
             raw_detections =  await self._model_server.post_async(session,item.frame)
+            self._record_rpc(item.frame,raw_detections)
             logging.info(f"Prediction received {item.framestamp}")
             return [item,raw_detections]
         except Exception as e:
+            logging.error(f"{self._name} failed on frame {item.framestamp}: {e}")
+            self._record_rpc(item.frame,None,e)
             return None
 
     def run_on(self,item):
@@ -88,9 +121,12 @@ class Model(Node):
         try:
             logging.info(f"New frame to post to container {item.framestamp} {item.timestamp}")
             raw_detections =  self._model_server.post(item.frame)
+            self._record_rpc(item.frame,raw_detections)
             logging.info(f"Prediction received {item.framestamp}")
             return [item,raw_detections]
         except Exception as e:
+            logging.error(f"{self._name} failed on frame {item.framestamp}: {e}")
+            self._record_rpc(item.frame,None,e)
             return None
 
 class TFModel(Model):
@@ -145,7 +181,9 @@ class TorchModel(Model):
         
         if self._protocol == "gRPC":
             try:
-                self._initialize_grpc()
+                # run is called once per frame in streaming mode
+                if self._stub is None:
+                    self._initialize_grpc()
                 Model.run(self,self._stub)
 
             except Exception as e:
@@ -184,9 +222,11 @@ class TorchModel(Model):
                 raw_detections =  self._model_server.post(self._stub,
                     data,
                     as_image)
+                self._record_rpc(data,raw_detections)
                 return raw_detections
             except Exception as e:
                 logging.error(traceback.format_exc())
+                self._record_rpc(data,None,e)
                 return None
         else:
             raise NotImplementedError
@@ -251,6 +291,7 @@ class TritonModel(Model):
             
             # Run inference using model server
             results = self._model_server.post(client, inputs, outputs)
+            self._record_rpc(frame_data, results)
             if results is None:
                 return None
                 
@@ -265,6 +306,7 @@ class TritonModel(Model):
         except Exception as e:
             logging.error(f"Unexpected error during inference: {str(e)}")
             traceback.print_exc()
+            self._record_rpc(frame_data, None, e)
             return None
 
     def run(self):
@@ -297,6 +339,7 @@ class TritonModel(Model):
             
             # Get raw inference result
             raw_result = await self._model_server.post_async(client, inputs, outputs)
+            self._record_rpc(input_data, raw_result)
             
             if raw_result is None:
                 return None
@@ -319,6 +362,7 @@ class TritonModel(Model):
             
         except Exception as e:
             logging.error(f"Error in async processing: {str(e)}")
+            self._record_rpc(None, None, e)
             return None
 
     def run_on(self, item):
@@ -3,6 +3,8 @@ import pytesseract
 import logging
 
 class FalcoeyeOCRNode(Node):
+	stateless = True
+
 	def __init__(self, name, 
 	ocr_slice=None,
 	store_in="ocr"
@@ -23,11 +25,14 @@ class FalcoeyeOCRNode(Node):
 		logging.info(f"Running falcoeye ocr node")
 		while self.more():
 			ai_item = self.get()
-			frame = ai_item.frame
-			value = pytesseract.image_to_string(
-				frame[self._y1:self._y2,self._x1:self._x2])
-			# TODO: what if not FalcoeyeAIWrapper
-			ai_item.add_meta(self._store_in,value)
-			self.sink(ai_item)
+			self.sink(self.run_on(ai_item))
+
+	def run_on(self,ai_item):
+		frame = ai_item.frame
+		value = pytesseract.image_to_string(
+			frame[self._y1:self._y2,self._x1:self._x2])
+		# TODO: what if not FalcoeyeAIWrapper
+		ai_item.add_meta(self._store_in,value)
+		return ai_item
 
 	
\ No newline at end of file
@@ -117,6 +117,8 @@ class FalcoeyeSegmentationNode(Node):
         raise NotImplementedError
     
 class FalcoeyeTorchSegmentationNode(FalcoeyeSegmentationNode):
+    stateless = True
+
     def __init__(self, name, labelmap,ignore_value):
         FalcoeyeSegmentationNode.__init__(self,name, labelmap,ignore_value)
         
@@ -139,21 +141,25 @@ class FalcoeyeTorchSegmentationNode(FalcoeyeSegmentationNode):
         """
         logging.info(f"Running falcoeye segmentation")
         while self.more():
-            item = self.get()
-            frame,raw_segmentation = item
-            try:
-                if type(raw_segmentation) == bytes:
-                    raw_segmentation = np.frombuffer(raw_segmentation,dtype=np.float32)
-                    raw_segmentation = raw_segmentation.reshape((frame.size[0],frame.size[1]))
-                elif type(raw_segmentation) == list:
-                    raw_segmentation = np.array(raw_segmentation)
-                else:
-                    # Acting safe
-                    logging.warn("Couldn't parse the segmentation type. Returning zero array")
-                    raw_segmentation = np.zeros((frame.size[0],frame.size[1]))
-                
-                seg,ids,names,colors,rgbs = self.translate(raw_segmentation)
-                fe_segmentation = FalcoeyeSegmentation(frame,seg,ids,names,colors,rgbs,self._ignore_value)
+            fe_segmentation = self.run_on(self.get())
+            if fe_segmentation is not None:
                 self.sink(fe_segmentation)
-            except Exception as e:
-                logging.error(e)
+
+    def run_on(self,item):
+        frame,raw_segmentation = item
+        try:
+            if type(raw_segmentation) == bytes:
+                raw_segmentation = np.frombuffer(raw_segmentation,dtype=np.float32)
+                raw_segmentation = raw_segmentation.reshape((frame.size[0],frame.size[1]))
+            elif type(raw_segmentation) == list:
+                raw_segmentation = np.array(raw_segmentation)
+            else:
+                # Acting safe
+                logging.warn("Couldn't parse the segmentation type. Returning zero array")
+                raw_segmentation = np.zeros((frame.size[0],frame.size[1]))
+            
+            seg,ids,names,colors,rgbs = self.translate(raw_segmentation)
+            return FalcoeyeSegmentation(frame,seg,ids,names,colors,rgbs,self._ignore_value)
+        except Exception as e:
+            logging.error(e)
+            return None
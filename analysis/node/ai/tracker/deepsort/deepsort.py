@@ -3,6 +3,7 @@ import logging
 import numpy as np
 from ....node import Node
 from ...wrapper import FalcoeyeAIWrapper
+from ....buffers import pooled_copy
 from . import linear_assignment
 from . import iou_matching
 from . import kalman_filter
@@ -33,6 +34,10 @@ class TrackingItem(FalcoeyeAIWrapper):
         for index in sorted(non_tracked, reverse=True):
             del self._ids[index]
         self._aiwrapper.delete(non_tracked)
+
+    def keep_mask(self,mask):
+        self._ids = [id for id,keep in zip(self._ids,mask) if keep]
+        self._aiwrapper.keep_mask(mask)
     
     def __len__(self):
         return len(self._aiwrapper)
@@ -65,7 +70,7 @@ class TrackingItem(FalcoeyeAIWrapper):
             ymax = y1 + offset_h
             y_text = ymax - 2
             return xmax, ymax, y_text
-        frame = self.frame.copy()
+        frame = pooled_copy(self.frame)
         for index,hid in enumerate(self._ids):
             track_label = f'{hid}'
             x1, y1, x2, y2 = self._aiwrapper.get_box(index).astype(np.int16)
@@ -79,7 +84,8 @@ class TrackingItem(FalcoeyeAIWrapper):
 
 
 class DeepSortTracker(Node):
-    
+    stream_state = ("tracks","metric","_next_id")
+
     def __init__(self,
         name,
         feature_extractor_node,
@@ -265,6 +271,7 @@ class DeepSortTracker(Node):
             item = self.get()
             # assuming FalcoeyeOpenPoseHPE or a wrapper for it
             logging.info(f"Running {self._name} on item {item.framestamp}")
+            self.switch_stream(item.stream)
             tr_item = self.predict(item)
 
             self.sink(tr_item)
@@ -25,7 +25,7 @@ class Detection:
     """
 
     def __init__(self, tlwh, feature):
-        self.tlwh = np.asarray(tlwh, dtype=np.float)
+        self.tlwh = np.asarray(tlwh, dtype=np.float64)
         # self.confidence = float(confidence)
         self.feature = np.asarray(feature, dtype=np.float32)
 
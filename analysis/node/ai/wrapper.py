@@ -4,13 +4,16 @@ import logging
 import numpy as np
 
 class FalcoeyeAIWrapper:
+    # subclasses without __slots__ still get a __dict__
+    __slots__ = ("_frame","_meta")
+
     def __init__(self,frame):
         self._frame = frame
         self._meta = {}
     
     @property
     def size(self):
-        return self._frame.frame.shape
+        return self._frame.size
     
     @property
     def frame(self):
@@ -23,6 +26,14 @@ class FalcoeyeAIWrapper:
     @property
     def framestamp(self):
         return self._frame.framestamp
+
+    @property
+    def trace(self):
+        return self._frame.trace
+
+    @property
+    def stream(self):
+        return self._frame.stream
         
     @property
     def timestamp(self):
@@ -0,0 +1,72 @@
+from .metrics import register as register_metrics
+import numpy as np
+import threading
+import weakref
+import ctypes
+
+class BufferPool:
+    """
+    Heap buffers for frames and tensors, by size in bytes. An array from
+    acquire gives its buffer back to the pool when it and every view of it
+    are gone, i.e. when the frame left the graph, so the next frame of the
+    same size reuses it instead of allocating. Allocations and reuses are
+    counted in the metrics of the pool and of the node acquiring
+    """
+    def __init__(self,name="buffer_pool",max_free=16):
+        # free buffers kept by size, the others are left to the allocator
+        self._max_free = max_free
+        self._free = {}
+        self._lock = threading.Lock()
+        self._metrics = register_metrics(name)
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def free(self,nbytes):
+        return len(self._free.get(nbytes,[]))
+
+    def _release(self,memory):
+        with self._lock:
+            free = self._free.setdefault(len(memory),[])
+            if len(free) < self._max_free:
+                free.append(memory)
+
+    def acquire(self,shape,dtype=np.uint8,metrics=None):
+        """
+        An uninitialized array of shape and dtype. metrics, e.g. of the
+        calling node, also counts the allocation
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape))*dtype.itemsize
+        if nbytes == 0:
+            return np.empty(shape,dtype=dtype)
+        with self._lock:
+            free = self._free.get(nbytes)
+            memory = free.pop() if free else None
+        for m in [self._metrics,metrics]:
+            if m is None:
+                continue
+            if memory is None:
+                m.count("buffer_allocations")
+                m.count("buffer_allocated_bytes",nbytes)
+            else:
+                m.count("buffer_reuses")
+        if memory is None:
+            memory = bytearray(nbytes)
+        # the arrays keep this buffer, not the memory, alive (like FrameRing slots)
+        buffer = (ctypes.c_ubyte*nbytes).from_buffer(memory)
+        weakref.finalize(buffer,self._release,memory)
+        return np.frombuffer(buffer,dtype=dtype).reshape(shape)
+
+# shared by sources, preprocessors and drawers of the process
+_POOL = BufferPool()
+
+def buffer_pool():
+    return _POOL
+
+def pooled_copy(array,metrics=None):
+    # array.copy() in a pooled buffer, e.g. of a frame to draw on
+    copy = _POOL.acquire(array.shape,array.dtype,metrics)
+    np.copyto(copy,array)
+    return copy
@@ -1,7 +1,9 @@
-from ..node import Node
+from ..node import Node, END_OF_STREAM
 from threading import Thread
 import logging
 import queue
+import heapq
+import itertools
 import traceback
 
 
@@ -12,6 +14,7 @@ class SequenceRunner(Node):
         self._frequency = int(frequency)
         self._counter = 0
         self._sinks = [self._nodes[0]]
+        self._nodes_open = False
     
     def run_(self):
         self._counter += 1
@@ -23,13 +26,21 @@ class SequenceRunner(Node):
                 n.run()  
             self._counter = 0
 
-    def run(self):
-
+    def open(self):
+        Node.open(self)
         self.open_nodes()
+
+    def run(self):
+        # nodes opened with the runner are kept open between calls, i.e. 
+        # when the runner is fed a few frames at a time in a streaming run
+        if not self._nodes_open:
+            self.open_nodes()
         while self.more():
             item = self.get()
             self.sink(item)
             self.run_()
+        if self._continue:
+            return
         if self._counter != 0:
             # tricking the run_ function to force it to run
             self._counter = self._frequency - 1
@@ -52,12 +63,12 @@ class SequenceRunner(Node):
             logging.info(f"Opening sequence nodes for {self.name}")
             self.open_nodes()
             logging.info(f"Starting looping for {self.name}")
-            while self._continue or self.more():
-                if not self.more():
-                    continue
+            while True:
+                item = self.receive()
+                if item is END_OF_STREAM:
+                    break
 
                 #logging.info(f"New item for {self.name} sequence")
-                item = self.get()
                 self.sink(item)
                 self.run_()
             logging.info(f"Sequence {self.name} inturrepted.")
@@ -70,6 +81,9 @@ class SequenceRunner(Node):
             logging.info(f"Sequence {self.name} loop exited")
             self._counter = 0
 
+            # closing the nodes (i.e. setting continue to False)
+            self.close_nodes()
+
             # TODO: refactor this
             # run last time to flush. Some nodes have post close scenarios
             logging.info("Flushing nodes after closing.")
@@ -77,9 +91,6 @@ class SequenceRunner(Node):
                 logging.info(f"Runing node {n.name}")
                 n.run() 
             
-            # closing the nodes (i.e. setting continue to False)
-            self.close_nodes()
-            
             if self._done_callback:
                 self._done_callback(self._name)
 
@@ -91,10 +102,12 @@ class SequenceRunner(Node):
     def open_nodes(self):
         for node in self._nodes:
             node.open() 
+        self._nodes_open = True
 
     def close_nodes(self):
         for node in self._nodes:
             node.close() 
+        self._nodes_open = False
 
     def run_async(self,done_callback,error_callback):
         # TODO: do we need try/except here?!
@@ -106,11 +119,56 @@ class SequenceRunner(Node):
         self._thread.start()
         logging.info(f"Thread for {self.name} started")
 
+class FusedChain(Node):
+    """
+    Chain of stateless nodes where each node has a single input and a single
+    output. Items go through the chain with direct run_on calls instead of a
+    queue per node. Built by the workflow factory, not meant for workflow files
+    """
+    stateless = True
+
+    def __init__(self,name,nodes):
+        Node.__init__(self,name)
+        self._nodes = nodes
+        # taking over the input queue (and its capacity) of the first node 
+        self._data = nodes[0]._data
+        self._policy = nodes[0]._policy
+        # same list object, so rewiring the last node rewires the chain
+        self._sinks = nodes[-1]._sinks
+
+    def run_on(self,item):
+        for n in self._nodes:
+            item = n.run_on(item)
+            if item is None:
+                return None
+        return item
+
+    def run(self):
+        while self.more():
+            item = self.run_on(self.get())
+            if item is not None:
+                self.sink(item)
+
+    def open(self):
+        Node.open(self)
+        for n in self._nodes:
+            n.open()
+
+    def close(self):
+        Node.close(self)
+        # some nodes (e.g. Resizer) close their sinks on close
+        for n in self._nodes:
+            n.close()
+
 class SortedSequence(Node):
     def __init__(self,name):
         Node.__init__(self,name)
         self._data = queue.PriorityQueue()
-        self._expected_start = 0
+        # items waiting for their predecessors, and the next framestamp,
+        # by stream
+        self._pending = {}
+        self._expected_start = {}
+        self._order = itertools.count()
     
     def run(self):
         """
@@ -118,21 +176,29 @@ class SortedSequence(Node):
         """
         logging.info(f"Running SortedSequence {self._name}")
         while self.more():
-            if self._data.queue[0] == self._expected_start:
-                logging.info(f"Expected root {self._expected_start} so sink. Size {self._data.qsize()}")
-                self._expected_start += 1
-                item = self.get()
-                self.sink(item)
-            else:
-                logging.info(f"Expected root {self._expected_start} not yet available. Size {self._data.qsize()}")
-                break
-            
+            item = self.get()
+            heapq.heappush(self._pending.setdefault(getattr(item,"stream",None),[]),
+                (item.framestamp,next(self._order),item))
+        # a stream waiting for a frame doesn't hold the others back
+        for stream,pending in self._pending.items():
+            expected = self._expected_start.get(stream,0)
+            while pending and pending[0][0] == expected:
+                logging.info(f"Expected root {expected} so sink. Size {len(pending)}")
+                self.sink(heapq.heappop(pending)[2])
+                expected += 1
+            if pending:
+                logging.info(f"Expected root {expected} not yet available. Size {len(pending)}")
+            self._expected_start[stream] = expected
     
     def open(self):
-        self._expected_start = 0
+        self._pending = {}
+        self._expected_start = {}
 
     def close(self):
-        self._expected_start = 0
-        Node.close(self)
+        # no end of stream marker here, it can't be ordered with the frames
+        # and this node is never blocked on its queue
+        logging.info(f"Closing {self.name}")
+        self._expected_start = {}
+        self._continue = False
 
 
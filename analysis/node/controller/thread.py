@@ -1,5 +1,10 @@
-from ..node import Node
+from ..node import Node, END_OF_STREAM
+from ..source.shared import dumps_shared, loads_shared
 from threading import Thread
+from collections import deque
+from multiprocessing import resource_tracker
+import multiprocessing as mp
+import time
 import logging
 import aiohttp
 
@@ -19,11 +24,11 @@ class ThreadWrapper(Node):
         """
         try:
             logging.info(f"Starting looping for {self.name}")
-            while self._continue or self.more():
-                if not self.more():
-                    continue
+            while True:
+                item = self.receive()
+                if item is END_OF_STREAM:
+                    break
                 logging.info(f"New item for {self.name} sequence")
-                item = self.get()
                 node_res = self._node.run_on(item)
                 self.sink(node_res)
             
@@ -43,6 +48,9 @@ class ThreadWrapper(Node):
         self._thread.start()
 
 class ConcurrentRequestTaskThreadWrapper(Node):
+    # tasks overlap, every task is timed on its own
+    timed_by_get = False
+
     def __init__(self,name,node,ntasks=2):
         Node.__init__(self,name)
         self._node = node
@@ -51,7 +59,9 @@ class ConcurrentRequestTaskThreadWrapper(Node):
     
     async def task_(self,session,item):
         logging.info(f"Running task asyncronously for frame {item.framestamp}")
+        started = time.perf_counter()
         o = await self._node.run_on_async(session,item)
+        self._metrics.observe(time.perf_counter() - started)
         self.sink(o)
     
     def start_background_loop(self,loop: asyncio.AbstractEventLoop) -> None:
@@ -79,14 +89,16 @@ class ConcurrentRequestTaskThreadWrapper(Node):
         """
         try:
             tasks = []
-            while self._continue or self.more():
-                if self.more():
-                    logging.info("New data to sink")
-                    item = self.get()
-                    logging.info(f"Creating task for frame {item.framestamp} with size {item.size}")
-                    task = asyncio.create_task(self.task_(session,item))
-                    tasks.append(task)
-                    logging.info(f"Task created for frame {item.framestamp}")
+            while True:
+                # waiting in the executor keeps the loop free for running tasks
+                item = await self._loop.run_in_executor(None,self.receive)
+                if item is END_OF_STREAM:
+                    break
+                logging.info("New data to sink")
+                logging.info(f"Creating task for frame {item.framestamp} with size {item.size}")
+                task = asyncio.create_task(self.task_(session,item))
+                tasks.append(task)
+                logging.info(f"Task created for frame {item.framestamp}")
                 if len(tasks) == self._ntasks:
                     logging.info(f"Gathering {self._ntasks} new tasks")
                     await asyncio.gather(*tasks)
@@ -120,3 +132,111 @@ class ConcurrentPostTasksThreadWrapper(ConcurrentRequestTaskThreadWrapper):
             self._done_callback(self._name)
         self.close_sinks() 
 
+_WORKER_NODE = None
+
+def _init_worker(node):
+    global _WORKER_NODE
+    _WORKER_NODE = node
+
+def _run_in_worker(payload):
+    # the parent holds the slots of the item until this result is back.
+    # Nothing holds the result here, its heap arrays are pickled in band
+    item = loads_shared(payload)
+    return dumps_shared(_WORKER_NODE.run_on(item))
+
+class ProcessPoolWrapper(Node):
+    """
+    Runs run_on of the wrapped node in worker processes, for CPU bound
+    nodes that don't scale with threads because of the GIL. Large arrays
+    go through shared memory and results are sinked in the input order.
+    The wrapped node is pickled to the workers when the first run starts
+    """
+    def __init__(self,name,node,nworkers=2):
+        Node.__init__(self,name)
+        self._node = node
+        self._nworkers = int(nworkers)
+        # bounding the in flight items bounds the transfer slots in use
+        self._max_inflight = 2*self._nworkers
+        self._inflight = deque()
+        # started by the first run
+        self._pool = None
+
+    def start_(self):
+        if self._pool is not None:
+            return
+        # one tracker shared by the workers, so blocks attached by one 
+        # process and unlinked by another are not reported as leaked
+        resource_tracker.ensure_running()
+        # forked by a server process without the threads of the workflow,
+        # the node is pickled to the workers like the items
+        self._pool = mp.get_context("forkserver").Pool(self._nworkers,
+            initializer=_init_worker,initargs=(self._node,))
+        logging.info(f"Started {self._nworkers} workers for {self._node.name}")
+
+    def submit_(self,item):
+        held = []
+        payload = dumps_shared(item,held)
+        task = self._pool.apply_async(_run_in_worker,(payload,))
+        # holding the item and its transfer slots keeps them from being
+        # reused until the result is back
+        self._inflight.append((task,held,item))
+
+    def collect_(self):
+        # the slots held are released once the result is read
+        task,held,_ = self._inflight.popleft()
+        try:
+            result = loads_shared(task.get())
+            if result is not None:
+                self.sink(result)
+        except Exception as e:
+            logging.error(f"{self.name} failed on an item: {e}")
+
+    def shutdown_(self):
+        while self._inflight:
+            self.collect_()
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+
+    def run(self):
+        self.start_()
+        while self.more():
+            self.submit_(self.get())
+            if len(self._inflight) >= self._max_inflight:
+                self.collect_()
+        # sinking everything before the next node runs
+        while self._inflight:
+            self.collect_()
+        if not self._continue:
+            self.shutdown_()
+
+    def run_forever_(self):
+        """
+        Critical node: failure here should cause the workflow to fail
+        """
+        try:
+            logging.info(f"Starting process pool looping for {self.name}")
+            while True:
+                item = self.receive()
+                if item is END_OF_STREAM:
+                    break
+                self.submit_(item)
+                if len(self._inflight) >= self._max_inflight:
+                    self.collect_()
+            
+            logging.info(f"Loop {self.name} inturrepted. Flushing in flight items")
+            self.shutdown_()
+            if self._done_callback:
+                self._done_callback(self._name)  
+            self.close_sinks() 
+        except Exception as e:
+            logging.error(e)
+            self._error_callback(self._name,str(e))
+
+    def run_async(self,done_callback,error_callback):
+        self._done_callback = done_callback
+        self._error_callback = error_callback
+        self._continue = True
+        self.start_()
+        self._thread = Thread(target=self.run_forever_, args=(),daemon=True)
+        self._thread.start()
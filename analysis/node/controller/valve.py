@@ -1,11 +1,14 @@
 
-from ..node import Node
+from ..node import Node, END_OF_STREAM
 from threading import Thread
 import logging
 
 
 
 class OneLeakyOneTimedValve(Node):
+    # only routes items, the gated nodes run on their own
+    runs_members = False
+
     def __init__(self,name,nodes,
         timed_gate_open_freq=30,
         timed_gate_opened_last=10,
@@ -25,23 +28,22 @@ class OneLeakyOneTimedValve(Node):
         """
         logging.info(f"Starting looping for {self.name}")
         try:
-            while self._continue or self.more():
-                if not self.more():
-                    continue
-                item = self.get()
-                # TODO: eliminate ._data
+            while True:
+                item = self.receive()
+                if item is END_OF_STREAM:
+                    break
                 #logging.info(f"New item entered the valve {self._name}")
                 if self._counter < self._timed_gate_opened_last:
                     #logging.info(f"Directing {self._counter} to timed gate")
-                    self._timed_gate_node._data.put(item)
+                    self._timed_gate_node.put(item)
                     self._counter += 1
                 elif self._counter == self._timed_gate_open_freq:
                     #logging.info(f"Directing {self._counter} to timed gate and closing")
                     self._counter = 0
-                    self._timed_gate_node._data.put(item)
+                    self._timed_gate_node.put(item)
                 else:
                     #logging.info(f"Directing {self._counter} to leaky gate")
-                    self._leaky_gate_node._data.put(item)
+                    self._leaky_gate_node.put(item)
                     self._counter += 1
             
             logging.info(f"No more from source. Closing volve {self.name}")     
@@ -5,6 +5,8 @@ import numpy as np
 
 
 class BoundingBoxDrawer(Node):
+    stateless = True
+
     def __init__(self,name,cmap,translate=True):
         Node.__init__(self,name)
         self._cmap = cmap
@@ -17,13 +19,13 @@ class BoundingBoxDrawer(Node):
         # expecting items of type FalcoeyeDetection
         while self.more():
             item = self.get()
-            # TODO: assert different size, and try to remove somehow
-        
-            
-            n = item.count
-            logging.info(f"Running {self._name} on item {item.framestamp} with {n} boxex")
-            for i in range(n):
-                cl = item.get_class(i)
-                color = self._cmap[cl]
-                item.draw_bounding_box(i,color,translate=self._translate)
-            self.sink(item)
\ No newline at end of file
+            self.sink(self.run_on(item))
+
+    def run_on(self,item):
+        # TODO: assert different size, and try to remove somehow
+        n = item.count
+        logging.info(f"Running {self._name} on item {item.framestamp} with {n} boxex")
+        if n > 0:
+            colors = [self._cmap[item.get_class(i)] for i in range(n)]
+            item.draw_bounding_boxes(range(n),colors,translate=self._translate)
+        return item
\ No newline at end of file
@@ -3,6 +3,8 @@ from ..node import Node
 import logging
 
 class HPEDrawer(Node):
+    stateless = True
+
     def __init__(self,name):
         Node.__init__(self,name)
     
@@ -10,8 +12,11 @@ class HPEDrawer(Node):
         # expecting items of type FalcoeyeFrame or a wrapper for it
         while self.more():
             item = self.get()
-            logging.info(item)
-            # assuming FalcoeyeOpenPoseHPE or a wrapper for it
-            logging.info(f"Running {self._name} on item {item.framestamp}")
-            item.draw()
-            self.sink(item)
+            self.sink(self.run_on(item))
+
+    def run_on(self,item):
+        logging.info(item)
+        # assuming FalcoeyeOpenPoseHPE or a wrapper for it
+        logging.info(f"Running {self._name} on item {item.framestamp}")
+        item.draw()
+        return item
@@ -1,7 +1,6 @@
 from ..node import Node
+from ..zones import rasterize
 import logging
-from PIL import ImageDraw, Image
-import numpy as np
 
 class StaticPolygonDrawer(Node):
     def __init__(self,name,points,color,alpha=0.5):
@@ -17,10 +16,6 @@ class StaticPolygonDrawer(Node):
 class StaticPolygonsDrawer(Node):
     def __init__(self, name,polygons,color=(0,0,255),alpha=0.5):
         Node.__init__(self,name)
-        self._initialized = False
-        self._mask = None
-        self._width = -1
-        self._height = -1
         self._color = color
         self._alpha = alpha
         self._polygons = []
@@ -34,27 +29,18 @@ class StaticPolygonsDrawer(Node):
         else:
             raise NotImplementedError
 
-    def initialize(self,width,height):
-        self._mask = Image.new("RGB", (width, height), 0)
-        for name,points in self._polygons:
-            ImageDraw.Draw(self._mask).polygon(
-                [tuple(x) for x in points], outline=1, fill=self._color
-            )
-        self._mask = np.asarray(self._mask)
-        self._width, self._height = width, height
-        self._initilized = True
+    def mask(self,width,height):
+        # from the process-wide cache after the first frame of this size
+        return rasterize([points for _,points in self._polygons],width,height,"RGB",self._color)
 
     def run(self):
         # expecting items of type FalcoeyeFrame or a wrapper for it
         while self.more():
             item = self.get()
-            # TODO: assert different size, and try to remove somehow
-            if not self._initialized:
-                height, width,_ = item.size
-                self.initialize(width,height)
+            height, width,_ = item.size
             # assuming FalcoeyeFrame or a wrapper for it
             logging.info(f"Running {self._name} on item {item.framestamp}")
-            item.blend(self._mask,alpha=self._alpha,inplace=True)
+            item.blend(self.mask(width,height),alpha=self._alpha,inplace=True)
            
             self.sink(item)
 
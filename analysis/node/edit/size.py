@@ -2,8 +2,11 @@ import logging
 import numpy as np
 from PIL import Image
 from ..node import Node
+from ..buffers import buffer_pool
 
 class Resizer(Node):
+    stateless = True
+
     def __init__(self, name,size):
         Node.__init__(self,name)
         self._enabled = True
@@ -18,17 +21,23 @@ class Resizer(Node):
         #logging.info(f"Running {self._name} with resolution {self._width}X{self._height}")
         while self.more():
             item = self.get()
-            if self._enabled:
-                # assuming FalcoeyeFrame
-                #logging.info(f"Resizing frame to {self._width}X{self._height}")
-                item.resize(self._width,self._height)
-                logging.info(f"Frame resized {item.size[1]}X{item.size[0]}")
-            self.sink(item)
+            self.sink(self.run_on(item))
+
+    def run_on(self,item):
+        # e.g. decoded at this size by the source
+        if self._enabled and item.size[:2] != (self._height,self._width):
+            # assuming FalcoeyeFrame
+            #logging.info(f"Resizing frame to {self._width}X{self._height}")
+            item.resize(self._width,self._height)
+            logging.info(f"Frame resized {item.size[1]}X{item.size[0]}")
+        return item
     
     def close(self):
         self.close_sinks()
 
 class TritonPreprocessor(Node):
+    stateless = True
+
     def __init__(self, name, input_shape, letter_box=True):
         Node.__init__(self, name)
         
@@ -52,11 +61,10 @@ class TritonPreprocessor(Node):
             img = Image.fromarray(img)
             
         img_w, img_h = img.size
+        new_h, new_w = self._height, self._width
+        offset_h, offset_w = 0, 0
         
         if self._letter_box:
-            new_h, new_w = self._height, self._width
-            offset_h, offset_w = 0, 0
-            
             # Calculate new dimensions preserving aspect ratio
             if (new_w / img_w) <= (new_h / img_h):
                 new_h = int(img_h * new_w / img_w)
@@ -65,27 +73,22 @@ class TritonPreprocessor(Node):
                 new_w = int(img_w * new_h / img_h)
                 offset_w = (self._width - new_w) // 2
             
-            # Resize image
-            resized = img.resize((new_w, new_h), Image.Resampling.BILINEAR)
-            
-            # Create new image with padding
-            new_img = Image.new('RGB', (self._width, self._height), (127, 127, 127))
-            new_img.paste(resized, (offset_w, offset_h))
-            img = new_img
-        else:
-            img = img.resize((self._width, self._height), Image.Resampling.BILINEAR)
+        # Resize image
+        resized = img.resize((new_w, new_h), Image.Resampling.BILINEAR)
 
         # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        if resized.mode != 'RGB':
+            resized = resized.convert('RGB')
         
-        # Create RGB version for FalcoeyeFrame
-        rgb_array = np.array(img, dtype=np.uint8)
+        # Create RGB version for FalcoeyeFrame, padded with gray around the letter box
+        rgb_array = buffer_pool().acquire((self._height, self._width, 3), metrics=self._metrics)
+        if (new_h, new_w) != (self._height, self._width):
+            rgb_array[...] = 127
+        rgb_array[offset_h:offset_h + new_h, offset_w:offset_w + new_w] = np.asarray(resized)
             
-        # Create preprocessed tensor for inference
-        img_tensor = np.array(img, dtype=np.float32)
-        img_tensor = img_tensor.transpose((2, 0, 1))  # HWC to CHW format
-        img_tensor /= 255.0
+        # Create preprocessed tensor for inference, HWC to CHW format
+        img_tensor = buffer_pool().acquire((3, self._height, self._width), np.float32, metrics=self._metrics)
+        np.divide(rgb_array.transpose((2, 0, 1)), np.float32(255.0), out=img_tensor, dtype=np.float32)
         
         # Verify tensor format
         assert img_tensor.dtype == np.float32
@@ -96,29 +99,33 @@ class TritonPreprocessor(Node):
         logging.info(f"Running {self._name} with input shape {self._input_shape}")
         
         while self.more():
-            item = self.get()
-            try:
-                # Store original dimensions for postprocessing
-                if isinstance(item.frame, np.ndarray):
-                    item.original_dims = item.frame.shape[:2]  # (height, width)
-                else:
-                    item.original_dims = item.frame.size[::-1]  # PIL size is (width, height)
-                
-                # Process the frame
-                rgb_array, tensor_data = self.preprocess_frame(item.frame)
-                
-                # Update the frame with resized RGB data
-                item.set_frame(rgb_array)
-                
-                # Store preprocessed tensor data
-                item.tensor = tensor_data
-                
-                logging.info(f"Frame processed to shape {tensor_data.shape}")
+            item = self.run_on(self.get())
+            if item is not None:
                 self.sink(item)
-                
-            except Exception as e:
-                logging.error(f"Error preprocessing frame: {str(e)}")
-                continue
+
+    def run_on(self, item):
+        try:
+            # Store original dimensions for postprocessing
+            if isinstance(item.frame, np.ndarray):
+                item.original_dims = item.frame.shape[:2]  # (height, width)
+            else:
+                item.original_dims = item.frame.size[::-1]  # PIL size is (width, height)
+            
+            # Process the frame
+            rgb_array, tensor_data = self.preprocess_frame(item.frame)
+            
+            # Update the frame with resized RGB data
+            item.set_frame(rgb_array)
+            
+            # Store preprocessed tensor data
+            item.tensor = tensor_data
+            
+            logging.info(f"Frame processed to shape {tensor_data.shape}")
+            return item
+            
+        except Exception as e:
+            logging.error(f"Error preprocessing frame: {str(e)}")
+            return None
 
     def close(self):
         self.close_sinks()
\ No newline at end of file
@@ -1,2 +1,3 @@
 from .instance import *
-from .spatial import *  
\ No newline at end of file
+from .spatial import *
+from .motion import *
\ No newline at end of file
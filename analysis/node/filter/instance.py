@@ -1,8 +1,11 @@
 
 from ..node import Node
 import logging
+import numpy as np
 
 class TypeFilter(Node):
+    stateless = True
+
     def __init__(self, name, keys):
         Node.__init__(self,name)
         self._keys = keys
@@ -12,13 +15,18 @@ class TypeFilter(Node):
         logging.info(f"Running {self.name}")
         while self.more():
             item = self.get()
-            logging.info(f"Running {self.name} on new item")
-            item.keep_only(self._keys,inplace=True)
-            self.sink(item)
+            self.sink(self.run_on(item))
+
+    def run_on(self,item):
+        logging.info(f"Running {self.name} on new item")
+        item.keep_only(self._keys,inplace=True)
+        return item
             
 
 
 class SizeFilter(Node):
+    stateless = True
+
     def __init__(self, name, width_threshold,height_threshold):
         Node.__init__(self,name)
         self._width_threshold = width_threshold
@@ -29,13 +37,13 @@ class SizeFilter(Node):
         logging.info(f"Running {self.name} with {self._width_threshold} and {self._height_threshold}")
         while self.more():
             item = self.get()   
-            index = 0
-            logging.info(f"Before size filter {item.count}")
-            for _ in range(item.count):
-                if item.iwidth(index) > self._width_threshold or item.iheight(index) > self._height_threshold:
-                    item.delete(index)
-                else:
-                    # when deleting, no index increament due to shift in array
-                    index += 1
-            self.sink(item)
-            logging.info(f"After size filter {item.count}")
+            self.sink(self.run_on(item))
+
+    def run_on(self,item):
+        logging.info(f"Before size filter {item.count}")
+        boxes = item.boxes
+        widths = np.abs(boxes[:,0]-boxes[:,2])
+        heights = np.abs(boxes[:,1]-boxes[:,3])
+        item.keep_mask((widths <= self._width_threshold) & (heights <= self._height_threshold))
+        logging.info(f"After size filter {item.count}")
+        return item
@@ -0,0 +1,154 @@
+from ..node import Node
+import numpy as np
+import logging
+import copy
+import cv2
+
+class SkippedFrame:
+    """
+    A frame dropped by a MotionGate, inheriting the result of the frame
+    with the reference framestamp, the last one the gate let through
+    """
+    def __init__(self,frame,reference):
+        self.frame_item = frame
+        self.reference = reference
+
+    @property
+    def framestamp(self):
+        return self.frame_item.framestamp
+
+    @property
+    def stream(self):
+        return self.frame_item.stream
+
+    @property
+    def trace(self):
+        return self.frame_item.trace
+
+class MotionGate(Node):
+    """
+    Lets a frame through only when it changed enough from the last frame
+    let through, and at least one frame every keyframe_every. Frames are
+    compared in gray at a width of width pixels: a pixel changed when its
+    level moved by more than pixel_threshold, a frame when more than
+    threshold of its pixels did. Frames with a motion energy from the
+    source (see VideoFileSource motion_vectors) are compared with
+    motion_threshold instead, without touching their pixels. Skipped
+    frames go to fill_node if given
+    """
+    # the reference frame is kept between items
+    stateless = False
+    # routes skipped frames to the fill node, which runs on its own
+    runs_members = False
+    stream_state = ("_reference","_since_forward","_last_forwarded")
+
+    def __init__(self,name,threshold=0.01,pixel_threshold=25,keyframe_every=30,width=96,
+        motion_threshold=None,fill_node=None):
+        Node.__init__(self,name)
+        self._threshold = float(threshold)
+        self._pixel_threshold = int(pixel_threshold)
+        self._keyframe_every = int(keyframe_every)
+        self._width = int(width)
+        self._motion_threshold = None if motion_threshold is None else float(motion_threshold)
+        self._fill_node = fill_node
+        self._reference = None
+        self._since_forward = 0
+        self._last_forwarded = None
+        self._skipped = 0
+
+    @property
+    def skipped(self):
+        return self._skipped
+
+    def thumbnail(self,frame):
+        height,width = frame.shape[:2]
+        size = (self._width,max(int(round(height*self._width/width)),1))
+        # averaging while shrinking also evens out the sensor noise
+        small = cv2.resize(frame,size,interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small,cv2.COLOR_RGB2GRAY)
+
+    def changed(self,small):
+        diff = cv2.absdiff(small,self._reference)
+        return np.count_nonzero(diff > self._pixel_threshold) > self._threshold*diff.size
+
+    def run_on(self,item):
+        self.switch_stream(item.stream)
+        motion = getattr(item,"motion",None)
+        by_motion = self._motion_threshold is not None and motion is not None
+        if by_motion:
+            static = self._last_forwarded is not None and motion <= self._motion_threshold
+        else:
+            small = self.thumbnail(item.frame)
+            static = self._reference is not None and not self.changed(small)
+        self._since_forward += 1
+        if static and self._since_forward < self._keyframe_every:
+            self._skipped += 1
+            if self._fill_node is not None:
+                self._fill_node.put(SkippedFrame(item,self._last_forwarded))
+            return None
+        if not by_motion:
+            self._reference = small
+        self._since_forward = 0
+        self._last_forwarded = item.framestamp
+        return item
+
+    def run(self):
+        while self.more():
+            item = self.run_on(self.get())
+            if item is not None:
+                self.sink(item)
+
+    def close(self):
+        logging.info(f"{self._name} skipped {self._skipped} frames")
+        Node.close(self)
+
+class MotionFill(Node):
+    """
+    Gives the frames skipped by a MotionGate a copy of the result (e.g.
+    detections) of the last frame the gate let through, for nodes that need
+    one row per frame like counters. Results come from its input edge and
+    skipped frames from the gate
+    """
+    stream_state = ("_last","_waiting")
+
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self._last = None
+        # skipped frames by the framestamp of the result they wait for
+        self._waiting = {}
+
+    @staticmethod
+    def inherit(result,skipped):
+        # the frame is replaced, the rest is copied as nodes may edit it in place
+        return copy.deepcopy(result,{id(result._frame): skipped.frame_item})
+
+    def process(self,item):
+        self.switch_stream(item.stream)
+        if isinstance(item,SkippedFrame):
+            if self._last is not None and self._last.framestamp >= item.reference:
+                self.sink(self.inherit(self._last,item))
+            else:
+                self._waiting.setdefault(item.reference,[]).append(item)
+            return
+        self.sink(item)
+        self._last = item
+        # a result that never came (e.g. failed inference) is replaced by this one
+        for reference in sorted(r for r in self._waiting if r <= item.framestamp):
+            for skipped in self._waiting.pop(reference):
+                self.sink(self.inherit(item,skipped))
+
+    def flush(self):
+        for stream in self.streams():
+            self.switch_stream(stream)
+            for skipped in [s for w in self._waiting.values() for s in w]:
+                if self._last is None:
+                    logging.warning(f"{self._name} has no result for frame {skipped.framestamp}")
+                    continue
+                self.sink(self.inherit(self._last,skipped))
+            self._waiting = {}
+
+    def run(self):
+        while self.more():
+            self.process(self.get())
+        if not self._continue:
+            self.flush()
@@ -0,0 +1,132 @@
+import threading
+import logging
+import json
+import time
+import os
+
+# upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [1,2,5,10,20,50,100,200,500,1000,2000,5000,float("inf")]
+
+class NodeMetrics:
+    """
+    Runtime counters of one node. Updated from the threads of the node
+    (and of its producers), so every update takes the lock
+    """
+    def __init__(self,name):
+        self._name = name
+        self._lock = threading.Lock()
+        # start of the item being processed, per thread since wrappers
+        # receive in one thread and sink in another
+        self._local = threading.local()
+        self._items_in = 0
+        self._items_out = 0
+        self._dropped = 0
+        self._queue_depth = 0
+        self._queue_high = 0
+        self._busy = 0.0
+        self._histogram = [0]*len(LATENCY_BUCKETS_MS)
+        self._counters = {}
+
+    def record_put(self,depth):
+        with self._lock:
+            self._items_in += 1
+            self._queue_depth = depth
+            self._queue_high = max(self._queue_high,depth)
+
+    def record_drop(self):
+        with self._lock:
+            self._dropped += 1
+
+    def record_get(self,depth,start=True):
+        with self._lock:
+            self._queue_depth = depth
+        if start:
+            self._local.started = time.perf_counter()
+
+    def record_done(self):
+        # end of the processing of the item got last, sunk or not (filtered
+        # out, aggregated), before waiting for the next one
+        started = getattr(self._local,"started",None)
+        self._local.started = None
+        if started is not None:
+            self.observe(time.perf_counter() - started)
+
+    def record_sink(self):
+        with self._lock:
+            self._items_out += 1
+        self.record_done()
+
+    def observe(self,seconds):
+        ms = seconds*1000
+        bucket = next(i for i,b in enumerate(LATENCY_BUCKETS_MS) if ms <= b)
+        with self._lock:
+            self._busy += seconds
+            self._histogram[bucket] += 1
+
+    def count(self,key,value=1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key,0) + value
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                "items_in": self._items_in,
+                "items_out": self._items_out,
+                "dropped": self._dropped,
+                "queue_depth": self._queue_depth,
+                "queue_high_water": self._queue_high,
+                "busy_seconds": round(self._busy,6),
+                "latency_ms": {str(b): c for b,c in zip(LATENCY_BUCKETS_MS,self._histogram)}
+            }
+            snapshot.update(self._counters)
+        return snapshot
+
+# name -> NodeMetrics of every node created in this process
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def register(name):
+    metrics = NodeMetrics(name)
+    with _REGISTRY_LOCK:
+        _REGISTRY[name] = metrics
+    return metrics
+
+def snapshot():
+    with _REGISTRY_LOCK:
+        registry = dict(_REGISTRY)
+    return {"timestamp": time.time(),
+        "nodes": {name: m.snapshot() for name,m in registry.items()}}
+
+def write_metrics(filename):
+    # writing then renaming, readers never see a half written file
+    tmpfile = f"{filename}.tmp"
+    with open(os.path.relpath(tmpfile),"w") as f:
+        f.write(json.dumps(snapshot()))
+    os.replace(os.path.relpath(tmpfile),os.path.relpath(filename))
+    logging.info(f"Metrics written to {filename}")
+
+class MetricsReporter:
+    """
+    Writes a snapshot of the metrics every interval seconds, for long
+    (e.g. live stream) analyses
+    """
+    def __init__(self,filename,interval):
+        self._filename = filename
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever_,daemon=True)
+        self._thread.start()
+
+    def run_forever_(self):
+        while not self._stop.wait(self._interval):
+            try:
+                write_metrics(self._filename)
+            except Exception as e:
+                logging.error(e)
+
+    def stop(self):
+        self._stop.set()
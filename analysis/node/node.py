@@ -1,6 +1,35 @@
-from queue import Queue
+from queue import Queue, Full, Empty
+from .metrics import register as register_metrics
+import copy
+from . import tracing
 import logging
+
+BACKPRESSURE_POLICIES = ["block","drop_oldest","drop_newest"]
+
+class EndOfStream:
+    """
+    Marker put in the queue of a node when it is closed. It wakes up
+    consumers blocked on the queue and is never handed to run()
+    """
+    def __repr__(self):
+        return "END_OF_STREAM"
+
+END_OF_STREAM = EndOfStream()
+
 class Node:
+    # nodes passed to this node (e.g. "nodes" of a sequence runner) are run
+    # by it and are left out of the workflow run order
+    runs_members = True
+    # stateless nodes implement run_on(item), returning the item to sink or
+    # None to drop it, and can be fused with their neighbours
+    stateless = False
+    # attributes of stateful nodes kept apart for every stream of a multi
+    # stream source, see switch_stream
+    stream_state = ()
+    # latency of an item taken from get (or receive) to sink or to the next
+    # get. Nodes running items concurrently observe it themselves
+    timed_by_get = True
+
     def __init__(self,name):
         self._name = name
         self._sinks = []
@@ -8,7 +37,30 @@ class Node:
         self._thread = None
         self._done_callback = None
         self._continue = False
+        self._policy = "block"
+        self._dropped = 0
+        self._metrics = register_metrics(name)
+        self._stream = None
+        self._stream_states = {}
+        self._initial_stream_state = None
+        # run on a few items at a time by Workflow.run_streaming
+        self._streaming = False
     
+    def __getstate__(self):
+        # a copy for worker processes, without the queue, sinks and callbacks
+        state = self.__dict__.copy()
+        for key in ["_sinks","_data","_thread","_done_callback","_error_callback","_metrics"]:
+            state.pop(key,None)
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self._sinks = []
+        self._data = Queue()
+        self._thread = None
+        self._done_callback = None
+        self._metrics = register_metrics(self._name)
+
     def close_sinks(self):
         for sink in self._sinks:
             sink.close()
@@ -17,9 +69,70 @@ class Node:
     def name(self):
         return self._name
 
+    @property
+    def capacity(self):
+        return self._data.maxsize
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    @property
+    def metrics(self):
+        return self._metrics
+
     def add_sink(self,sink):
         self._sinks.append(sink)
+
+    def set_streaming(self,streaming):
+        self._streaming = streaming
+
+    @property
+    def partial(self):
+        """
+        True when run got part of the input of a streaming run: aggregators
+        and outputs keep their results for the run after close. Other runs
+        (sequential, async) sink and write what they got every time
+        """
+        return self._streaming and self._continue
+
+    def set_capacity(self,capacity,policy="block"):
+        """
+        Bounds the input queue of this node. When it is full, "block" makes
+        the producer wait, "drop_oldest" and "drop_newest" drop a frame and
+        count it. 0 means unbounded
+        """
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy} for {self._name}")
+        logging.info(f"Setting capacity of {self._name} to {capacity} with {policy} policy")
+        # same queue type (e.g. PriorityQueue), new bound
+        self._data = type(self._data)(maxsize=int(capacity))
+        self._policy = policy
     
+    def switch_stream(self,stream):
+        """
+        Swaps in the stream_state attributes of stream, before processing an
+        item of it. Streams start from the state the node had before its
+        first item. Nothing happens for single stream workflows
+        """
+        if stream == self._stream:
+            return
+        if self._initial_stream_state is None:
+            self._initial_stream_state = {a: copy.deepcopy(getattr(self,a)) for a in self.stream_state}
+        self._stream_states[self._stream] = {a: getattr(self,a) for a in self.stream_state}
+        state = self._stream_states.pop(stream,None)
+        if state is None:
+            state = copy.deepcopy(self._initial_stream_state)
+        for attribute,value in state.items():
+            setattr(self,attribute,value)
+        self._stream = stream
+
+    def streams(self):
+        # the current stream first, no switching needed. None is the state
+        # saved before the first item, not a stream, once streams were seen
+        streams = [s for s in [self._stream] + list(self._stream_states) if s is not None]
+        return streams or [None]
+
     def run(self):
         raise NotImplementedError
     
@@ -27,10 +140,45 @@ class Node:
         raise NotImplementedError
     
     def sink(self,data):
+        self._metrics.record_sink()
+        tracing.record(data,self._name,"finish")
         #logging.info(f"Sinking from {self._name} to {len(self._sinks)} sinks")
         for sink in self._sinks:
             #logging.info(f"Sinking from {self._name} to {sink._name}")
-            sink._data.put(data)
+            sink.put(data)
+
+    def put(self,item):
+        tracing.record(item,self._name,"enqueue")
+        if self._policy == "block":
+            self._data.put(item)
+            self._metrics.record_put(self._data.qsize())
+            return
+        while True:
+            try:
+                self._data.put_nowait(item)
+                self._metrics.record_put(self._data.qsize())
+                return
+            except Full:
+                pass
+            if self._policy == "drop_newest":
+                self._drop()
+                return
+            try:
+                oldest = self._data.get_nowait()
+            except Empty:
+                continue
+            if oldest is not END_OF_STREAM:
+                self._drop()
+            elif not self._continue:
+                # stream already closed, keep the marker and drop the late item
+                self._data.put(END_OF_STREAM)
+                self._drop()
+                return
+
+    def _drop(self):
+        self._dropped += 1
+        self._metrics.record_drop()
+        logging.info(f"Queue of {self._name} is full. {self._dropped} items dropped so far")
     
     def open(self):
         logging.info(f"Opening {self.name}")
@@ -39,9 +187,43 @@ class Node:
     def close(self):
         logging.info(f"Closing {self.name}")
         self._continue = False
+        if self._dropped > 0:
+            logging.warning(f"{self._name} dropped {self._dropped} items")
+        # waking up the consumer if it is blocked on an empty queue. A full
+        # queue means the consumer is not blocked, so no marker is needed
+        try:
+            self._data.put_nowait(END_OF_STREAM)
+        except Full:
+            pass
     
     def more(self):
+        if self.timed_by_get:
+            self._metrics.record_done()
+        # end of stream markers are only meant for blocked consumers
+        while self._data.qsize() > 0 and self._data.queue[0] is END_OF_STREAM:
+            self._data.get()
         return self._data.qsize() > 0
     
     def get(self):
-        return self._data.get()
\ No newline at end of file
+        if self.timed_by_get:
+            self._metrics.record_done()
+        item = self._data.get()
+        self._metrics.record_get(self._data.qsize(),self.timed_by_get)
+        tracing.record(item,self._name,"start")
+        return item
+
+    def receive(self):
+        """
+        Blocks until a new item is available. Returns END_OF_STREAM once
+        the node is closed and there is nothing left in its queue
+        """
+        if self.timed_by_get:
+            self._metrics.record_done()
+        while True:
+            if not self._continue and self._data.qsize() == 0:
+                return END_OF_STREAM
+            item = self._data.get()
+            if item is not END_OF_STREAM:
+                self._metrics.record_get(self._data.qsize(),self.timed_by_get)
+                tracing.record(item,self._name,"start")
+                return item
\ No newline at end of file
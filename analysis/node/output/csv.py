@@ -21,7 +21,7 @@ class CSVWriter(Output):
         self._filename = f"{prefix}/{name}.csv"
         self._xaxis = xaxis
         self._yaxis = yaxis
-        self._df = None
+        self._columns = None
         if exists(os.path.relpath(self._filename)):
             rm_file(self._filename)
         
@@ -53,15 +53,20 @@ class CSVWriter(Output):
             while self.more():
                 item = self.get()
                 logging.info(f"New item for {self.name}\n{item}")
-                if self._df is None:
-                    self._df = item
-                else:
-                    self._df = pd.concat([self._df,item])
+                # appending instead of rewriting keeps memory and IO flat
+                # however long the video is
+                header = self._columns is None
+                if header:
+                    # rows of multi stream workflows lead with their stream
+                    self._columns = list(item.columns)
+                    if "Stream" in self._columns:
+                        self._columns.remove("Stream")
+                        self._columns.insert(0,"Stream")
 
                 with open(
-                    os.path.relpath(self._filename), "w") as f:
+                    os.path.relpath(self._filename), "w" if header else "a") as f:
                     logging.info(f"Writing to {os.path.relpath(self._filename)}")
-                    f.write(self._df.to_csv(None,index=False))   
+                    f.write(item.reindex(columns=self._columns).to_csv(None,index=False,header=header))   
         except Exception as e:
             logging.erro(e)
 
@@ -70,7 +75,7 @@ class TableWriter(Output):
         Output.__init__(self,name,prefix)
         self._filename = f"{prefix}/{name}.csv"
         self._columns = columns
-        self._df = pd.DataFrame(columns=["Timestamp","Frame_Order"]+self._columns)
+        self._header = True
         if exists(os.path.relpath(self._filename)):
             rm_file(self._filename)
         
@@ -106,12 +111,12 @@ class TableWriter(Output):
                 for c in self._columns:
                     row[c] = item.get_meta(c)
                     
-                new_row = pd.DataFrame(row)
-                self._df = pd.concat([self._df, new_row], ignore_index=True)
+                new_row = pd.DataFrame(row,columns=["Timestamp","Frame_Order"]+self._columns)
                 with open(
-                    os.path.relpath(self._filename), "w") as f:
+                    os.path.relpath(self._filename), "w" if self._header else "a") as f:
                     logging.info(f"Writing to {os.path.relpath(self._filename)}")
-                    f.write(self._df.to_csv(None,index=False))
+                    f.write(new_row.to_csv(None,index=False,header=self._header))
+                self._header = False
                     
         except Exception as e:
             logging.erro(e) 
\ No newline at end of file
@@ -6,6 +6,9 @@ from datetime import datetime
 import io
 from PIL import Image
 import glob
+import logging
+from ..metrics import write_metrics
+from ..tracing import write_trace
 
 class Finalizer(Output):
     def __init__(self, name,prefix):
@@ -19,6 +22,9 @@ class Finalizer(Output):
         Safe node: input is assumed to be valid or can be handled properly
         """
         # TODO: refactor
+        # in a streaming run the other outputs write their meta once closed
+        if self.partial:
+            return
         try:
             meta_files = glob.glob(f"{self._prefix}/*_meta.json")
             meta_names = [os.path.basename(f).replace("_meta.json","") for f in meta_files]
@@ -36,6 +42,9 @@ class Finalizer(Output):
             metafile = f"{self._prefix}/meta.json" 
             with open(metafile, "w") as f:
                 f.write(json.dumps(metas))
+            
+            write_metrics(f"{self._prefix}/metrics.json")
+            write_trace(f"{self._prefix}/trace.json")
 
         except Exception as e:
             logging.error(e)
\ No newline at end of file
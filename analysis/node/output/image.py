@@ -56,7 +56,9 @@ class ImageWriter(Output):
                 #     f.write(byteImg)
                 
                 # self.close_writer()
-            self.write_meta()
+            # fed a few items at a time by a streaming run until closed
+            if not self.partial:
+                self.write_meta()
         except Exception as e:
             logging.error(e)
     
\ No newline at end of file
@@ -42,7 +42,9 @@ class Serializer(Output):
                 filename = f"{self._prefix}/{self._name}_{item.framestamp}.json"
                 with open(filename,"w") as f:
                     f.write(json.dumps(item.to_dict(),indent=4))
-            self.write_meta()
+            # fed a few items at a time by a streaming run until closed
+            if not self.partial:
+                self.write_meta()
         except Exception as e:
             logging.error(e)
     
\ No newline at end of file
@@ -99,7 +99,9 @@ class VideoWriter(Output):
                 put(tempfile,filename)
                 rm_file(tempfile)
 
-            self.write_meta()
+            # fed a few items at a time by a streaming run until closed
+            if not self.partial:
+                self.write_meta()
         except Exception as e:
             logging.error(e)
     
@@ -144,11 +146,17 @@ class ActiveVideoWriter(VideoWriter):
                         f.write(byteImg)
                 logging.info(f"item is of type {type(item)}")
                 self._writer.write(item.frame_bgr)
+            # the frames left in the queue at close are written first
+            if not self._continue:
+                self.finish()
         except Exception as e:
             logging.error(e)
-    
-    def close(self):
+
+    def finish(self):
+        if self._writer is None:
+            return
         self.close_writer()
+        self._writer = None
         logging.info(f"Putting {self._tempfile} into {self._filename}")
         put(self._tempfile,self._filename)
                 
\ No newline at end of file
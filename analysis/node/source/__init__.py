@@ -1,4 +1,5 @@
 
 from .stream import *
 from .video import *
-from .dynamic import *
\ No newline at end of file
+from .dynamic import *
+from .multi import *
\ No newline at end of file
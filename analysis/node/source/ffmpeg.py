@@ -0,0 +1,64 @@
+import subprocess as sp
+import shutil
+import logging
+import os
+
+
+def ffmpeg_binary(name="ffmpeg"):
+    # static builds go to /usr/local/bin, distribution packages to /usr/bin
+    for path in [f"/usr/local/bin/{name}",f"/usr/bin/{name}"]:
+        if os.path.exists(path):
+            return path
+    return shutil.which(name) or name
+
+def probe_keyframes(filename):
+    """
+    Times in seconds from the start of the video of the keyframes of its
+    first video stream, from the packet headers (nothing is decoded)
+    """
+    out = sp.run([ffmpeg_binary("ffprobe"),"-v","quiet","-select_streams","v:0",
+            "-show_entries","packet=pts_time,flags","-of","csv=p=0",filename],
+        stdout=sp.PIPE,check=True).stdout.decode()
+    return parse_keyframes(out)
+
+def parse_keyframes(out):
+    """
+    Keyframe times of the pts_time,flags lines of ffprobe (csv=p=0),
+    in decoding order, from the earliest presentation time
+    """
+    start = None
+    times = []
+    for line in out.splitlines():
+        pts,_,flags = line.partition(",")
+        if pts in ("","N/A"):
+            continue
+        pts = float(pts)
+        start = pts if start is None else min(start,pts)
+        if "K" in flags:
+            times.append(pts)
+    return sorted(t - start for t in times)
+
+def create_video_pipe(filename,input_args=(),output_args=(),pix_fmt="rgb24"):
+    """
+    Starts ffmpeg decoding filename to raw frames on its stdout. input_args
+    go before the input (e.g. decoder options) and output_args after it
+    (e.g. filters)
+    """
+    command = [ffmpeg_binary(),"-loglevel","quiet",*input_args,"-i",filename,
+        "-an",*output_args,"-f","rawvideo","-pix_fmt",pix_fmt,"-"]
+    logging.info(f"Starting ffmpeg pipe: {' '.join(command)}")
+    return sp.Popen(command,stdin=sp.DEVNULL,stdout=sp.PIPE)
+
+def read_frame(pipe,frame):
+    """
+    Reads the next frame of pipe into the contiguous uint8 array frame.
+    False at the end of the video
+    """
+    view = memoryview(frame).cast("B")
+    n = 0
+    while n < len(view):
+        read = pipe.stdout.readinto(view[n:])
+        if not read:
+            return False
+        n += read
+    return True
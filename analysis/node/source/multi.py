@@ -0,0 +1,84 @@
+from threading import Thread
+from queue import Queue
+import logging
+
+from .source import Source
+from .dynamic import DynamicSource
+
+# put by a stream reader when its stream ended
+_STREAM_DONE = object()
+
+class MultiStreamSource(Source):
+    """
+    Reads many streams (cameras, videos) in one workflow. Every stream is
+    read by its own source in a thread, frames are interleaved as they come
+    and tagged with the id of their stream. Stateful nodes keep their state
+    by stream (see Node.switch_stream)
+    """
+    def __init__(self,name,streams,sample_every=5,length=60,**kwargs):
+        Source.__init__(self,name)
+        self._sources = {}
+        for i,spec in enumerate(streams):
+            spec = dict(spec)
+            stream = spec.pop("id",i)
+            spec.setdefault("sample_every",sample_every)
+            spec.setdefault("length",length)
+            self._sources[stream] = DynamicSource(name=f"{name}_{stream}",**spec)
+        # a slow workflow blocks the readers, live streams then skip samples
+        self._frames = Queue(maxsize=2*len(self._sources))
+        self._failed = []
+        self._error_callback = None
+
+    @property
+    def stream_ids(self):
+        return list(self._sources)
+
+    def read_stream(self,stream,source):
+        try:
+            for frame in source.frames():
+                frame.stream = stream
+                self._frames.put(frame)
+        except Exception as e:
+            logging.error(f"Stream {stream} of {self._name} failed: {e}")
+            self._failed.append(stream)
+        finally:
+            try:
+                source.close()
+            except Exception as e:
+                logging.error(f"Couldn't close stream {stream} of {self._name}: {e}")
+            self._frames.put(_STREAM_DONE)
+
+    def frames(self):
+        self._failed = []
+        readers = [Thread(target=self.read_stream,args=(stream,source),daemon=True)
+            for stream,source in self._sources.items()]
+        for reader in readers:
+            reader.start()
+        logging.info(f"Reading {len(readers)} streams in {self._name}")
+        remaining = len(readers)
+        while remaining > 0:
+            frame = self._frames.get()
+            if frame is _STREAM_DONE:
+                remaining -= 1
+                logging.info(f"{remaining} streams left in {self._name}")
+                continue
+            yield frame
+
+    def run(self):
+        for frame in self.frames():
+            self.sink(frame)
+
+        if self._failed:
+            logging.warning(f"Streams {self._failed} of {self._name} failed")
+        if self._failed and len(self._failed) == len(self._sources):
+            if self._error_callback:
+                self._error_callback(self._name,f"All streams of {self._name} failed")
+        elif self._done_callback:
+            self._done_callback(self._name)
+        self.close_sinks()
+
+    def run_async(self,done_callback,error_callback):
+        self._done_callback = done_callback
+        self._error_callback = error_callback
+        self._thread = Thread(target=self.run,daemon=True)
+        self._thread.start()
@@ -0,0 +1,214 @@
+from multiprocessing import shared_memory
+from collections import deque
+import numpy as np
+import threading
+import weakref
+import ctypes
+import pickle
+import io
+import logging
+import os
+
+# rings of this process by shared memory name, to turn handles back into arrays
+_RINGS = weakref.WeakValueDictionary()
+
+# blocks of closed rings whose arrays were still around, closed by the
+# next ring close once they are gone
+_CLOSING = []
+
+def _close_block(shm,owner_pid):
+    # forked children inherit the ring but don't own the block
+    if owner_pid == os.getpid():
+        shm.unlink()
+    _CLOSING.append(shm)
+    for shm in list(_CLOSING):
+        try:
+            shm.close()
+        except BufferError:
+            # arrays still use the mapping
+            continue
+        _CLOSING.remove(shm)
+
+class FrameRing:
+    """
+    Preallocated frame slots in one shared memory block. A slot is handed
+    out as a plain numpy array and goes back to the ring once no array (or
+    view of it) references it anymore. Arrays in a slot can be passed to
+    other processes by handle instead of being copied
+    """
+    def __init__(self,nslots,shape,dtype=np.uint8,name=None):
+        self._nslots = int(nslots)
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._slot_bytes = int(np.prod(self._shape))*self._dtype.itemsize
+        create = name is None
+        if create:
+            self._shm = shared_memory.SharedMemory(create=True,size=self._nslots*self._slot_bytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._owner = create
+        self._pid = os.getpid()
+        self._free = deque(range(self._nslots)) if create else deque()
+        self._lock = threading.Lock()
+        self._slot_type = type("FrameSlot",(ctypes.c_char*self._slot_bytes,),{})
+        self._live = weakref.WeakValueDictionary()
+        self._exhausted = 0
+        self._finalizer = weakref.finalize(self,_close_block,self._shm,
+            self._pid if create else None)
+        _RINGS[self.name] = self
+        if create:
+            logging.info(f"Created ring {self.name} of {self._nslots} slots of {self._shape}")
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def nslots(self):
+        return self._nslots
+
+    @property
+    def free(self):
+        return len(self._free)
+
+    @property
+    def exhausted(self):
+        return self._exhausted
+
+    @property
+    def owned(self):
+        # False in forked children, the free slots are the parent's
+        return self._owner and self._pid == os.getpid()
+
+    @staticmethod
+    def attach(name,nslots,shape,dtype):
+        ring = _RINGS.get(name)
+        if ring is None:
+            ring = FrameRing(nslots,shape,dtype,name=name)
+        return ring
+
+    def _buffer(self,index):
+        # one buffer per slot, shared by all the arrays in it
+        buffer = self._live.get(index)
+        if buffer is None:
+            buffer = self._slot_type.from_buffer(self._shm.buf,index*self._slot_bytes)
+            buffer.ring = self
+            buffer.index = index
+            self._live[index] = buffer
+        return buffer
+
+    def _release(self,index):
+        with self._lock:
+            self._free.append(index)
+
+    def acquire(self):
+        """
+        Returns an array in a free slot or None when all slots are in use,
+        in which case the caller should allocate a heap array instead
+        """
+        with self._lock:
+            if len(self._free) == 0:
+                self._exhausted += 1
+                if self._exhausted == 1:
+                    logging.warning(f"All {self._nslots} slots of {self.name} are in use")
+                return None
+            index = self._free.popleft()
+        buffer = self._buffer(index)
+        weakref.finalize(buffer,self._release,index)
+        return np.frombuffer(buffer,dtype=self._dtype).reshape(self._shape)
+
+    def handle(self,array,buffer):
+        offset = array.__array_interface__["data"][0] - ctypes.addressof(buffer)
+        return (self.name,self._nslots,self._shape,self._dtype.str,buffer.index,
+            offset,array.shape,array.strides,array.dtype.str)
+
+    def view(self,index,offset,shape,strides,dtype):
+        if self.owned and index not in self._live:
+            # the sender is expected to hold the slot until the receiver is done
+            raise ValueError(f"Slot {index} of {self.name} was released")
+        buffer = self._buffer(index)
+        return np.ndarray(shape,dtype=dtype,buffer=buffer,offset=offset,strides=strides)
+
+    def close(self):
+        self._finalizer()
+
+def slot_handle(array):
+    """
+    Handle of the slot holding array (or None if it is not in a ring). It
+    stays valid as long as the sender keeps a reference to the array
+    """
+    base = array
+    while isinstance(base,np.ndarray):
+        base = base.base
+    ring = getattr(base,"ring",None)
+    if not isinstance(ring,FrameRing):
+        return None
+    return ring.handle(array,base)
+
+def from_slot_handle(handle):
+    name,nslots,ring_shape,ring_dtype,index,offset,shape,strides,dtype = handle
+    ring = FrameRing.attach(name,nslots,ring_shape,ring_dtype)
+    return ring.view(index,offset,shape,strides,dtype)
+
+# arrays smaller than this are cheaper to pickle than to map
+SHARED_MEMORY_MIN_BYTES = 64*1024
+# slots of every size of the transfer rings
+TRANSFER_SLOTS = 8
+
+# transfer rings of this process by slot size in bytes
+_TRANSFER_RINGS = {}
+_TRANSFER_LOCK = threading.Lock()
+
+def transfer_slot(nbytes):
+    """
+    Array of at least nbytes in a slot of the rings this process sends
+    heap arrays with, or None when the slots of that size are all in use
+    """
+    size = max(SHARED_MEMORY_MIN_BYTES,1 << (int(nbytes) - 1).bit_length())
+    with _TRANSFER_LOCK:
+        ring = _TRANSFER_RINGS.get(size)
+        if ring is None or not ring.owned:
+            ring = FrameRing(TRANSFER_SLOTS,(size,))
+            _TRANSFER_RINGS[size] = ring
+    return ring.acquire()
+
+class _SharedMemoryPickler(pickle.Pickler):
+    """
+    Pickles arrays in FrameRing slots by handle. Other large arrays (frames,
+    heatmaps, masks) are copied once to a transfer slot when the sender
+    holds them until the receiver is done, and pickled in band otherwise
+    """
+    def __init__(self,file,held):
+        pickle.Pickler.__init__(self,file,protocol=pickle.HIGHEST_PROTOCOL)
+        self._held = held
+
+    def persistent_id(self,obj):
+        if type(obj) != np.ndarray or obj.dtype.hasobject:
+            return None
+        handle = slot_handle(obj)
+        if handle is None and self._held is not None and obj.nbytes >= SHARED_MEMORY_MIN_BYTES:
+            slot = transfer_slot(obj.nbytes)
+            if slot is not None:
+                copy = slot[:obj.nbytes].view(obj.dtype).reshape(obj.shape)
+                np.copyto(copy,obj)
+                self._held.append(copy)
+                handle = slot_handle(copy)
+        return None if handle is None else ("slot",handle)
+
+class _SharedMemoryUnpickler(pickle.Unpickler):
+    def persistent_load(self,pid):
+        # a view of the slot, valid as long as the sender holds it
+        return from_slot_handle(pid[1])
+
+def dumps_shared(obj,held=None):
+    """
+    Pickles obj for another process. With held, a list the sender keeps
+    until the receiver is done (e.g. until the result of the item is
+    back), large heap arrays go through transfer slots appended to it
+    """
+    f = io.BytesIO()
+    _SharedMemoryPickler(f,held).dump(obj)
+    return f.getvalue()
+
+def loads_shared(data):
+    return _SharedMemoryUnpickler(io.BytesIO(data)).load()
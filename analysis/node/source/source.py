@@ -1,5 +1,7 @@
 
 from ..node import Node
+from ..tracing import sample
+from ..buffers import buffer_pool
 import logging
 import cv2
 import numpy as np
@@ -21,25 +23,72 @@ class Source(Node):
 
 
 class FalcoeyeFrame:
-    def __init__(self,frame,frame_number,relative_time,time_unit):
+    def __init__(self,frame,frame_number,relative_time,time_unit,stream=None,frame_bgr=None):
         #logging.info(f"New FalcoeyeFrame {frame_number} {relative_time}")
-        self._frame = frame.astype(np.uint8)
+        # pixels are kept in the order they are given in (RGB, or BGR from
+        # decoders with frame=None). The other order is converted on first
+        # use and cached until the frame is set again
+        # no copy for uint8 frames, e.g. frames decoded in a ring slot
+        self._frame = None if frame is None else np.asarray(frame,dtype=np.uint8)
+        self._frame_bgr = None if frame_bgr is None else np.asarray(frame_bgr,dtype=np.uint8)
         self._frame_number = frame_number
         self._relative_time = relative_time
-        self._frame_bgr = cv2.cvtColor(self._frame, cv2.COLOR_RGB2BGR)
         self._time_unit = time_unit
+        self._trace = sample(frame_number,stream)
+        # id of the stream of the frame when a source multiplexes several
+        self._stream = stream
+        # motion energy from the codec motion vectors, overall and by zone,
+        # when the source exports them
+        self._motion = None
+        self._zone_motion = None
     
     @property
     def size(self):
-        return self._frame.shape
+        return (self._frame if self._frame is not None else self._frame_bgr).shape
 
     @property
     def frame(self):
+        if self._frame is None:
+            self._frame = cv2.cvtColor(self._frame_bgr, cv2.COLOR_BGR2RGB,
+                dst=buffer_pool().acquire(self._frame_bgr.shape))
         return self._frame
 
     @property
     def frame_bgr(self):
+        if self._frame_bgr is None:
+            self._frame_bgr = cv2.cvtColor(self._frame, cv2.COLOR_RGB2BGR,
+                dst=buffer_pool().acquire(self._frame.shape))
         return self._frame_bgr
+
+    @property
+    def trace(self):
+        return self._trace
+
+    @property
+    def stream(self):
+        return self._stream
+
+    @stream.setter
+    def stream(self,stream):
+        self._stream = stream
+        if self._trace is not None:
+            self._trace.stream = stream
+
+    @property
+    def motion(self):
+        return self._motion
+
+    @motion.setter
+    def motion(self,motion):
+        self._motion = motion
+
+    @property
+    def zone_motion(self):
+        return self._zone_motion
+
+    @zone_motion.setter
+    def zone_motion(self,zone_motion):
+        self._zone_motion = zone_motion
     
 
     @property
@@ -54,29 +103,26 @@ class FalcoeyeFrame:
            return datetime.datetime.fromtimestamp(self._relative_time)
 
     def resize(self,width,height):
-        img = Image.fromarray(self._frame)
-        self._frame = np.asarray(img.resize(size=(width, height)))
-        self._frame_bgr = cv2.cvtColor(self._frame, cv2.COLOR_RGB2BGR)
+        # PIL resampling, as the models were fed so far
+        img = Image.fromarray(self.frame)
+        self.set_frame(np.asarray(img.resize(size=(width, height))))
 
     def set_frame(self,frame):
         self._frame = frame
-        self._frame_bgr = cv2.cvtColor(self._frame, cv2.COLOR_RGB2BGR)
+        self._frame_bgr = None
 
     def blend(self,image,alpha=0.5,inplace=True):
+        frame = self.frame
+        blended = cv2.addWeighted(frame,1-alpha,np.asarray(image,dtype=np.uint8),alpha,0,
+            dst=buffer_pool().acquire(frame.shape))
         if inplace:    
-            self.set_frame(np.asarray(
-                Image.blend(Image.fromarray(self._frame), 
-                Image.fromarray(image), 
-                alpha).convert("RGB")))
+            self.set_frame(blended)
             return self
         else:
-            return np.asarray(
-                Image.blend(Image.fromarray(self._frame), 
-                Image.fromarray(image), 
-                alpha).convert("RGB"))
+            return blended
 
     def save(self,prefix):
-        img = Image.fromarray(self._frame)
+        img = Image.fromarray(self.frame)
         logging.info(f"writing image for {self.framestamp}")
         img.save(f"{prefix}/{self.framestamp}.jpg")
 
@@ -1,7 +1,7 @@
 import re
 import subprocess as sp
 from queue import Queue
-from threading import Thread
+from threading import Thread, Condition
 import cv2
 import numpy as np
 import requests
@@ -10,10 +10,80 @@ import logging
 import time
 import os
 from .source import Source, FalcoeyeFrame
+from .ffmpeg import create_video_pipe, read_frame
+from ..buffers import buffer_pool
 
 
+class LatestFrameGrabber:
+    """
+    Grabs the frames of a cv2.VideoCapture in a thread as fast as they
+    come, so they never wait in its buffer. Only the frame following a
+    read request is retrieved (converted), reads get the latest frame of
+    the stream instead of one buffered while the previous was processed
+    """
+    # consecutive failed grabs before the stream is considered lost
+    MAX_FAILURES = 50
+
+    def __init__(self,capture):
+        self._capture = capture
+        self._condition = Condition()
+        self._wanted = False
+        self._frame = None
+        self._shape = None
+        self._running = True
+        self._thread = Thread(target=self.run,daemon=True)
+        self._thread.start()
+
+    def run(self):
+        failures = 0
+        while self._running:
+            if not self._capture.grab():
+                failures += 1
+                if failures >= self.MAX_FAILURES:
+                    logging.error(f"Lost the stream after {failures} failed grabs")
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            if not self._wanted:
+                continue
+            # into a pooled buffer of the size of the previous frame
+            buffer = None if self._shape is None else buffer_pool().acquire(self._shape)
+            hasFrame, frame = self._capture.retrieve(buffer)
+            if hasFrame:
+                self._shape = frame.shape
+                with self._condition:
+                    self._frame = frame
+                    self._wanted = False
+                    self._condition.notify_all()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def read(self,timeout=None):
+        with self._condition:
+            self._wanted = True
+            self._condition.wait_for(lambda: not self._wanted or not self._running,timeout)
+            if self._wanted:
+                self._wanted = False
+                return False,None
+            return True,self._frame
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
 
 class StreamingSource(Source):
+    # seconds to wait for a frame of the stream
+    READ_TIMEOUT = 10
+    # read() returns BGR frames (e.g. of cv2.VideoCapture) instead of RGB
+    bgr = False
+    # read() waits for the next sample itself (e.g. the fps filter of an
+    # ffmpeg pipe), frames() doesn't sleep between samples
+    paced = False
+
     def __init__(self, name, sample_every=5, length=30,**kwargs):
         Source.__init__(self,name)
         self._running = False
@@ -22,6 +92,7 @@ class StreamingSource(Source):
         if type(length) == str:
             self._length = float(length)
         self._streamer = None
+        self._grabber = None
         self._trial = 10
     
     def open(self):
@@ -33,40 +104,57 @@ class StreamingSource(Source):
     def read(self):
         raise NotImplementedError
 
-    def run(self):
+    def frames(self):
         self.open()
-        try:
-            count = 0
-            t_end = time.time() + self._length
-            c_time = time.time()
-            logging.info(f"Entering stream loop {c_time}")
+        count = 0
+        t_end = time.time() + self._length
+        c_time = time.time()
+        # samples are due on a fixed schedule, processing doesn't delay it
+        deadline = c_time
+        logging.info(f"Entering stream loop {c_time}")
 
-            while  c_time < t_end:
-                logging.info(f"Reading new frame")
-                # fetching new frame
-                count = 0
+        while  c_time < t_end:
+            logging.info(f"Reading new frame")
+            # fetching new frame
+            trials = 0
+            hasFrame, frame = self.read()
+            while not hasFrame and trials < self._trial:
                 hasFrame, frame = self.read()
-                while not hasFrame and count < self._trial:
-                    hasFrame, frame = self.read()
-                    count += 1
+                trials += 1
 
-                logging.info(f"New frame read? {hasFrame} {count} {c_time}")
-                if not hasFrame and count == self._trial:
-                    logging.error("Stream is not reachable")
-                    break
-                elif not hasFrame:
-                    logging.error("Unknown stream issue")
-                    break
-            
-                logging.info(f"New frame fetched {count} {c_time}")
+            logging.info(f"New frame read? {hasFrame} {trials} {c_time}")
+            if not hasFrame and trials == self._trial:
+                logging.error("Stream is not reachable")
+                break
+            elif not hasFrame:
+                logging.error("Unknown stream issue")
+                break
+        
+            logging.info(f"New frame fetched {count} {c_time}")
+            if self.bgr:
+                yield FalcoeyeFrame(None,count,c_time,"epoch",frame_bgr=frame)
+            else:
+                yield FalcoeyeFrame(frame,count,c_time,"epoch")
+            count += 1
+            if not self.paced:
+                # sleeping until the next sample is due, samples missed while
+                # processing are dropped rather than read in a burst
+                deadline += self._sample_every
+                delay = deadline - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    deadline = time.time()
+            c_time = time.time()
+
+        logging.info(f"Exiting stream loop {c_time}")
+
+    def run(self):
+        try:
+            for frame in self.frames():
                 # sinking data
-                self.sink(FalcoeyeFrame(frame,count,c_time,"epoch"))
-                # sleeping for $sample_every seconds
-                count += 1
-                time.sleep(self._sample_every)
-                c_time = time.time()
+                self.sink(frame)
 
-            logging.info(f"Exiting stream loop {c_time}")
             if self._done_callback:
                 self._done_callback(self._name)
         except Exception as e:
@@ -84,6 +172,9 @@ class StreamingSource(Source):
         self._thread.start()
 
 class StreamingServerSource(StreamingSource):
+    # the pipe writes bgr24, like cv2.VideoCapture
+    bgr = True
+
     def __init__(self, name, url,  resolution="best", sample_every=5, length=30,**kwargs):
         StreamingSource.__init__(self,name,sample_every,length)
         self._url = url
@@ -93,7 +184,7 @@ class StreamingServerSource(StreamingSource):
         self._frames_per_second = 30
  
     @staticmethod
-    def create_stream_pipe(url, resolution):
+    def create_stream_pipe(url, resolution, sample_every=None, size=None):
         if url == None:
             return None
 
@@ -104,30 +195,16 @@ class StreamingServerSource(StreamingSource):
             return None
         
         logging.info(f"Starting streaming with resolution {resolution}")
-        ffmpeg = "/usr/local/bin/ffmpeg"
-        if not os.path.exists(ffmpeg):
-            ffmpeg = "/usr/bin/ffmpeg"
-
         stream = streams[resolution]
-        pipe = sp.Popen(
-            [
-                ffmpeg,
-                "-i",
-                stream.url,
-                "-loglevel",
-                "quiet",  # no text output
-                "-an",  # disable audio
-                "-f",
-                "image2pipe",
-                "-pix_fmt",
-                "bgr24",
-                "-vcodec",
-                "rawvideo",
-                "-",
-            ],
-            stdin=sp.PIPE,
-            stdout=sp.PIPE,
-        )
+        # ffmpeg drops the frames between samples instead of writing them
+        # to the pipe, and makes sure frames have the expected size
+        filters = []
+        if sample_every:
+            filters.append(f"fps=1/{sample_every}")
+        if size:
+            filters.append(f"scale={size[0]}:{size[1]}")
+        output_args = ["-vf",",".join(filters)] if filters else []
+        pipe = create_video_pipe(stream.url,output_args=output_args,pix_fmt="bgr24")
         logging.info(f"Pipe instantiated")
         return pipe
 
@@ -137,19 +214,20 @@ class StreamingServerSource(StreamingSource):
     def close(self):
         logging.info("Closing streaming server")
         StreamingSource.close(self)
-        self._streamer.kill()
+        if self._streamer:
+            self._streamer.kill()
+            self._streamer.wait()
+        self._streamer = None
         logging.info("Streaming server closed")
     
     def read(self):
+        # back to the pool once downstream is done with the frame
+        frame = buffer_pool().acquire((self._height,self._width,3),metrics=self._metrics)
         try:
             logging.info("Fetching new frame from stream")
-            raw_image = self._streamer.stdout.read(
-                        self._height * self._width * 3
-                    )  # read length*width*3 bytes (= 1 frame)
-            logging.info("Frame fetched. Creating numpy")
-            frame = np.fromstring(raw_image, dtype="uint8").reshape(
-                (self._height, self._width, 3)
-            )
+            if not read_frame(self._streamer,frame):
+                logging.error("Stream ended")
+                return False,None
             logging.info("Frame fetching succeeded")
             return True,frame
         except Exception as error:
@@ -172,6 +250,8 @@ class AngelCamSource(StreamingServerSource):
         self._streamer = StreamingServerSource.create_pipe(self._m3u8,self._resolution)
 
 class YoutubeSource(StreamingServerSource):
+    # sampled by the fps filter of the pipe
+    paced = True
     resolutions = {
         "240p": {"width": 426, "height": 240},
         "360p": {"width": 640, "height": 360},
@@ -189,10 +269,13 @@ class YoutubeSource(StreamingServerSource):
 
     def open(self):
         StreamingServerSource.open(self)
-        logging.info(f"Creating pipe with {self._url}, {self._resolution}")
-        self._streamer = StreamingServerSource.create_stream_pipe(self._url, self._resolution)
+        if self._streamer is None:
+            logging.info(f"Creating pipe with {self._url}, {self._resolution}")
+            self._streamer = StreamingServerSource.create_stream_pipe(self._url, self._resolution,
+                self._sample_every,(self._width,self._height))
     
 class RTSPSource(StreamingSource):
+    bgr = True
     def __init__(self,name,host,port=554,username=None,password=None,sample_every=5, length=60,**kwargs):
         StreamingSource.__init__(self,name,sample_every,length)
         self._host = host
@@ -207,19 +290,24 @@ class RTSPSource(StreamingSource):
 
     def open(self):
         StreamingSource.open(self)
-        self._streamer = cv2.VideoCapture(self._url)
+        if self._streamer is None:
+            self._streamer = cv2.VideoCapture(self._url)
+            self._grabber = LatestFrameGrabber(self._streamer)
 
     def read(self):
-        ret, frame = self._streamer.read()
-        return ret,frame
+        return self._grabber.read(self.READ_TIMEOUT)
 
     def close(self):
         StreamingSource.close(self)
+        if self._grabber:
+            self._grabber.close()
         if self._streamer:
             self._streamer.release()
         self._streamer = None
+        self._grabber = None
  
 class M3U8Source(StreamingSource):
+    bgr = True
     resolutions = {"best": {"width": 320, "height": 180}}
     def __init__(self,name,url,sample_every=5, length=60,**kwargs):
         StreamingSource.__init__(self,name,sample_every,length)
@@ -227,17 +315,21 @@ class M3U8Source(StreamingSource):
 
     def open(self):
         StreamingSource.open(self)
-        self._streamer = cv2.VideoCapture(self._url)
+        if self._streamer is None:
+            self._streamer = cv2.VideoCapture(self._url)
+            self._grabber = LatestFrameGrabber(self._streamer)
 
     def read(self):
-        ret, frame = self._streamer.read()
-        return ret,frame
+        return self._grabber.read(self.READ_TIMEOUT)
 
     def close(self):
         StreamingSource.close(self)
+        if self._grabber:
+            self._grabber.close()
         if self._streamer:
             self._streamer.release()
         self._streamer = None
+        self._grabber = None
 
 
   
@@ -1,13 +1,51 @@
 from threading import Thread
+from collections import deque
+from multiprocessing import resource_tracker
+import multiprocessing as mp
 import cv2
 import numpy as np
 
 from .source import Source,FalcoeyeFrame
+from .shared import FrameRing, slot_handle, from_slot_handle, dumps_shared, loads_shared
+from ..buffers import buffer_pool
+from ..zones import rasterize
+from .ffmpeg import probe_keyframes, create_video_pipe, read_frame
 import logging
+import os
 from ...utils import download_file, rm_file
 
+_WORKER_SOURCE = None
+
+def _init_worker(source):
+    global _WORKER_SOURCE
+    _WORKER_SOURCE = source
+    # frames are decoded into the slots of the parent
+    source._ring_slots = 0
+    source._ring = None
+
+def _decode_segment(start,stop,handles):
+    source = _WORKER_SOURCE
+    if source._reader is None:
+        source.open()
+    source.seek(start)
+    decoded = []
+    # a handle by sample, None when the ring of the parent was exhausted
+    for handle,(counter,_,bgr) in zip(handles,source.decoded(start,stop)):
+        if handle is None:
+            decoded.append((counter,bgr))
+        else:
+            cv2.cvtColor(bgr,cv2.COLOR_BGR2RGB,dst=from_slot_handle(handle))
+            decoded.append((counter,None))
+    return dumps_shared(decoded)
+
 class VideoFileSource(Source):
-    def __init__(self, name, filename,sample_every,length=-1,**kwargs):
+    # keyframe interval assumed when gop_size isn't given, in seconds of video
+    DEFAULT_GOP_SECONDS = 2
+    # shared memory of the frames decoded in parallel
+    PARALLEL_RING_BYTES = 256*1024*1024
+
+    def __init__(self, name, filename,sample_every,length=-1,ring_slots=0,gop_size=None,keyframes_only=False,size="-1",workers=1,
+        motion_vectors=False,motion_zones=None,motion_threshold=None,**kwargs):
         Source.__init__(self,name)
         self._filename = filename
         self._sample_every = int(sample_every)
@@ -18,6 +56,50 @@ class VideoFileSource(Source):
         self._reader = None
         self.width = -1
         self.height = -1
+        # frames go to shared memory slots when > 0, e.g. for process pools
+        self._ring_slots = int(ring_slots)
+        self._ring = None
+        self._bgr = None
+        # frames between keyframes, strides shorter than that are skipped
+        # by decoding (grab) and longer ones by seeking
+        self._gop_size = int(gop_size) if gop_size else None
+        self._seeks = False
+        # decoding only keyframes with ffmpeg, for sparse sampling of long videos
+        self._keyframes_only = keyframes_only in [True,"true","True",1]
+        # "width,height" of the frames, e.g. of the model input. When given,
+        # ffmpeg samples, scales and converts the frames while decoding
+        self._size = None
+        if type(size) == str and size != "-1":
+            size = size.split(",")
+        if type(size) in [list,tuple]:
+            self._size = (int(size[0]),int(size[1]))
+        # frames get the motion energy of the codec motion vectors (PyAV),
+        # overall and in each zone polygon (in pixels, as for ZoneFilter).
+        # Frames with less than motion_threshold aren't converted nor sinked
+        self._motion_vectors = motion_vectors in [True,"true","True",1]
+        self._motion_zones = []
+        for points in motion_zones or []:
+            if type(points) == str:
+                points = points.split(",")
+                points = [[int(points[i]),int(points[i+1])] for i in range(0,len(points),2)]
+            self._motion_zones.append(points)
+        self._motion_threshold = None if motion_threshold is None else float(motion_threshold)
+        # processes decoding segments of the video in parallel when > 1.
+        # Forking now, before the workflow starts any thread
+        self._workers = int(workers)
+        self._pool = None
+        if self._workers > 1 and self._size:
+            # the workers decode with cv2, scaling is done by a single ffmpeg
+            raise ValueError(f"{name}: size can't be used with workers > 1")
+        if self._workers > 1 and (self._keyframes_only or self._motion_vectors):
+            # these read the whole video with a single reader
+            raise ValueError(f"{name}: keyframes_only and motion_vectors can't be used with workers > 1")
+        if self._workers > 1:
+            # one tracker for the ring the parent creates and the workers attach
+            resource_tracker.ensure_running()
+            self._pool = mp.get_context("fork").Pool(self._workers,
+                initializer=_init_worker,initargs=(self,))
+            logging.info(f"Started {self._workers} decoding workers for {name}")
 
     def open(self):
         # Downloading in the /temp from cloud storage
@@ -39,31 +121,300 @@ class VideoFileSource(Source):
                 self._length = value
         elif type(self._length) == int and self._length <= 0:
             self._length = video_length
+        if self._size:
+            self.width,self.height = self._size
         logging.info(f"opened file length: {self._length}, fps: {self._frames_per_second} width: {self.width} height: {self.height}")
+        if self._ring_slots > 0 and self._ring is None:
+            self._ring = FrameRing(self._ring_slots,(self.height,self.width,3))
+        if self._gop_size is None:
+            self._gop_size = max(int(self._frames_per_second*self.DEFAULT_GOP_SECONDS),1)
+        # a seek decodes again from the keyframe before the target, grabbing
+        # decodes without converting only the frames in between
+        self._seeks = self._sample_every > self._gop_size
+        logging.info(f"Sampling every {self._sample_every} frames by {'seeking' if self._seeks else 'grabbing'} (gop size: {self._gop_size})")
+
     def seek(self,n):
         self._reader.set(cv2.CAP_PROP_POS_FRAMES,n)
 
-    def run(self):
+    def skip(self,n):
+        for _ in range(n):
+            if not self._reader.grab():
+                return False
+        return True
+
+    def frames(self):
         self.open()
-        counter = 0
-        count = 0
+        if self._keyframes_only:
+            yield from self.keyframes()
+            return
+        if self._motion_vectors:
+            yield from self.motion_frames()
+            return
+        if self._size:
+            yield from self.scaled()
+            return
+        if self._pool is not None:
+            yield from self.parallel()
+            return
         logging.info(f"Start streaming from {self._filename}")
-        while counter < self._length:
-            hasFrame, frame = self._reader.read()
+        for count,(counter,frame,bgr) in enumerate(self.decoded(0,self._length)):
+            logging.info(f"Frame {counter}/{self._length}")
+            yield FalcoeyeFrame(frame,count,counter,"frame",frame_bgr=bgr)
+
+    def decoded(self,start,stop):
+        """
+        Yields the index and the RGB or (not converted) BGR frame of every
+        sample_every frames from start, where the reader is, to stop
+        """
+        counter = start
+        while counter < stop:
+            slot = self._ring.acquire() if self._ring is not None else None
+            if slot is None:
+                # left to the frame to convert, if anything reads RGB
+                hasFrame, bgr = self._reader.read(
+                    buffer_pool().acquire((self.height,self.width,3),metrics=self._metrics))
+            else:
+                # decoding into the same buffer every time
+                hasFrame, self._bgr = self._reader.read(self._bgr)
             if not hasFrame:
                 logging.info("No more frames. Breaking!")
                 break
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                  
-            logging.info(f"Frame {counter}/{self._length}")
-            self.sink(FalcoeyeFrame(frame,count,counter,"frame"))
-            #logging.info(f"Frame {counter}/{self._num_frames} sinked")
-            count += 1
+            if slot is None:
+                yield counter,None,bgr
+            elif slot.shape == self._bgr.shape:
+                yield counter,cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB, dst=slot),None
+            else:
+                yield counter,cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB),None
             counter += self._sample_every
-            if counter > self._length:
+            if counter >= stop:
+                break
+            if self._seeks:
+                self.seek(counter)
+            elif not self.skip(self._sample_every - 1):
+                logging.info("No more frames. Breaking!")
                 break
-            self.seek(counter)
+
+    def segments(self):
+        """
+        (start,stop) of the whole GOPs holding samples, from the first
+        sample after a keyframe to the next one, so that a worker seeking
+        to start decodes nothing before it
+        """
+        try:
+            keyframes = [int(round(t*self._frames_per_second)) for t in probe_keyframes(self._alter_filename)]
+        except Exception as e:
+            logging.warning(f"Keyframes of {self._filename} not probed: {e}")
+            keyframes = []
+        if len(keyframes) == 0:
+            logging.info(f"Assuming a keyframe every {self._gop_size} frames")
+            keyframes = range(0,int(np.ceil(self._length)),self._gop_size)
+        step = self._sample_every
+        starts = sorted({0} | {-(-k//step)*step for k in keyframes if k < self._length})
+        starts = [s for s in starts if s < self._length]
+        return list(zip(starts,starts[1:] + [self._length]))
+
+    def parallel_slots(self):
+        # frames of the ring the workers decode into, within the budget and
+        # half of the space left in /dev/shm (64MB in containers by default)
+        frame_bytes = self.height*self.width*3
+        budget = self.PARALLEL_RING_BYTES
+        try:
+            stats = os.statvfs("/dev/shm")
+            budget = min(budget,stats.f_bavail*stats.f_frsize//2)
+        except OSError:
+            pass
+        return max(budget//frame_bytes,1)
+
+    def parallel(self):
+        """
+        Workers decode segments of whole GOPs with their own reader, into
+        slots of a ring of this process: only the slot handles go through
+        the pool. Segments longer than the ring are cut, and segments are
+        sent while their samples fit in the free slots. They are collected
+        in order, so frames are too
+        """
+        if self._ring is None:
+            self._ring = FrameRing(self.parallel_slots(),(self.height,self.width,3))
+        step = self._sample_every
+        # a cut decodes again from the keyframe, only for GOPs longer than the ring
+        longest = self._ring.nslots*step
+        segments = deque()
+        for start,stop in self.segments():
+            for cut in range(start,int(np.ceil(stop)),longest):
+                end = min(cut + longest,stop)
+                segments.append((cut,end,len(range(cut,int(np.ceil(end)),step))))
+        logging.info(f"Start streaming {len(segments)} segments from {self._filename}")
+        inflight = deque()
+        count = 0
+        try:
+            while segments or inflight:
+                while (segments and len(inflight) < 2*self._workers
+                        and (len(inflight) == 0 or segments[0][2] <= self._ring.free)):
+                    start,stop,samples = segments.popleft()
+                    # held until the worker is done writing them. Without free
+                    # slots (frames held downstream) frames are sent in band
+                    slots = [self._ring.acquire() for _ in range(samples)]
+                    handles = [None if slot is None else slot_handle(slot) for slot in slots]
+                    inflight.append((self._pool.apply_async(_decode_segment,(start,stop,handles)),slots))
+                task,slots = inflight.popleft()
+                frames = loads_shared(task.get())
+                for (counter,bgr),slot in zip(frames,slots):
+                    logging.info(f"Frame {counter}/{self._length}")
+                    if bgr is None:
+                        yield FalcoeyeFrame(slot,count,counter,"frame")
+                    else:
+                        yield FalcoeyeFrame(None,count,counter,"frame",frame_bgr=bgr)
+                    count += 1
+                if len(frames) < len(slots):
+                    logging.info("No more frames. Breaking!")
+                    break
+                # the slots go back to the ring with the frames, not with the segment
+                del frames,slots
+        finally:
+            # the slots of the remaining segments are written until these are done
+            segments.clear()
+            while inflight:
+                inflight.popleft()[0].wait()
+
+    def zone_masks(self,width,height):
+        # from the process-wide cache, shared with the zone nodes
+        return [rasterize([points],width,height) for points in self._motion_zones]
+
+    @staticmethod
+    def motion_energy(vectors,width,height,masks):
+        """
+        Mean displacement in pixels of the pixels of the frame, and of the
+        pixels of each mask, from the motion vectors of its blocks
+        """
+        displacement = np.hypot(vectors["motion_x"],vectors["motion_y"])/vectors["motion_scale"]
+        energy = displacement*vectors["w"]*vectors["h"]
+        x = np.clip(vectors["dst_x"],0,width - 1)
+        y = np.clip(vectors["dst_y"],0,height - 1)
+        zones = np.array([energy[mask[y,x]].sum()/max(mask.sum(),1) for mask in masks])
+        return energy.sum()/(width*height),zones
+
+    def motion_frames(self):
+        """
+        Decodes with PyAV exporting the motion vectors, which come with the
+        decoding for free. A sampled frame gets the mean motion energy of
+        the frames since the previous sample. Intra frames have no vectors
+        and don't count
+        """
+        import av
+        container = av.open(self._alter_filename)
+        stream = container.streams.video[0]
+        stream.codec_context.options = {"flags2": "+export_mvs"}
+        width,height = stream.codec_context.width,stream.codec_context.height
+        masks = self.zone_masks(width,height)
+        logging.info(f"Start streaming from {self._filename} with motion vectors")
+        count = 0
+        motion,zone_motion = 0.0,np.zeros(len(masks))
+        energies = []
+        try:
+            for counter,decoded in enumerate(container.decode(stream)):
+                if counter >= self._length:
+                    break
+                vectors = decoded.side_data.get("MOTION_VECTORS")
+                if vectors is not None:
+                    energies.append(self.motion_energy(vectors.to_ndarray(),width,height,masks))
+                if counter % self._sample_every:
+                    continue
+                if energies:
+                    motion = float(np.mean([e for e,_ in energies]))
+                    zone_motion = np.mean([z for _,z in energies],axis=0)
+                    energies = []
+                # the first frame always goes, as a reference downstream
+                if self._motion_threshold is not None and count > 0 and motion < self._motion_threshold:
+                    continue
+                if self._size:
+                    # scaled while converting, bicubic as the ffmpeg scale filter
+                    frame = decoded.to_ndarray(format="rgb24",width=self.width,height=self.height,
+                        interpolation="BICUBIC")
+                else:
+                    frame = decoded.to_ndarray(format="rgb24")
+                logging.info(f"Frame {counter}/{self._length} motion {motion:.3f}")
+                item = FalcoeyeFrame(frame,count,counter,"frame")
+                item.motion = motion
+                item.zone_motion = zone_motion
+                yield item
+                count += 1
+        finally:
+            container.close()
+
+    def keyframes(self):
+        """
+        Decodes only the keyframes, taking the first one at or after every
+        sample_every frames. Frames are timestamped with their real index
+        """
+        times = probe_keyframes(self._alter_filename)
+        logging.info(f"Start streaming {len(times)} keyframes from {self._filename}")
+        output_args = ["-vsync","0"]
+        if self._size:
+            output_args += ["-vf",f"scale={self.width}:{self.height}"]
+        pipe = create_video_pipe(self._alter_filename,["-skip_frame","nokey"],output_args)
+        shape = (self.height,self.width,3)
+        # keyframes between samples are read here and dropped
+        skipped = np.empty(shape,dtype=np.uint8)
+        count = 0
+        next_counter = 0
+        try:
+            for t in times:
+                counter = int(round(t*self._frames_per_second))
+                if counter >= self._length:
+                    break
+                if counter < next_counter:
+                    if not read_frame(pipe,skipped):
+                        break
+                    continue
+                slot = self._ring.acquire() if self._ring is not None else None
+                if slot is None or slot.shape != shape:
+                    frame = buffer_pool().acquire(shape,metrics=self._metrics)
+                else:
+                    frame = slot
+                if not read_frame(pipe,frame):
+                    logging.info("No more frames. Breaking!")
+                    break
+                logging.info(f"Keyframe {counter}/{self._length}")
+                yield FalcoeyeFrame(frame,count,counter,"frame")
+                count += 1
+                next_counter = counter + self._sample_every
+        finally:
+            pipe.kill()
+            pipe.wait()
+
+    def scaled(self):
+        """
+        Decodes with ffmpeg, which drops the frames between samples and
+        scales and converts the others to RGB, read straight into frames
+        of the requested size
+        """
+        logging.info(f"Start streaming from {self._filename} at {self.width}x{self.height}")
+        # select keeps exactly the frames of the cv2 path, an fps filter would
+        # pick them by time
+        vf = f"select=not(mod(n\\,{self._sample_every})),scale={self.width}:{self.height}"
+        pipe = create_video_pipe(self._alter_filename,output_args=["-vf",vf,"-vsync","0"])
+        shape = (self.height,self.width,3)
+        counter = 0
+        count = 0
+        try:
+            while counter < self._length:
+                slot = self._ring.acquire() if self._ring is not None else None
+                frame = slot if slot is not None else buffer_pool().acquire(shape,metrics=self._metrics)
+                if not read_frame(pipe,frame):
+                    logging.info("No more frames. Breaking!")
+                    break
+                logging.info(f"Frame {counter}/{self._length}")
+                yield FalcoeyeFrame(frame,count,counter,"frame")
+                count += 1
+                counter += self._sample_every
+        finally:
+            pipe.kill()
+            pipe.wait()
+
+    def run(self):
+        for frame in self.frames():
+            self.sink(frame)
 
         logging.info(f"Streaming completed")
         if self._done_callback:
@@ -83,5 +434,9 @@ class VideoFileSource(Source):
 
     def close(self):
         self._reader.release()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
     
 
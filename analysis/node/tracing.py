@@ -0,0 +1,123 @@
+import threading
+import logging
+import json
+import time
+import os
+
+# fraction of the frames traced, 0 disables tracing
+_SAMPLE_RATE = 0.0
+_SAMPLED = 0
+_SEEN = 0
+# traces are kept until exported, bounded for long live streams
+MAX_TRACES = 10000
+_TRACES = []
+_LOCK = threading.Lock()
+
+class FrameTrace:
+    """
+    Times of the enqueue, start and finish events of one frame in each
+    node it goes through
+    """
+    def __init__(self,frame_id,stream=None):
+        self.frame_id = frame_id
+        # frame ids are only unique within a stream
+        self.stream = stream
+        self.events = []
+
+    def record(self,node,phase):
+        # list.append is atomic, nodes in different threads can record
+        self.events.append((node,phase,time.perf_counter()))
+
+def configure(sample_rate):
+    global _SAMPLE_RATE, _SAMPLED, _SEEN
+    with _LOCK:
+        _SAMPLE_RATE = min(max(float(sample_rate),0.0),1.0)
+        _SAMPLED = 0
+        _SEEN = 0
+        _TRACES.clear()
+    if _SAMPLE_RATE > 0:
+        logging.info(f"Tracing {_SAMPLE_RATE*100}% of the frames")
+
+def enabled():
+    return _SAMPLE_RATE > 0
+
+def sample(frame_id,stream=None):
+    """
+    Returns a new trace for the frame if it is sampled, None otherwise.
+    Sampling is evenly spread, e.g. one frame in ten for 0.1
+    """
+    global _SAMPLED, _SEEN
+    if _SAMPLE_RATE <= 0:
+        return None
+    with _LOCK:
+        _SEEN += 1
+        if _SAMPLED >= _SEEN*_SAMPLE_RATE or len(_TRACES) >= MAX_TRACES:
+            return None
+        _SAMPLED += 1
+        trace = FrameTrace(frame_id,stream)
+        _TRACES.append(trace)
+    return trace
+
+def trace_of(item):
+    # frames and AI wrappers have a trace, model outputs are [frame,result]
+    if isinstance(item,(list,tuple)):
+        return trace_of(item[0]) if len(item) > 0 else None
+    if getattr(type(item),"trace",None) is None:
+        return None
+    return item.trace
+
+def record(item,node,phase):
+    if _SAMPLE_RATE <= 0:
+        return
+    trace = trace_of(item)
+    if trace is not None:
+        trace.record(node,phase)
+
+def to_chrome_events():
+    """
+    One process (pid) per stream and one row (tid) per frame of it, with
+    a slice for the wait in the queue and one for the work of each node
+    """
+    with _LOCK:
+        traces = list(_TRACES)
+    events = [e for t in traces for e in t.events]
+    if len(events) == 0:
+        return []
+    origin = min(e[2] for e in events)
+    us = lambda t: round((t - origin)*1e6,3)
+    chrome = []
+    pids = {}
+    for trace in traces:
+        if trace.stream not in pids:
+            pids[trace.stream] = len(pids)
+            if trace.stream is not None:
+                chrome.append({"name": "process_name","ph": "M","pid": pids[trace.stream],
+                    "args": {"name": f"stream {trace.stream}"}})
+        pid = pids[trace.stream]
+        enqueued,started = {},{}
+        for node,phase,t in list(trace.events):
+            if phase == "enqueue":
+                enqueued[node] = t
+            elif phase == "start":
+                started[node] = t
+                if node in enqueued:
+                    queued = enqueued.pop(node)
+                    chrome.append({"name": f"{node} queue","cat": "queue","ph": "X",
+                        "ts": us(queued),"dur": us(t) - us(queued),
+                        "pid": pid,"tid": trace.frame_id})
+            elif phase == "finish" and node in started:
+                start = started.pop(node)
+                chrome.append({"name": node,"cat": "node","ph": "X",
+                    "ts": us(start),"dur": us(t) - us(start),
+                    "pid": pid,"tid": trace.frame_id})
+    return chrome
+
+def write_trace(filename):
+    chrome = to_chrome_events()
+    if len(chrome) == 0:
+        return
+    tmpfile = f"{filename}.tmp"
+    with open(os.path.relpath(tmpfile),"w") as f:
+        f.write(json.dumps({"traceEvents": chrome,"displayTimeUnit": "ms"}))
+    os.replace(os.path.relpath(tmpfile),os.path.relpath(filename))
+    logging.info(f"Trace of {len(_TRACES)} frames written to {filename}")
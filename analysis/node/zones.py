@@ -0,0 +1,111 @@
+from PIL import ImageDraw, Image
+from functools import lru_cache
+import numpy as np
+
+# points of a box (x1,y1,x2,y2) looked up in the zones
+ANCHORS = ("corners","centroid","bottom_center")
+# rasterized polygons kept for the whole process, a 1080p RGB image is 6MB
+MASK_CACHE_SIZE = 32
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _rasterize(polygons,width,height,mode,fill):
+    if mode == "bits":
+        dtype = np.dtype(next(t for t in [np.uint8,np.uint16,np.uint32,np.uint64]
+            if np.dtype(t).itemsize*8 >= len(polygons)))
+        image = np.zeros((height,width),dtype=dtype)
+        for z,points in enumerate(polygons):
+            mask = _rasterize((points,),width,height,"mask",1)
+            image |= mask.astype(dtype) << dtype.type(z)
+    else:
+        image = Image.new("L" if mode == "mask" else mode, (width, height), 0)
+        for points in polygons:
+            ImageDraw.Draw(image).polygon(points, outline=1, fill=fill)
+        image = np.array(image)
+        if mode == "mask":
+            image = image.astype(bool)
+    # shared by all the nodes asking for it
+    image.flags.writeable = False
+    return image
+
+def rasterize(polygons,width,height,mode="mask",fill=1):
+    """
+    Polygons (lists of x,y pixel points) drawn in a width x height image,
+    cached by polygons, size and mode. The mode is:
+    - mask: True inside any of the polygons
+    - bits: bit i set inside polygon i (at most 64)
+    - a PIL mode (e.g. RGB): the polygons filled with fill
+    The image is read-only
+    """
+    polygons = tuple(tuple(tuple(p) for p in points) for points in polygons)
+    if isinstance(fill,list):
+        fill = tuple(fill)
+    return _rasterize(polygons,int(width),int(height),mode,fill)
+
+mask_cache_info = _rasterize.cache_info
+
+class ZoneEngine:
+    """
+    Tests boxes against many polygons (zones) at once. The zones are
+    rasterized in one image with a bit by zone, so all the anchor points of
+    all the boxes are looked up in one indexing, whatever the number of
+    zones. A box is in a zone when any of its anchor points is
+    """
+    MAX_ZONES = 64
+
+    def __init__(self,zones,anchor="corners"):
+        if len(zones) > self.MAX_ZONES:
+            raise ValueError(f"At most {self.MAX_ZONES} zones, got {len(zones)}")
+        if anchor not in ANCHORS:
+            raise ValueError(f"Unknown anchor {anchor}, expected one of {ANCHORS}")
+        self._zones = zones
+        self._anchor = anchor
+        self._bits = None
+        self._width, self._height = -1, -1
+
+    @property
+    def count(self):
+        return len(self._zones)
+
+    def rasterize(self,width,height):
+        # called for every frame, the zones change only with the frame size
+        if (width,height) != (self._width,self._height):
+            self._bits = rasterize(self._zones,width,height,"bits")
+            self._width, self._height = width, height
+
+    def points(self,boxes):
+        """
+        Pixel columns and rows (N x points) of the anchor points of the
+        boxes, given as x1,y1,x2,y2 relative to the frame size
+        """
+        # scaled down so that boxes touching the border stay in the frame
+        x1,y1,x2,y2 = (np.asarray(boxes).reshape(-1,4) * 0.9999).T
+        if self._anchor == "corners":
+            xs = np.stack([x1,x1,x2,x2],axis=1)
+            ys = np.stack([y1,y2,y1,y2],axis=1)
+        elif self._anchor == "centroid":
+            xs = ((x1 + x2)/2)[:,None]
+            ys = ((y1 + y2)/2)[:,None]
+        else:
+            xs = ((x1 + x2)/2)[:,None]
+            ys = y2[:,None]
+        return (xs * self._width).astype(int), (ys * self._height).astype(int)
+
+    def bits_of(self,boxes):
+        # bit z of every box is set when the box is in zone z
+        xs,ys = self.points(boxes)
+        return np.bitwise_or.reduce(self._bits[ys,xs],axis=1)
+
+    def member(self,boxes):
+        """
+        N x zones, True where the box is in the zone
+        """
+        shifts = np.arange(self.count,dtype=self._bits.dtype)
+        return ((self.bits_of(boxes)[:,None] >> shifts) & 1).astype(bool)
+
+    def counts(self,boxes,class_ids,nclasses):
+        """
+        zones x nclasses, the number of boxes of every class in every zone
+        """
+        box,zone = np.nonzero(self.member(boxes))
+        flat = zone*nclasses + np.asarray(class_ids)[box]
+        return np.bincount(flat,minlength=self.count*nclasses).reshape(self.count,nclasses)
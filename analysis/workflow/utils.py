@@ -16,3 +16,32 @@ def fill_args(structure,workflow_args,args):
             logging.info(f"{k}: {v}")
             fill_value(k,v,n,workflow_args,args)
             logging.info(f"{k}:{n[k]}")
+
+def topological_order(names,edges):
+    """
+    Orders names so that every node comes after the nodes feeding it.
+    Edges to or from nodes not in names are ignored and ties keep the
+    order of names
+    """
+    indegree = {n: 0 for n in names}
+    children = {n: [] for n in names}
+    for edge in edges:
+        f,t = edge[0],edge[1]
+        if f in indegree and t in indegree:
+            children[f].append(t)
+            indegree[t] += 1
+    
+    ready = [n for n in names if indegree[n] == 0]
+    order = []
+    while ready:
+        n = ready.pop(0)
+        order.append(n)
+        for c in children[n]:
+            indegree[c] -= 1
+            if indegree[c] == 0:
+                ready.append(c)
+    
+    if len(order) != len(names):
+        cycle = [n for n in names if n not in order]
+        raise ValueError(f"Workflow edges contain a cycle through {cycle}")
+    return order
@@ -1,5 +1,7 @@
-from .utils import fill_args
-from ..node import create_node_from_dict,Source
+from .utils import fill_args, topological_order
+from ..node import create_node_from_dict,Source,SequenceRunner,FusedChain
+from ..node.metrics import MetricsReporter, write_metrics
+from ..node import tracing
 import logging 
 import threading
 from ..utils import get_service,message as ResponseMessage
@@ -40,27 +42,118 @@ def post_new_status(aid,status,msg):
         )
 
 class Workflow:
-    def __init__(self,analysis_id,nodes,starters,nodes_in_order):
+    def __init__(self,analysis_id,nodes,starters,nodes_in_order,micro_batch=1,
+        prefix=None,metrics_interval=60):
         self._analysis_id = analysis_id
         self._nodes = nodes
         self._starters = starters
         self._nodes_in_order = nodes_in_order
+        self._micro_batch = max(int(micro_batch),1)
         self._busy = False
         self._tasks = {}
+        self._done = threading.Event()
+        self._prefix = prefix
+        self._reporter = None
+        if prefix and float(metrics_interval) > 0:
+            self._reporter = MetricsReporter(f"{prefix}/metrics.json",float(metrics_interval))
+
+    def start_reporting(self):
+        if self._reporter:
+            self._reporter.start()
+
+    def stop_reporting(self):
+        if self._reporter:
+            self._reporter.stop()
+        if self._prefix:
+            try:
+                write_metrics(f"{self._prefix}/metrics.json")
+                tracing.write_trace(f"{self._prefix}/trace.json")
+            except Exception as e:
+                logging.error(e)
     
     def run_sequentially(self):
         logging.info(f"Running {self._analysis_id} sequentially")
         self._busy = True
+        self._done.clear()
+        for n in self._nodes.values():
+            # nodes run one after the other, a bounded queue would either
+            # block forever or drop most of the frames
+            if n.capacity > 0:
+                logging.warning(f"Ignoring capacity of {n.name} in sequential run")
+                n.set_capacity(0)
         for n in self._nodes_in_order:
             logging.info(f"Running {n._name}")
             n.run()
         logging.info(f"{self._analysis_id} completed")
         self._busy = False
+        self._done.set()
+
+    def run_streaming(self):
+        """
+        Inline run that pushes each frame (or micro batch of frames) through
+        the whole workflow before reading the next one. Unlike run_sequentially,
+        the frames of the video are never all held in memory at once.
+        Nodes are run once per micro batch while open: aggregators and
+        outputs keep what they got and finish (sink their table, write their
+        meta, close their video) in the run after close
+        """
+        if not all(hasattr(s,"frames") for s in self._starters):
+            logging.warning(f"Not all starters of {self._analysis_id} can stream frames. Running sequentially")
+            self.run_sequentially()
+            return
+
+        logging.info(f"Running {self._analysis_id} as a stream of {self._micro_batch} frame batches")
+        self._busy = True
+        self._done.clear()
+        for n in self._nodes.values():
+            if n.capacity > 0:
+                logging.warning(f"Ignoring capacity of {n.name} in streaming run")
+                n.set_capacity(0)
+            # members of runners too, they are run per micro batch as well
+            n.set_streaming(True)
+        
+        downstream = [n for n in self._nodes_in_order if n not in self._starters]
+        for n in downstream:
+            n.open()
+        self.start_reporting()
+
+        streams = [(s,s.frames()) for s in self._starters]
+        pending = 0
+        while streams:
+            # round robin between starters, one frame each
+            for stream in list(streams):
+                source,frames = stream
+                frame = next(frames,None)
+                if frame is None:
+                    streams.remove(stream)
+                    continue
+                source.sink(frame)
+                pending += 1
+                if pending == self._micro_batch:
+                    for n in downstream:
+                        n.run()
+                    pending = 0
+        
+        for s in self._starters:
+            s.close()
+        # closing in order so each node flushes into an open sink first, 
+        # then it is closed and flushed itself
+        for n in downstream:
+            n.close()
+            n.run()
+        for n in self._nodes.values():
+            n.set_streaming(False)
+        self.stop_reporting()
+        logging.info(f"{self._analysis_id} completed")
+        self._busy = False
+        self._done.set()
 
     def run_sequentially_async(self):
         logging.info(f"Running {self._analysis_id} asynchronously")
         self._busy = True
+        self._done.clear()
         self._tasks = {}
+        self.start_reporting()
         for n in self._nodes_in_order:
             # TODO: rename or do something, looks ugly
             self._tasks[n.name] = {"done":False,"noerror":True,"message": None}
@@ -85,7 +178,16 @@ class Workflow:
                 message = "\n".join([a["message"] for _,a in self._tasks.items() if a["message"]])
                 post_new_status(aid,"Error",message) 
                 logging.info("Done all with error! closing analysis")
+            self.stop_reporting()
             self._busy = False
+            self._done.set()
+
+    def wait(self,timeout=None):
+        """
+        Blocks until all the nodes are done. Returns False if the timeout
+        expired before that
+        """
+        return self._done.wait(timeout)
     
     def error_task_callback(self,task,error):
         logging.error(error)
@@ -111,29 +213,115 @@ class WorkflowFactory:
 
         # This is important for output nodes
         nodes = {}
+        # nodes run by other nodes (e.g. inside a sequence runner)
+        members = set()
+        # node name -> name of the node it is passed to
+        owners = {}
         for n in nodes_json:
             logging.info(f"creating node {n}")
+            member_names = []
             for k in n.keys():
                 if "nodes" in k:
+                    member_names += n[k]
                     n[k] = [nodes[i] for i in n[k]]
                 elif "node" in k:
+                    member_names.append(n[k])
                     n[k] = nodes[n[k]]
             logging.info(n)
             nodes[n["name"]] = create_node_from_dict(n)
+            if nodes[n["name"]].runs_members:
+                members.update(member_names)
+            owners.update({m: n["name"] for m in member_names})
         
         
         logging.info(nodes)
 
         edgelist = workflow_structure["edges"]
-        for f,t in edgelist:
+        # optional third item e.g. {"capacity": 8, "policy": "drop_oldest"}
+        edge_options = [e[2] for e in edgelist if len(e) > 2]
+        fill_args(edge_options,workflow_args,analysis["args"])
+        for edge in edgelist:
+            f,t = edge[0],edge[1]
             nodes[f].add_sink(nodes[t])
+            if len(edge) > 2:
+                # the queue belongs to the receiving node
+                nodes[t].set_capacity(edge[2].get("capacity",0),
+                    edge[2].get("policy","block"))
         
         starterslist = workflow_structure["starters"]
         starters = [nodes[s] for s in starterslist]
     
-        run_order = workflow_structure["run_order"]
+        if "run_order" in workflow_structure:
+            run_order = workflow_structure["run_order"]
+        else:
+            run_order = topological_order(
+                [n for n in nodes if n not in members],edgelist)
+            if not workflow_structure.get("inline",False):
+                # consumers have to be waiting before producers start
+                run_order = run_order[::-1]
+            logging.info(f"Derived run order {run_order}")
+        
+        if workflow_structure.get("fuse",True):
+            run_order = WorkflowFactory.fuse(nodes,edgelist,owners,run_order)
         nodes_in_order = [nodes[n] for n in run_order]
         
-        w = Workflow(analysis["id"],nodes,starters,nodes_in_order)
+        prefix = analysis["args"].get("prefix")
+        tracing.configure(workflow_structure.get("trace_sample_rate",0))
+        w = Workflow(analysis["id"],nodes,starters,nodes_in_order,
+            workflow_structure.get("micro_batch",1),prefix,
+            workflow_structure.get("metrics_interval",60))
+
+        return w
+
+    @staticmethod
+    def fuse(nodes,edgelist,owners,run_order):
+        """
+        Replaces chains of stateless nodes, where each link is the only output
+        of a node and the only input of the next, with a FusedChain. Chains are
+        looked for in the run order and in sequence runners. New nodes are 
+        added to nodes and the new run order is returned
+        """
+        producers = {n: [] for n in nodes}
+        for edge in edgelist:
+            producers[edge[1]].append(edge[0])
 
-        return w
\ No newline at end of file
+        groups = [(None,run_order)]
+        groups += [(name,[m.name for m in n._nodes]) for name,n in nodes.items() 
+            if isinstance(n,SequenceRunner)]
+        
+        for owner,group in groups:
+            fusable = lambda name: (name in group and nodes[name].stateless 
+                and owners.get(name) == owner)
+            chains = {}
+            fused_names = set()
+            for name in group:
+                if name in fused_names or not fusable(name):
+                    continue
+                chain = [name]
+                while len(nodes[chain[-1]]._sinks) == 1:
+                    following = nodes[chain[-1]]._sinks[0].name
+                    # the first node of a sequence runner is also fed by the runner
+                    if (not fusable(following) or following in chain 
+                        or following in fused_names
+                        or producers[following] != [chain[-1]] 
+                        or (owner and following == group[0])):
+                        break
+                    chain.append(following)
+                if len(chain) > 1:
+                    chains[name] = chain
+                    fused_names.update(chain)
+            
+            for head,chain in chains.items():
+                fused = FusedChain("+".join(chain),[nodes[c] for c in chain])
+                logging.info(f"Fusing {chain} into {fused.name}")
+                for n in nodes.values():
+                    n._sinks[:] = [fused if s is nodes[head] else s for s in n._sinks]
+                nodes[fused.name] = fused
+            
+            new_group = ["+".join(chains[n]) if n in chains else n for n in group 
+                if n in chains or n not in fused_names]
+            if owner:
+                nodes[owner]._nodes = [nodes[n] for n in new_group]
+            else:
+                run_order = new_group
+        return run_order
\ No newline at end of file
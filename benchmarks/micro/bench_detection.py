@@ -0,0 +1,73 @@
+from ...analysis.node.node import Node
+from ...analysis.node.ai.utils import non_max_suppression
+from ...analysis.node.ai.detection import FalcoeyeTorchDetectionNode, FalcoeyeDetection
+from ...analysis.node.filter.spatial import ZoneFilter
+from ...analysis.node.agg.spatial import ZoneCounter
+from ...analysis.node.source.source import FalcoeyeFrame
+import numpy as np
+import pytest
+
+# raw output of a yolo model on a 1280x720 frame before nms
+NBOXES = 300
+WIDTH, HEIGHT = 1280, 720
+ZONE = [[100,100],[900,80],[1200,650],[200,700]]
+LABELMAP = {str(i): f"class_{i}" for i in range(80)}
+
+def raw_boxes(n=NBOXES,seed=0):
+    rng = np.random.default_rng(seed)
+    # clusters of overlapping boxes around a few objects, like before nms
+    centers = rng.uniform([0,0],[WIDTH,HEIGHT],(n//10,2)).repeat(10,axis=0)
+    centers += rng.normal(0,8,centers.shape)
+    sizes = rng.uniform(20,200,(len(centers),2))
+    boxes = np.concatenate([centers - sizes/2,centers + sizes/2],axis=1)
+    scores = rng.uniform(0,1,len(boxes))
+    classes = rng.integers(0,80,len(boxes))
+    return boxes,scores,classes
+
+def detections(count=100,seed=0):
+    # normalized boxes after nms, as zone filters and counters get them
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0,0.9,(count,2))
+    boxes = np.concatenate([corners,corners + rng.uniform(0.01,0.1,(count,2))],axis=1)
+    scores = np.full(count,0.5)
+    # person and car in turns
+    class_ids = np.arange(count)%2
+    return boxes,scores,class_ids,("person","car")
+
+@pytest.fixture(scope="module")
+def frame():
+    return FalcoeyeFrame(np.zeros((HEIGHT,WIDTH,3),dtype=np.uint8),0,0,"frame")
+
+@pytest.mark.benchmark(group="detection")
+def bench_non_max_suppression(benchmark):
+    boxes,scores,_ = raw_boxes()
+    picks = benchmark(non_max_suppression,boxes,scores,0.3)
+    assert 0 < len(picks) < NBOXES
+
+@pytest.mark.benchmark(group="detection")
+def bench_detection_finalize(benchmark):
+    boxes,scores,classes = raw_boxes()
+    node = FalcoeyeTorchDetectionNode("bench_detection",LABELMAP,0.3,100,0.3)
+    boxes,_,_ = benchmark(node.finalize,boxes,classes,scores)
+    assert len(boxes) > 0
+
+@pytest.mark.benchmark(group="zone")
+def bench_zone_filter_run(benchmark,frame):
+    zone = ZoneFilter("bench_zone_filter",ZONE)
+    sink = Node("bench_zone_sink")
+    zone.add_sink(sink)
+    # the mask is built on the first item, only the steady state is measured
+    zone.initialize(WIDTH,HEIGHT)
+    def setup():
+        # filtering deletes in place, every round gets a new item
+        zone.put(FalcoeyeDetection(frame,*detections()))
+    benchmark.pedantic(zone.run,setup=setup,rounds=200,warmup_rounds=5)
+    assert 0 < sink.get().count < 100
+
+@pytest.mark.benchmark(group="zone")
+def bench_zone_counter_run_once(benchmark,frame):
+    counter = ZoneCounter("bench_zone_counter",ZONE,["car","person"])
+    item = FalcoeyeDetection(frame,*detections())
+    counter.run_once(item)
+    row = benchmark(counter.run_once,item)
+    assert row[2:].sum() > 0
@@ -0,0 +1,80 @@
+from ...analysis.node.ai.hpe.hpe import BODY_CONFIG
+from ...analysis.node.ai.hpe.coordinates import get_coordinates
+from ...analysis.node.ai.hpe.connections import get_connections
+from ...analysis.node.ai.hpe.estimators import estimate
+from ...analysis.node.ai.action.skeleton.feature_procs import FeatureGenerator
+from ...analysis.node.ai.action.skeleton.feature_procs import get_an_example_of_standing_skeleton
+import numpy as np
+import itertools
+import pytest
+
+# openpose output of a 368x368 input: 18 parts + background and 19 limbs
+SIZE = 46
+NHEATMAPS = 19
+NPAFS = 38
+NPEOPLE = 4
+
+def pose_maps(npeople=NPEOPLE,seed=0):
+    """
+    Heatmaps with a gaussian peak per joint and pafs with unit vectors along
+    each limb, for npeople standing side by side, plus some noise
+    """
+    rng = np.random.default_rng(seed)
+    skeleton = get_an_example_of_standing_skeleton().reshape(-1,2)
+    heatmaps = rng.uniform(0,0.05,(SIZE,SIZE,NHEATMAPS))
+    pafs = rng.uniform(-0.02,0.02,(SIZE,SIZE,NPAFS))
+    ys,xs = np.mgrid[0:SIZE,0:SIZE]
+    for p in range(npeople):
+        # about 30 cells high, one person every 10 cells
+        joints = (skeleton - [0.57,0.1])*[60,60] + [8 + 10*p,8]
+        for part in BODY_CONFIG.body_parts.values():
+            x,y = joints[int(part.body_part)]
+            peak = np.exp(-((xs - x)**2 + (ys - y)**2)/2)
+            heatmaps[:,:,part.heatmap_idx] = np.maximum(heatmaps[:,:,part.heatmap_idx],peak)
+        for conn in BODY_CONFIG.connection_types:
+            a,b = joints[int(conn.from_body_part)],joints[int(conn.to_body_part)]
+            norm = np.linalg.norm(b - a)
+            if norm == 0:
+                continue
+            for t in np.linspace(0,1,50):
+                x,y = np.round(a + t*(b - a)).astype(int)
+                if 0 <= x < SIZE and 0 <= y < SIZE:
+                    pafs[y,x,conn.paf_dx_idx],pafs[y,x,conn.paf_dy_idx] = (b - a)/norm
+    return heatmaps,pafs
+
+@pytest.fixture(scope="module")
+def maps():
+    return pose_maps()
+
+@pytest.mark.benchmark(group="hpe")
+def bench_get_coordinates(benchmark,maps):
+    heatmaps,_ = maps
+    coords = benchmark(get_coordinates,BODY_CONFIG,heatmaps)
+    assert len(coords["neck"]) == NPEOPLE
+
+@pytest.mark.benchmark(group="hpe")
+def bench_get_connections(benchmark,maps):
+    heatmaps,pafs = maps
+    coords = get_coordinates(BODY_CONFIG,heatmaps)
+    connections = benchmark(get_connections,BODY_CONFIG,coords,pafs)
+    assert sum(len(c) for c in connections) > 0
+
+@pytest.mark.benchmark(group="hpe")
+def bench_estimate(benchmark,maps):
+    heatmaps,pafs = maps
+    connections = get_connections(BODY_CONFIG,get_coordinates(BODY_CONFIG,heatmaps),pafs)
+    skeletons = benchmark(estimate,BODY_CONFIG,connections)
+    assert len(skeletons) == NPEOPLE
+
+@pytest.mark.benchmark(group="action")
+def bench_feature_generator_add_cur_skeleton(benchmark):
+    rng = np.random.default_rng(0)
+    skeleton = get_an_example_of_standing_skeleton()
+    skeletons = [skeleton + rng.normal(0,0.005,skeleton.shape) for _ in range(64)]
+    generator = FeatureGenerator(window_size=5)
+    # the window is full, every call extracts features
+    for s in skeletons[:5]:
+        generator.add_cur_skeleton(s)
+    frames = itertools.cycle(skeletons)
+    success,features = benchmark(lambda: generator.add_cur_skeleton(next(frames)))
+    assert success and features is not None
@@ -0,0 +1,39 @@
+from ...analysis.node.ai.tracker.deepsort.deepsort import DeepSortTracker
+from ...analysis.node.ai.tracker.deepsort.detection import Detection
+import numpy as np
+import pytest
+
+NTRACKS = 50
+FEATURE_SIZE = 512
+
+class Untracked:
+    # stands in for the tracking item updated with the matches
+    def set_tracked_id(self,index,id):
+        pass
+
+    def set_box(self,index,box):
+        pass
+
+def frame_detections(objects,features,t,rng):
+    boxes = objects[:,:4] + t*np.concatenate([objects[:,4:],np.zeros((len(objects),2))],axis=1)
+    noisy = features + rng.normal(0,0.05,features.shape)
+    noisy /= np.linalg.norm(noisy,axis=1,keepdims=True)
+    return [Detection(b,f) for b,f in zip(boxes,noisy)]
+
+@pytest.mark.benchmark(group="tracking")
+def bench_deepsort_match(benchmark):
+    rng = np.random.default_rng(0)
+    # x,y,w,h boxes moving a few pixels per frame, and their appearance
+    objects = np.concatenate([rng.uniform(0,1200,(NTRACKS,2)),rng.uniform(30,120,(NTRACKS,2)),
+        rng.uniform(-3,3,(NTRACKS,2))],axis=1)
+    features = rng.normal(0,1,(NTRACKS,FEATURE_SIZE))
+    tracker = DeepSortTracker("bench_deepsort",None)
+    # enough frames for the tracks to be confirmed and have a few features
+    for t in range(10):
+        tracker._predict()
+        tracker.update(frame_detections(objects,features,t,rng),Untracked())
+    tracker._predict()
+    detections = frame_detections(objects,features,10,rng)
+    matches,_,_ = benchmark(tracker._match,detections)
+    assert len(tracker.tracks) == NTRACKS
+    assert len(matches) == NTRACKS
@@ -0,0 +1,16 @@
+from pytest_benchmark.utils import parse_compare_fail
+import pytest
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+# a run compared to a baseline fails when a benchmark got slower than this.
+# The median is less sensitive than the mean to other processes of the machine
+REGRESSION_THRESHOLD = "median:20%"
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # baselines are kept with the benchmarks, wherever pytest is run from
+    if config.getoption("benchmark_storage",None) == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{basedir}/baselines"
+    if config.getoption("benchmark_compare",None) and not config.getoption("benchmark_compare_fail",None):
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
@@ -0,0 +1,179 @@
+"""
+Offline end-to-end benchmark of the workflow fixtures. Workflows in
+benchmarks/workflows are run with run_sequentially_async and the ones in
+benchmarks/inline_workflows with run_sequentially, against a synthetic
+video and local stand-in model servers. Each run is made in its own
+process so its peak RSS is its own
+
+    python -m benchmarks.run --frames 300 --delay-ms 5
+"""
+from unittest import mock
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import resource
+import logging
+import glob
+import json
+import time
+import sys
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+MODES = {"workflows": "async","inline_workflows": "sequential"}
+
+def load_fixtures(names=None):
+    fixtures = []
+    for folder,mode in MODES.items():
+        for f in sorted(glob.glob(f"{basedir}/{folder}/*.json")):
+            name = os.path.basename(f).replace(".json","")
+            if names and name not in names:
+                continue
+            with open(f) as fp:
+                fixtures.append({"name": name,"mode": mode,
+                    "structure": json.load(fp)["structure"]})
+    return fixtures
+
+def vendors_of(structure):
+    from .servers import VENDORS
+    return {n["model_name"]: VENDORS[n["type"]] for n in structure["nodes"]
+        if n["type"] in VENDORS}
+
+def frame_latencies_ms(events):
+    # a frame goes from the first enqueue to the last node it reaches
+    first,last = {},{}
+    for e in events:
+        if e["ph"] != "X":
+            continue
+        tid = (e["pid"],e["tid"])
+        first[tid] = min(first.get(tid,e["ts"]),e["ts"])
+        last[tid] = max(last.get(tid,0),e["ts"] + e["dur"])
+    return [(last[t] - first[t])/1000 for t in first]
+
+def run_child(spec):
+    from .servers import register
+    from analysis.workflow.workflow import WorkflowFactory
+    from analysis.node import tracing
+    from analysis.node import metrics
+
+    structure = spec["structure"]
+    for node in structure["nodes"]:
+        if node.get("model_name") in spec["models"]:
+            register(node["model_name"],spec["models"][node["model_name"]],
+                spec["addresses"][spec["models"][node["model_name"]]],
+                node.get("input_name","input_tensor"))
+    # every frame is traced to get its latency, metrics are read at the end
+    structure["trace_sample_rate"] = 1.0
+    structure["metrics_interval"] = 0
+    analysis = {"id": f"benchmark_{spec['name']}_{spec['mode']}",
+        "args": dict(spec["args"],prefix=tempfile.mkdtemp(prefix="falcoeye_benchmark_"))}
+
+    # no backend to post the status to
+    with mock.patch("analysis.workflow.workflow.post_new_status"):
+        workflow = WorkflowFactory.create_from_dict(structure,analysis)
+        started = time.perf_counter()
+        completed = True
+        if spec["mode"] == "async":
+            workflow.run_sequentially_async()
+            completed = workflow.wait(spec["timeout"])
+        else:
+            workflow.run_sequentially()
+        elapsed = time.perf_counter() - started
+
+    nodes = metrics.snapshot()["nodes"]
+    frames = sum(nodes[s]["items_out"] for s in structure["starters"])
+    latencies = frame_latencies_ms(tracing.to_chrome_events())
+    # kilobytes on linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+    # frames, conversions and tensors allocated or taken back from the pool
+    pool = nodes.get("buffer_pool",{})
+    return {"workflow": spec["name"],"mode": spec["mode"],"completed": completed,
+        "frames": frames,"seconds": round(elapsed,3),
+        "fps": round(frames/elapsed,2) if elapsed > 0 else 0,
+        "p50_ms": round(float(np.percentile(latencies,50)),2) if latencies else None,
+        "p99_ms": round(float(np.percentile(latencies,99)),2) if latencies else None,
+        "peak_rss_mb": round(peak_rss,1),
+        "buffer_allocations": pool.get("buffer_allocations",0),
+        "buffer_reuses": pool.get("buffer_reuses",0)}
+
+def run_fixture(fixture,args,video,addresses):
+    models = vendors_of(fixture["structure"])
+    missing = {v for v in models.values() if v not in addresses}
+    if missing:
+        return {"workflow": fixture["name"],"mode": fixture["mode"],
+            "error": f"no {','.join(sorted(missing))} server"}
+    spec = dict(fixture,models=models,addresses=addresses,timeout=args.timeout,
+        args={"filename": video,"sample_every": args.sample_every,"length": -1,
+            "ntasks": args.ntasks,"frequency": args.frequency})
+    root = os.path.dirname(basedir)
+    proc = subprocess.run([sys.executable,"-m","benchmarks.run","--child",
+        "--log-level",args.log_level],input=json.dumps(spec),cwd=root,
+        capture_output=True,text=True,timeout=args.timeout + 60)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or len(lines) == 0:
+        logging.error(proc.stderr[-2000:])
+        return {"workflow": fixture["name"],"mode": fixture["mode"],
+            "error": f"exited with {proc.returncode}"}
+    return json.loads(lines[-1])
+
+def print_results(results):
+    columns = ["workflow","mode","frames","fps","p50_ms","p99_ms","peak_rss_mb","buffer_allocations"]
+    rows = [[str(r.get(c,r.get("error","") if c == "frames" else "")) for c in columns]
+        for r in results]
+    widths = [max(len(c),*(len(r[i]) for r in rows)) for i,c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c,w in zip(columns,widths)))
+    for r in rows:
+        print("  ".join(v.ljust(w) for v,w in zip(r,widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline workflow benchmark")
+    parser.add_argument("--workflows",nargs="*",help="fixture names, all by default")
+    parser.add_argument("--frames",type=int,default=300)
+    parser.add_argument("--width",type=int,default=1280)
+    parser.add_argument("--height",type=int,default=720)
+    parser.add_argument("--boxes",type=int,default=50,help="detections per canned response")
+    parser.add_argument("--delay-ms",type=float,default=0,help="simulated inference time")
+    parser.add_argument("--sample-every",type=int,default=1)
+    parser.add_argument("--frequency",type=int,default=3)
+    parser.add_argument("--ntasks",type=int,default=4)
+    parser.add_argument("--timeout",type=float,default=600)
+    parser.add_argument("--output",help="json file for the results")
+    parser.add_argument("--log-level",default="WARNING")
+    parser.add_argument("--child",action="store_true",help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level,stream=sys.stderr,
+        format="%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S")
+
+    if args.child:
+        print(json.dumps(run_child(json.load(sys.stdin))))
+        return
+
+    from .video import make_video
+    from .servers import serve
+    cache = os.path.join(tempfile.gettempdir(),"falcoeye_benchmarks")
+    os.makedirs(cache,exist_ok=True)
+    video = make_video(f"{cache}/synthetic_{args.frames}_{args.width}x{args.height}.mp4",
+        args.frames,args.width,args.height)
+
+    fixtures = load_fixtures(args.workflows)
+    servers,addresses = [],{}
+    for vendor in sorted({v for f in fixtures for v in vendors_of(f["structure"]).values()}):
+        try:
+            server,addresses[vendor] = serve(vendor,args.boxes,args.delay_ms/1000)
+            servers.append(server)
+        except Exception as e:
+            # e.g. tensorflow-serving-api not installed
+            logging.error(f"Can't start the {vendor} server: {e}")
+
+    results = [run_fixture(f,args,video,addresses) for f in fixtures]
+    for server in servers:
+        server.stop(None)
+    print_results(results)
+    if args.output:
+        with open(args.output,"w") as f:
+            f.write(json.dumps(results,indent=4))
+
+if __name__ == "__main__":
+    main()
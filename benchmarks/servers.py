@@ -0,0 +1,157 @@
+from concurrent import futures
+import numpy as np
+import logging
+import grpc
+import time
+
+# vendor of each model node type, to know which server a model is sent to
+VENDORS = {"TFModel": "tf","TorchModel": "torch","TritonModel": "triton"}
+# side of the input of the yolo models, their boxes are in its pixels
+MODEL_INPUT_SIZE = 640
+
+def canned_detections(nboxes,scale=1.0,seed=0):
+    """
+    x1,y1,x2,y2 boxes (normalized or in pixels of a scale x scale input),
+    scores and class ids, the same for every request so the postprocessing
+    cost is stable between runs
+    """
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0,0.8,(nboxes,2))
+    sizes = rng.uniform(0.02,0.2,(nboxes,2))
+    boxes = (np.concatenate([corners,corners+sizes],axis=1)*scale).astype(np.float32)
+    scores = rng.uniform(0.05,1.0,nboxes).astype(np.float32)
+    classes = rng.integers(1,4,nboxes).astype(np.int32)
+    return boxes,scores,classes
+
+class LocalKube:
+    """
+    Stands in for FalcoServingKube of a server started by the benchmark
+    """
+    def is_running(self):
+        return True
+
+class TorchServer:
+    def __init__(self,nboxes,delay):
+        from analysis.artifact.k8s.torch import InferenceAPIsServiceServicer
+        from analysis.artifact.k8s.torch import PredictionResponse, TorchServeHealthResponse
+        # subclassing the generated servicer, the stubs of the nodes are unchanged
+        class Servicer(InferenceAPIsServiceServicer):
+            def Ping(self,request,context):
+                return TorchServeHealthResponse(health="Healthy")
+
+            def Predictions(self,request,context):
+                time.sleep(delay)
+                return PredictionResponse(prediction=prediction)
+
+        # x1,y1,x2,y2,score,class rows in pixels like the yolo handlers
+        boxes,scores,classes = canned_detections(nboxes,MODEL_INPUT_SIZE)
+        prediction = np.concatenate([boxes,scores[:,None],classes[:,None]],
+            axis=1).astype(np.float32).tobytes()
+        self.servicer = Servicer()
+
+    def add_to_server(self,server):
+        from analysis.artifact.k8s.torch import add_InferenceAPIsServiceServicer_to_server
+        add_InferenceAPIsServiceServicer_to_server(self.servicer,server)
+
+class TFServer:
+    def __init__(self,nboxes,delay):
+        from tensorflow_serving.apis import prediction_service_pb2_grpc, predict_pb2
+        class Servicer(prediction_service_pb2_grpc.PredictionServiceServicer):
+            def Predict(self,request,context):
+                time.sleep(delay)
+                response = predict_pb2.PredictResponse()
+                response.CopyFrom(canned)
+                response.model_spec.name = request.model_spec.name
+                return response
+
+        boxes,scores,classes = canned_detections(nboxes)
+        canned = predict_pb2.PredictResponse()
+        # tf object detection api order, y1,x1,y2,x2
+        outputs = {"detection_boxes": boxes[:,[1,0,3,2]],
+            "detection_scores": scores,
+            "detection_classes": classes.astype(np.float32)}
+        for name,value in outputs.items():
+            tensor = canned.outputs[name]
+            # DT_FLOAT
+            tensor.dtype = 1
+            for d in (1,) + value.shape:
+                tensor.tensor_shape.dim.add(size=d)
+            tensor.float_val.extend(value.ravel().tolist())
+        self.servicer = Servicer()
+        self._add = prediction_service_pb2_grpc.add_PredictionServiceServicer_to_server
+
+    def add_to_server(self,server):
+        self._add(self.servicer,server)
+
+class TritonServer:
+    def __init__(self,nboxes,delay):
+        from tritonclient.grpc import service_pb2, service_pb2_grpc
+        class Servicer(service_pb2_grpc.GRPCInferenceServiceServicer):
+            def ServerLive(self,request,context):
+                return service_pb2.ServerLiveResponse(live=True)
+
+            def ServerReady(self,request,context):
+                return service_pb2.ServerReadyResponse(ready=True)
+
+            def ModelReady(self,request,context):
+                return service_pb2.ModelReadyResponse(ready=True)
+
+            def ModelInfer(self,request,context):
+                time.sleep(delay)
+                response = service_pb2.ModelInferResponse()
+                response.CopyFrom(canned)
+                response.model_name = request.model_name
+                response.id = request.id
+                return response
+
+        # batch of one in pixels, like the yolo end2end exports
+        boxes,scores,classes = canned_detections(nboxes,MODEL_INPUT_SIZE)
+        outputs = [("num_dets","INT32",np.array([[nboxes]],dtype=np.int32)),
+            ("det_boxes","FP32",boxes[None]),
+            ("det_scores","FP32",scores[None]),
+            ("det_classes","INT32",classes[None])]
+        canned = service_pb2.ModelInferResponse()
+        for name,datatype,value in outputs:
+            canned.outputs.add(name=name,datatype=datatype,shape=value.shape)
+            canned.raw_output_contents.append(value.tobytes())
+        self.servicer = Servicer()
+        self._add = service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server
+
+    def add_to_server(self,server):
+        self._add(self.servicer,server)
+
+SERVERS = {"tf": TFServer,"torch": TorchServer,"triton": TritonServer}
+
+def serve(vendor,nboxes=20,delay=0.0,max_workers=8):
+    """
+    Starts a local gRPC server answering every request of vendor with the
+    same canned detections after delay seconds. Returns the server and
+    its address
+    """
+    options = [("grpc.max_send_message_length",64*1024*1024),
+        ("grpc.max_receive_message_length",64*1024*1024)]
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),options=options)
+    SERVERS[vendor](nboxes,delay).add_to_server(server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    address = f"localhost:{port}"
+    logging.info(f"Stand-in {vendor} server listening on {address}")
+    return server,address
+
+def register(model_name,vendor,address,input_name="input_tensor"):
+    """
+    Makes get_model_server return a client of the server at address for
+    model_name instead of starting a container
+    """
+    from analysis.artifact.k8s import SERVICES
+    if vendor == "tf":
+        from analysis.artifact.k8s.tf import TensorflowServinggRPC
+        SERVICES[model_name] = TensorflowServinggRPC(model_name,1,address,LocalKube(),input_name)
+    elif vendor == "torch":
+        from analysis.artifact.k8s.torch import TorchServinggRPC
+        SERVICES[model_name] = TorchServinggRPC(model_name,1,address,LocalKube())
+    elif vendor == "triton":
+        from analysis.artifact.k8s.triton import TritonServinggRPC
+        SERVICES[model_name] = TritonServinggRPC(model_name,1,address,LocalKube())
+    else:
+        raise ValueError(f"Unknown model vendor {vendor}")
@@ -0,0 +1,42 @@
+import numpy as np
+import logging
+import cv2
+import os
+
+def make_video(filename,nframes=300,width=1280,height=720,fps=25,nobjects=12,seed=0):
+    """
+    Writes a synthetic video of rectangles moving over a noisy background.
+    Frames are random enough to keep the encoder (and so the decoder) busy
+    like a real camera feed. The file is reused if it already exists
+    """
+    if os.path.exists(filename):
+        return filename
+    logging.info(f"Writing {nframes} frames of {width}x{height} to {filename}")
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0,256,(height,width,3),dtype=np.uint8)
+    background = cv2.GaussianBlur(background,(15,15),0)
+    positions = rng.uniform(0,1,(nobjects,2))*[width,height]
+    velocities = rng.uniform(-8,8,(nobjects,2))
+    sizes = rng.integers(min(width,height)//20,min(width,height)//6,(nobjects,2))
+    colors = rng.integers(0,256,(nobjects,3))
+
+    tmpfile = f"{filename}.tmp.mp4"
+    writer = cv2.VideoWriter(tmpfile,cv2.VideoWriter_fourcc(*"mp4v"),fps,(width,height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Couldn't open a video writer for {tmpfile}")
+    try:
+        for _ in range(nframes):
+            frame = background.copy()
+            for (x,y),(w,h),color in zip(positions.astype(int),sizes,colors):
+                cv2.rectangle(frame,(x,y),(x+int(w),y+int(h)),color.tolist(),-1)
+            noise = rng.integers(0,16,frame.shape,dtype=np.uint8)
+            writer.write(cv2.add(frame,noise))
+            positions += velocities
+            # bouncing on the borders
+            out = (positions < 0) | (positions > [width,height])
+            velocities[out] *= -1
+            positions = np.clip(positions,0,[width,height])
+    finally:
+        writer.release()
+    os.replace(tmpfile,filename)
+    return filename
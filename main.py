@@ -42,8 +42,7 @@ logging.info(data)
 workflow = WorkflowFactory.create_from_dict(workflow_struct,analysis)
 inline = workflow_struct.get("inline",False)
 if inline:
-    workflow.run_sequentially()
+    workflow.run_streaming()
 else:
     workflow.run_sequentially_async()
-    while workflow._busy:
-        pass
\ No newline at end of file
+    workflow.wait()
\ No newline at end of file
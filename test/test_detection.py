@@ -0,0 +1,149 @@
+from ..analysis.node.ai.detection import FalcoeyeTorchDetectionNode, FalcoeyeDetection
+from ..analysis.node.source.source import FalcoeyeFrame
+from ..analysis.node.filter.instance import SizeFilter
+from ..analysis.node.filter.spatial import ZoneFilter
+from ..analysis.node.agg.spatial import ZoneCounter, ZonesCounter
+from ..analysis.node.node import Node
+from ..analysis.node.draw.bbox import BoundingBoxDrawer
+from ..analysis.node.buffers import buffer_pool
+from ..analysis.node.output.csv import CSVWriter
+import pandas as pd
+from ..analysis.node.zones import mask_cache_info
+from PIL import ImageDraw, Image
+import numpy as np
+import logging
+
+
+def detection():
+    node = FalcoeyeTorchDetectionNode("detection",{"1": "car","2": "person"},0.3,100,overlap_thresh=0)
+    # x1,y1,x2,y2,score,class: a car, a person, a class missing from the labelmap and a weak car
+    raw = np.array([[0.1,0.1,0.2,0.2,0.9,1],
+        [0.3,0.3,0.5,0.6,0.8,2],
+        [0.6,0.6,0.7,0.7,0.7,5],
+        [0.8,0.8,0.9,0.9,0.1,1]],dtype=np.float32)
+    frame = FalcoeyeFrame(np.zeros((10,10,3),dtype=np.uint8),0,0,"frame")
+    return node.run_on([frame,raw.tobytes()])
+
+def test_detections_are_kept_in_columns():
+    logging.info("Launching test_detections_are_kept_in_columns")
+    item = detection()
+    assert item.count == 3
+    assert item.boxes.dtype == np.float32 and item.boxes.shape == (3,4)
+    assert item.classes == ["car","person","unknown"]
+    assert [item.count_of(c) for c in ["car","person","unknown","bike"]] == [1,1,1,-1]
+    assert item.counts.tolist() == [1,1,1]
+    assert np.allclose(item.get_box(1),[0.3,0.3,0.5,0.6])
+    assert np.shares_memory(item.get_box(1),item.boxes)
+
+def test_detections_are_filtered_by_class_and_index():
+    logging.info("Launching test_detections_are_filtered_by_class_and_index")
+    item = detection()
+    item.keep_only(["car","person"])
+    assert item.classes == ["car","person"]
+    item.delete([0])
+    assert item.classes == ["person"]
+    assert item.count_of("car") == 0
+    assert np.allclose(item.scores,[0.8])
+
+def random_detection(n=200,seed=0):
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0,0.8,(n,2))
+    boxes = np.concatenate([corners,corners + rng.uniform(0.01,0.2,(n,2))],axis=1)
+    frame = FalcoeyeFrame(np.zeros((72,128,3),dtype=np.uint8),0,0,"frame")
+    return FalcoeyeDetection(frame,boxes,np.ones(n),rng.integers(0,2,n),("car","person"))
+
+def polygon_mask(points,width,height):
+    mask = Image.new("L",(width,height),0)
+    ImageDraw.Draw(mask).polygon([tuple(p) for p in points],outline=1,fill=1)
+    return np.asarray(mask).astype(bool)
+
+def test_filters_keep_the_boxes_of_the_per_box_rules():
+    logging.info("Launching test_filters_keep_the_boxes_of_the_per_box_rules")
+    item = random_detection()
+    expected = [b.tolist() for b in item.boxes
+        if abs(b[0]-b[2]) <= 0.1 and abs(b[1]-b[3]) <= 0.15]
+    SizeFilter("size",0.1,0.15).run_on(item)
+    assert 0 < item.count < 200
+    assert item.boxes.tolist() == expected
+
+    item = random_detection()
+    points = [[10,10],[100,5],[120,60],[20,70]]
+    zone = ZoneFilter("zone",points)
+    mask = polygon_mask(points,128,72)
+    inside = lambda x,y: mask[int(y*0.9999*72),int(x*0.9999*128)]
+    # boxes are taken as ymin,xmin,ymax,xmax by the zone filter
+    expected = [b.tolist() for b in item.boxes
+        if inside(b[1],b[0]) or inside(b[1],b[2]) or inside(b[3],b[0]) or inside(b[3],b[2])]
+    zone.run_on(item)
+    assert 0 < item.count < 200
+    assert item.boxes.tolist() == expected
+
+def test_zones_are_counted_at_once_like_one_by_one():
+    logging.info("Launching test_zones_are_counted_at_once_like_one_by_one")
+    zones = {"a": [[10,10],[60,10],[60,60],[10,60]],
+        "b": [[40,0],[127,0],[127,40]],
+        "c": [[0,40],[127,71],[0,71]]}
+    spec = ";".join(f"{n}:{','.join(str(v) for p in z for v in p)}" for n,z in zones.items())
+    counter = ZonesCounter("zones",spec,["car","person","bike"])
+    sink = Node("sink")
+    counter.add_sink(sink)
+    items = [random_detection(seed=s) for s in range(3)]
+    for item in items:
+        counter.put(item)
+    counter.run()
+    df = sink.get()
+    assert df["Zone"].tolist() == ["a","b","c"]*3
+    for name,points in zones.items():
+        one = ZoneCounter(name,points,["car","person","bike"])
+        rows = np.array([one.run_once(item) for item in items])
+        assert np.array_equal(df[df["Zone"] == name].iloc[:,1:].to_numpy(),rows)
+        assert rows[:,2:4].sum() > 0 and not rows[:,4].any()
+    # the per box rule of the counter
+    mask = polygon_mask(zones["a"],128,72)
+    inside = lambda x,y: mask[int(y*0.9999*72),int(x*0.9999*128)]
+    cars = sum(1 for b,c in zip(items[0].boxes,items[0].classes) if c == "car" and
+        (inside(b[0],b[1]) or inside(b[0],b[3]) or inside(b[2],b[1]) or inside(b[2],b[3])))
+    assert df.iloc[0]["car"] == cars
+
+def test_zone_masks_are_shared_and_follow_the_frame_size():
+    logging.info("Launching test_zone_masks_are_shared_and_follow_the_frame_size")
+    points = [[5,5],[50,5],[50,50],[5,50]]
+    zone = ZoneFilter("zone",points)
+    counter = ZoneCounter("counter",points,["car"])
+    small = FalcoeyeFrame(np.zeros((72,128,3),dtype=np.uint8),0,0,"frame")
+    large = FalcoeyeFrame(np.zeros((144,256,3),dtype=np.uint8),1,1,"frame")
+    # a box around (0.25,0.25) is in the zone in pixels of the small frame only
+    box = lambda frame: FalcoeyeDetection(frame,[[0.2,0.2,0.3,0.3]],[1],[0],("car",))
+    assert zone.run_on(box(small)).count == 1
+    assert counter.run_once(box(small))[2] == 1
+    assert zone.run_on(box(large)).count == 0
+    assert counter.run_once(box(large))[2] == 0
+    hits = mask_cache_info().hits
+    zone.run_on(box(large))
+    ZoneCounter("other",points,["car"]).run_once(box(large))
+    assert mask_cache_info().hits == hits + 1
+
+def test_zone_counts_of_many_streams_keep_their_stream(tmp_path):
+    logging.info("Launching test_zone_counts_of_many_streams_keep_their_stream")
+    counter = ZoneCounter("counter",[[0,0],[127,0],[127,71],[0,71]],["car"])
+    writer = CSVWriter("counts",str(tmp_path))
+    counter.add_sink(writer)
+    frame = lambda stream: FalcoeyeFrame(np.zeros((72,128,3),dtype=np.uint8),0,0,"frame",stream)
+    for stream,cars in [("a",1),("b",2),("a",3)]:
+        counter.put(FalcoeyeDetection(frame(stream),[[0.2,0.2,0.3,0.3]]*cars,[1]*cars,[0]*cars,("car",)))
+    counter.run()
+    writer.run()
+    df = pd.read_csv(tmp_path/"counts.csv")
+    assert list(df.columns) == ["Stream","Timestamp","Frame_Order","car"]
+    assert df["Stream"].tolist() == ["a","b","a"]
+    assert df.groupby("Stream")["car"].sum().to_dict() == {"a": 4,"b": 2}
+
+def test_boxes_are_drawn_on_one_copy_of_the_frame():
+    logging.info("Launching test_boxes_are_drawn_on_one_copy_of_the_frame")
+    item = random_detection(n=40)
+    before = item.frame
+    buffers = lambda s: s.get("buffer_allocations",0) + s.get("buffer_reuses",0)
+    taken = buffers(buffer_pool().metrics.snapshot())
+    BoundingBoxDrawer("boxes",{"car": (255,0,0),"person": (0,255,0)}).run_on(item)
+    assert buffers(buffer_pool().metrics.snapshot()) == taken + 1
+    assert item.frame is not before and item.frame.any() and not before.any()
@@ -32,5 +32,4 @@ def test_har(mock_put):
     logging.info("Starting the workflow")
     workflow.run_sequentially_async()
 
-    while workflow._busy:
-        pass
\ No newline at end of file
+    workflow.wait()
\ No newline at end of file
@@ -0,0 +1,85 @@
+from ..analysis.node.node import Node
+from ..analysis.node.filter.motion import MotionGate, MotionFill
+from ..analysis.node.ai.detection import FalcoeyeDetection
+from ..analysis.node.source.source import FalcoeyeFrame
+import numpy as np
+import logging
+
+
+class Detector(Node):
+    """
+    Stands in for a model, one box per frame
+    """
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.calls = 0
+
+    def run(self):
+        while self.more():
+            frame = self.get()
+            self.calls += 1
+            self.sink(FalcoeyeDetection(frame,[[0.1,0.1,0.2,0.2]],[0.9],[0],("car",)))
+
+class Collector(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.items = []
+
+    def run(self):
+        while self.more():
+            self.items.append(self.get())
+
+def scene(n,moving_from,seed=0):
+    # a noisy static scene, a square moves in frames moving_from..
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0,200,(72,128,3),dtype=np.uint8)
+    for i in range(n):
+        frame = np.clip(background.astype(int) + rng.integers(-4,5,background.shape),0,255).astype(np.uint8)
+        if i >= moving_from:
+            x = 4*(i - moving_from)
+            frame[20:50,x:x+30] = 255
+        yield FalcoeyeFrame(frame,i,i,"frame")
+
+def test_gate_skips_static_frames():
+    logging.info("Launching test_gate_skips_static_frames")
+    fill = MotionFill("fill")
+    gate = MotionGate("gate",keyframe_every=10,fill_node=fill)
+    detector = Detector("detector")
+    counter = Collector("counter")
+    gate.add_sink(detector)
+    detector.add_sink(fill)
+    fill.add_sink(counter)
+    for frame in scene(60,moving_from=50):
+        gate.put(frame)
+    for node in [gate,detector,fill,counter]:
+        node.run()
+    # keyframes of the static part and all the moving frames
+    assert detector.calls == 5 + 10
+    assert gate.skipped == 45
+    # still one row per frame
+    assert sorted(r.framestamp for r in counter.items) == list(range(60))
+    rows = {r.framestamp: r for r in counter.items}
+    assert rows[3].frame is not rows[0].frame
+    assert rows[3].count == 1
+
+def test_fill_waits_for_the_result_of_the_reference():
+    logging.info("Launching test_fill_waits_for_the_result_of_the_reference")
+    fill = MotionFill("fill")
+    gate = MotionGate("gate",fill_node=fill)
+    detector = Detector("detector")
+    counter = Collector("counter")
+    gate.add_sink(detector)
+    detector.add_sink(fill)
+    fill.add_sink(counter)
+    # open until the end of the stream, skipped frames wait for results
+    fill.open()
+    for frame in scene(5,moving_from=10):
+        gate.put(frame)
+    gate.run()
+    # skipped frames reach the fill before the result they inherit
+    fill.run()
+    assert counter.items == []
+    detector.run()
+    fill.run()
+    counter.run()
+    assert [r.framestamp for r in counter.items] == [0,1,2,3,4]
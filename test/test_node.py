@@ -0,0 +1,274 @@
+from ..analysis.node.node import Node, END_OF_STREAM
+from ..analysis.node.controller import ThreadWrapper, ProcessPoolWrapper, SortedSequence
+from ..analysis.node.controller.thread import ConcurrentPostTasksThreadWrapper
+from ..analysis.node.source.source import FalcoeyeFrame
+from ..analysis.node import tracing
+import numpy as np
+import threading
+import glob
+import logging
+import time
+
+
+class Doubler(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+
+    def run_on(self,item):
+        return item*2
+
+class Tally(Node):
+    stream_state = ("count",)
+
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.count = 0
+
+    def run(self):
+        while self.more():
+            item = self.get()
+            self.switch_stream(item.stream)
+            self.count += 1
+
+class OddFilter(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+
+    def run_on(self,item):
+        return item if item % 2 else None
+
+class AsyncDoubler(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+
+    async def run_on_async(self,session,item):
+        return item
+
+class Collector(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.items = []
+
+    def run(self):
+        while self.more():
+            self.items.append(self.get())
+
+def test_receive_returns_end_of_stream_after_drain():
+    logging.info("Launching test_receive_returns_end_of_stream_after_drain")
+    node = Node("node")
+    node.open()
+    node._data.put(1)
+    node._data.put(2)
+    node.close()
+    assert node.receive() == 1
+    assert node.receive() == 2
+    assert node.receive() is END_OF_STREAM
+
+def test_more_skips_end_of_stream():
+    logging.info("Launching test_more_skips_end_of_stream")
+    node = Node("node")
+    node.close()
+    assert not node.more()
+    node._data.put(1)
+    assert node.more()
+    assert node.get() == 1
+
+def test_thread_wrapper_finishes_on_close():
+    logging.info("Launching test_thread_wrapper_finishes_on_close")
+    done = threading.Event()
+    wrapper = ThreadWrapper("wrapper",Doubler("doubler"))
+    collector = Collector("collector")
+    wrapper.add_sink(collector)
+    wrapper.run_async(lambda name: done.set(),lambda name,error: None)
+    for i in range(5):
+        wrapper._data.put(i)
+    wrapper.close()
+    assert done.wait(5)
+    wrapper._thread.join(5)
+    collector.run()
+    assert collector.items == [0,2,4,6,8]
+
+def test_drop_oldest_keeps_latest_items():
+    logging.info("Launching test_drop_oldest_keeps_latest_items")
+    node = Collector("collector")
+    node.set_capacity(2,"drop_oldest")
+    for i in range(5):
+        node.put(i)
+    assert node.dropped == 3
+    node.run()
+    assert node.items == [3,4]
+
+def test_drop_newest_keeps_first_items():
+    logging.info("Launching test_drop_newest_keeps_first_items")
+    node = Collector("collector")
+    node.set_capacity(2,"drop_newest")
+    for i in range(5):
+        node.put(i)
+    assert node.dropped == 3
+    node.run()
+    assert node.items == [0,1]
+
+def test_block_waits_for_consumer():
+    logging.info("Launching test_block_waits_for_consumer")
+    node = Node("node")
+    node.set_capacity(1)
+    node.open()
+    node.put(0)
+    producer = threading.Thread(target=node.put,args=(1,),daemon=True)
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()
+    assert node.receive() == 0
+    producer.join(5)
+    assert node.receive() == 1
+    assert node.dropped == 0
+
+def test_close_on_full_queue_ends_stream():
+    logging.info("Launching test_close_on_full_queue_ends_stream")
+    node = Node("node")
+    node.set_capacity(1,"drop_newest")
+    node.open()
+    node.put(0)
+    node.close()
+    assert node.receive() == 0
+    assert node.receive() is END_OF_STREAM
+
+def test_process_pool_keeps_order_through_shared_memory():
+    logging.info("Launching test_process_pool_keeps_order_through_shared_memory")
+    before = set(glob.glob("/dev/shm/*"))
+    done = threading.Event()
+    wrapper = ProcessPoolWrapper("pool",Doubler("doubler"),nworkers=2)
+    collector = Collector("collector")
+    wrapper.add_sink(collector)
+    # the workers are started by the run, not by the workflow build
+    assert wrapper._pool is None
+    wrapper.run_async(lambda name: done.set(),lambda name,error: None)
+    # large enough to go through shared memory
+    frames = [np.full((256,256,3),i,dtype=np.uint8) for i in range(10)]
+    for frame in frames:
+        wrapper.put(frame)
+    wrapper.close()
+    assert done.wait(30)
+    collector.run()
+    assert [int(f[0,0,0]) for f in collector.items] == [2*i for i in range(10)]
+    # at most the transfer ring of the frames, kept for the next items
+    assert len(set(glob.glob("/dev/shm/*")) - before) <= 1
+
+def test_metrics_count_items_and_queue_depth():
+    logging.info("Launching test_metrics_count_items_and_queue_depth")
+    doubler = Doubler("metrics_doubler")
+    collector = Collector("metrics_collector")
+    doubler.add_sink(collector)
+    doubler.set_capacity(2,"drop_newest")
+    for i in range(3):
+        doubler.put(i)
+    while doubler.more():
+        doubler.sink(doubler.run_on(doubler.get()))
+    snapshot = doubler.metrics.snapshot()
+    assert snapshot["items_in"] == 2
+    assert snapshot["items_out"] == 2
+    assert snapshot["dropped"] == 1
+    assert snapshot["queue_high_water"] == 2
+    assert snapshot["queue_depth"] == 0
+    assert sum(snapshot["latency_ms"].values()) == 2
+    assert collector.metrics.snapshot()["items_in"] == 2
+
+def test_metrics_of_dropped_items_leave_out_idle_time():
+    logging.info("Launching test_metrics_of_dropped_items_leave_out_idle_time")
+    odd = OddFilter("metrics_odd")
+    odd.add_sink(Collector("metrics_odd_collector"))
+    for i in range(4):
+        odd.put(i)
+        while odd.more():
+            item = odd.run_on(odd.get())
+            if item is not None:
+                odd.sink(item)
+        # waiting for the next item is not processing
+        time.sleep(0.05)
+    snapshot = odd.metrics.snapshot()
+    assert snapshot["items_out"] == 2
+    assert sum(snapshot["latency_ms"].values()) == 4
+    assert snapshot["busy_seconds"] < 0.05
+
+def test_concurrent_tasks_are_timed_once():
+    logging.info("Launching test_concurrent_tasks_are_timed_once")
+    done = threading.Event()
+    wrapper = ConcurrentPostTasksThreadWrapper("concurrent_tasks",AsyncDoubler("async_doubler"),ntasks=3)
+    wrapper.add_sink(Collector("concurrent_collector"))
+    wrapper.run_async(lambda name: done.set(),lambda name,error: None)
+    for i in range(10):
+        wrapper.put(FalcoeyeFrame(np.zeros((4,4,3),dtype=np.uint8),i,i,"frame"))
+    wrapper.close()
+    assert done.wait(30)
+    snapshot = wrapper.metrics.snapshot()
+    assert snapshot["items_in"] == snapshot["items_out"] == 10
+    assert sum(snapshot["latency_ms"].values()) == 10
+
+def test_sampled_frames_are_traced():
+    logging.info("Launching test_sampled_frames_are_traced")
+    tracing.configure(0.5)
+    try:
+        frames = [FalcoeyeFrame(np.zeros((4,4,3)),i,i,"frame") for i in range(4)]
+        assert [f.trace is not None for f in frames] == [True,False,True,False]
+        node = Collector("traced_collector")
+        wrapper = Node("traced_node")
+        wrapper.add_sink(node)
+        for f in frames:
+            wrapper.put(f)
+            wrapper.sink(wrapper.get())
+        node.run()
+        events = tracing.to_chrome_events()
+        assert sorted({e["tid"] for e in events}) == [0,2]
+        assert {e["name"] for e in events} == {"traced_node queue","traced_node","traced_collector queue"}
+        assert all(e["dur"] >= 0 for e in events)
+    finally:
+        tracing.configure(0)
+
+def test_frames_of_streams_are_traced_apart():
+    logging.info("Launching test_frames_of_streams_are_traced_apart")
+    tracing.configure(1)
+    try:
+        node = Node("streams_node")
+        for stream in ["a","b"]:
+            f = FalcoeyeFrame(np.zeros((4,4,3)),0,0,"frame")
+            # tagged by the multi stream source after it was read
+            f.stream = stream
+            node.put(f)
+            node.sink(node.get())
+        events = [e for e in tracing.to_chrome_events() if e["ph"] == "X"]
+        # same frame id, one row in each stream
+        assert sorted((e["pid"],e["tid"]) for e in events if e["cat"] == "node") == [(0,0),(1,0)]
+    finally:
+        tracing.configure(0)
+
+def frame(framestamp,stream=None):
+    return FalcoeyeFrame(np.zeros((2,2,3),dtype=np.uint8),framestamp,framestamp,"frame",stream)
+
+def test_state_is_kept_by_stream():
+    logging.info("Launching test_state_is_kept_by_stream")
+    tally = Tally("tally")
+    for stream in ["a","b","a","a","c","b"]:
+        tally.put(frame(0,stream))
+    tally.run()
+    counts = {}
+    for stream in tally.streams():
+        tally.switch_stream(stream)
+        counts[stream] = tally.count
+    assert counts == {"a": 3,"b": 2,"c": 1}
+
+def test_sorted_sequence_orders_each_stream():
+    logging.info("Launching test_sorted_sequence_orders_each_stream")
+    ordered = SortedSequence("ordered")
+    collector = Collector("collector")
+    ordered.add_sink(collector)
+    ordered.open()
+    # b is waiting for its frame 0, a must not wait for it
+    for framestamp,stream in [(1,"a"),(1,"b"),(0,"a"),(2,"b"),(2,"a")]:
+        ordered.put(frame(framestamp,stream))
+    ordered.run()
+    collector.run()
+    assert [(f.stream,f.framestamp) for f in collector.items] == [("a",0),("a",1),("a",2)]
+    ordered.put(frame(0,"b"))
+    ordered.run()
+    collector.run()
+    assert [(f.stream,f.framestamp) for f in collector.items[3:]] == [("b",0),("b",1),("b",2)]
@@ -33,8 +33,7 @@ def test_road_damage(mock_put):
     logging.info("Starting the workflow")
     workflow.run_sequentially_async()
 
-    while workflow._busy:
-        pass
+    workflow.wait()
 
 @mock.patch("requests.put", side_effect=mocked_finish_put)
 def test_nogps_road_damage(mock_put):
@@ -62,5 +61,4 @@ def test_nogps_road_damage(mock_put):
     logging.info("Starting the workflow")
     workflow.run_sequentially_async()
 
-    while workflow._busy:
-        pass
\ No newline at end of file
+    workflow.wait()
\ No newline at end of file
@@ -0,0 +1,149 @@
+from ..analysis.node.node import Node
+from ..analysis.node.controller import ProcessPoolWrapper
+from ..analysis.node.source.shared import FrameRing, slot_handle, from_slot_handle
+from ..analysis.node.buffers import BufferPool
+from ..analysis.node.source.source import FalcoeyeFrame
+import numpy as np
+import threading
+import glob
+import ctypes
+import logging
+
+
+class Inverter(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+
+    def run_on(self,item):
+        # in place, straight into the slot
+        np.subtract(255,item,out=item)
+        return item
+
+class Collector(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.items = []
+
+    def run(self):
+        while self.more():
+            self.items.append(self.get())
+
+def test_slot_goes_back_to_ring_when_unreferenced():
+    logging.info("Launching test_slot_goes_back_to_ring_when_unreferenced")
+    ring = FrameRing(2,(4,4,3))
+    first = ring.acquire()
+    view = first[1:]
+    second = ring.acquire()
+    assert ring.acquire() is None
+    assert ring.exhausted == 1
+    del first
+    # the view still holds the slot
+    assert ring.free == 0
+    del view
+    assert ring.free == 1
+    del second
+    assert ring.free == 2
+    ring.close()
+
+def test_pool_reuses_buffers_of_frames_gone():
+    logging.info("Launching test_pool_reuses_buffers_of_frames_gone")
+    pool = BufferPool("test_pool")
+    node = Node("pool_user")
+    frame = pool.acquire((4,4,3),metrics=node.metrics)
+    view = frame[1:]
+    address = frame.ctypes.data
+    del frame
+    # the view still holds the buffer
+    assert pool.free(48) == 0
+    del view
+    assert pool.free(48) == 1
+    tensor = pool.acquire((3,4,1),np.float32,metrics=node.metrics)
+    assert tensor.ctypes.data == address and tensor.dtype == np.float32
+    other = pool.acquire((4,4,3))
+    assert other.ctypes.data != address
+    assert node.metrics.snapshot()["buffer_allocations"] == 1
+    assert node.metrics.snapshot()["buffer_reuses"] == 1
+    snapshot = pool.metrics.snapshot()
+    assert snapshot["buffer_allocations"] == 2 and snapshot["buffer_allocated_bytes"] == 96
+
+def test_frame_conversions_resize_and_blend_are_pooled():
+    logging.info("Launching test_frame_conversions_resize_and_blend_are_pooled")
+    rgb = np.random.default_rng(0).integers(0,256,(8,12,3),dtype=np.uint8)
+    frame = FalcoeyeFrame(rgb,0,0,"frame")
+    assert np.array_equal(frame.frame_bgr,rgb[...,::-1])
+    frame.resize(6,4)
+    assert frame.size == (4,6,3)
+    frame.blend(np.zeros((4,6,3),dtype=np.uint8),alpha=0.5)
+    assert frame.frame.max() <= 128
+    # written in place by cv2, in a buffer of the pool
+    base = frame.frame
+    while isinstance(base,np.ndarray):
+        base = base.base
+    assert isinstance(base,ctypes.Array)
+
+def test_slot_handle_round_trip():
+    logging.info("Launching test_slot_handle_round_trip")
+    ring = FrameRing(1,(4,4,3))
+    frame = ring.acquire()
+    frame[...] = np.arange(48).reshape(4,4,3)
+    part = frame[1:3,::2]
+    view = from_slot_handle(slot_handle(part))
+    assert np.shares_memory(view,frame)
+    assert np.array_equal(view,part)
+    assert slot_handle(np.zeros(3)) is None
+    ring.close()
+
+def test_process_pool_passes_slots_by_handle():
+    logging.info("Launching test_process_pool_passes_slots_by_handle")
+    done = threading.Event()
+    wrapper = ProcessPoolWrapper("pool",Inverter("inverter"),nworkers=2)
+    collector = Collector("collector")
+    wrapper.add_sink(collector)
+    # created by this process, the workers attach to it by name
+    ring = FrameRing(4,(128,128,3))
+    frames = []
+    for i in range(4):
+        frame = ring.acquire()
+        frame[...] = i
+        frames.append(frame)
+    wrapper.run_async(lambda name: done.set(),lambda name,error: None)
+    for frame in frames:
+        wrapper.put(frame)
+    wrapper.close()
+    assert done.wait(30)
+    collector.run()
+    for i,(frame,result) in enumerate(zip(frames,collector.items)):
+        assert np.shares_memory(frame,result)
+        assert int(result[0,0,0]) == 255 - i
+    ring.close()
+
+def test_process_pool_sends_heap_arrays_through_transfer_slots():
+    logging.info("Launching test_process_pool_sends_heap_arrays_through_transfer_slots")
+    before = set(glob.glob("/dev/shm/*"))
+    done = threading.Event()
+    wrapper = ProcessPoolWrapper("transfer_pool",Inverter("inverter"),nworkers=2)
+    collector = Collector("collector")
+    wrapper.add_sink(collector)
+    frames = [np.full((256,256,3),i,dtype=np.uint8) for i in range(12)]
+    wrapper.run_async(lambda name: done.set(),lambda name,error: None)
+    for frame in frames:
+        wrapper.put(frame)
+    wrapper.close()
+    assert done.wait(30)
+    collector.run()
+    assert [int(r[0,0,0]) for r in collector.items] == [255 - i for i in range(12)]
+    # inverted in a copy, the frames of the sender are left as they were
+    assert [int(f[0,0,0]) for f in frames] == list(range(12))
+    # one preallocated block for all the frames instead of one per frame
+    assert len(set(glob.glob("/dev/shm/*")) - before) <= 1
+
+def test_ring_is_closed_once_its_arrays_are_gone():
+    logging.info("Launching test_ring_is_closed_once_its_arrays_are_gone")
+    ring = FrameRing(1,(4,4,3))
+    frame = ring.acquire()
+    ring.close()
+    # still mapped for the array left
+    frame[...] = 1
+    assert frame.sum() == 48
+    del frame
+    FrameRing(1,(4,4,3)).close()
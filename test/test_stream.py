@@ -0,0 +1,72 @@
+from ..analysis.node.source.stream import LatestFrameGrabber, YoutubeSource
+from ..analysis.node.source.ffmpeg import create_video_pipe
+from ..analysis.node.source.multi import MultiStreamSource
+from ..benchmarks.video import make_video
+import numpy as np
+import cv2
+import logging
+import time
+
+
+class Camera:
+    """
+    Stands in for a cv2.VideoCapture of a 50 fps stream, frames are filled
+    with their number
+    """
+    def __init__(self):
+        self.grabbed = 0
+
+    def grab(self):
+        time.sleep(0.02)
+        self.grabbed += 1
+        return True
+
+    def retrieve(self,image=None):
+        if image is None:
+            image = np.empty((2,2,3),dtype=np.uint8)
+        image[...] = self.grabbed % 256
+        return True,image
+
+def test_grabber_reads_the_latest_frame():
+    logging.info("Launching test_grabber_reads_the_latest_frame")
+    camera = Camera()
+    grabber = LatestFrameGrabber(camera)
+    hasFrame,frame = grabber.read(1)
+    assert hasFrame
+    # frames keep being grabbed while the previous one is processed
+    time.sleep(0.3)
+    hasFrame,frame = grabber.read(1)
+    grabber.close()
+    assert hasFrame
+    assert camera.grabbed - 2 <= frame[0,0,0] <= camera.grabbed
+    assert frame[0,0,0] >= 10
+
+def test_multi_stream_source_tags_frames_with_their_stream(tmp_path):
+    logging.info("Launching test_multi_stream_source_tags_frames_with_their_stream")
+    first = make_video(str(tmp_path/"first.mp4"),nframes=20,width=64,height=48)
+    second = make_video(str(tmp_path/"second.mp4"),nframes=30,width=64,height=48,seed=1)
+    source = MultiStreamSource("cameras",[{"id": "first","filename": first},
+        {"id": "second","filename": second,"sample_every": 3}],sample_every=2,length=-1)
+    frames = list(source.frames())
+    by_stream = {}
+    for f in frames:
+        by_stream.setdefault(f.stream,[]).append(f.framestamp)
+    assert by_stream == {"first": list(range(10)),"second": list(range(10))}
+
+def test_paced_pipe_is_read_in_bgr_without_sleeping(tmp_path):
+    logging.info("Launching test_paced_pipe_is_read_in_bgr_without_sleeping")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=4,width=426,height=240)
+    capture = cv2.VideoCapture(filename)
+    expected = [capture.read()[1] for _ in range(4)]
+    capture.release()
+    source = YoutubeSource("youtube","url",resolution="240p",sample_every=5,length=60)
+    # in place of the paced stream, opening keeps it
+    source._streamer = create_video_pipe(filename,pix_fmt="bgr24")
+    started = time.time()
+    frames = [f.frame_bgr.copy() for f in source.frames()]
+    source.close()
+    # paced by the pipe only, not by 5 seconds between frames
+    assert time.time() - started < 5
+    assert len(frames) == 4
+    for frame,bgr in zip(frames,expected):
+        assert np.abs(frame.astype(int) - bgr).mean() < 8
@@ -0,0 +1,171 @@
+from ..analysis.node.source.video import VideoFileSource
+from ..analysis.node.source.ffmpeg import parse_keyframes
+from ..analysis.node.source.shared import slot_handle
+from ..benchmarks.video import make_video
+import numpy as np
+import cv2
+import logging
+import shutil
+import importlib
+import pytest
+
+
+def sampled(filename,sample_every,gop_size):
+    source = VideoFileSource("video",filename,sample_every,gop_size=gop_size)
+    frames = [(f.timestamp,f.frame.copy()) for f in source.frames()]
+    source.close()
+    return frames
+
+def test_grabbing_and_seeking_sample_the_same_frames(tmp_path):
+    logging.info("Launching test_grabbing_and_seeking_sample_the_same_frames")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=60,width=160,height=96)
+    for sample_every in [1,3,7]:
+        grabbed = sampled(filename,sample_every,gop_size=1000)
+        seeked = sampled(filename,sample_every,gop_size=1)
+        assert [s for s,_ in grabbed] == list(range(0,60,sample_every))
+        assert [s for s,_ in grabbed] == [s for s,_ in seeked]
+        for (_,g),(_,s) in zip(grabbed,seeked):
+            assert np.array_equal(g,s)
+
+# ffprobe -v quiet -select_streams v:0 -show_entries packet=pts_time,flags
+# -of csv=p=0 of a 25fps x264 mp4 with B-frames and 12 frames keyframe
+# interval: packets in decoding order, pts shifted by the B-frame delay,
+# a packet without pts
+FFPROBE_PACKETS = """0.080000,K__
+0.200000,___
+0.120000,___
+0.160000,___
+0.320000,___
+0.240000,___
+0.280000,___
+0.440000,___
+0.360000,___
+0.400000,___
+0.520000,___
+0.480000,___
+0.560000,K__
+0.680000,___
+0.600000,___
+0.640000,___
+N/A,___
+1.040000,K__
+0.920000,___
+"""
+
+def test_keyframes_are_parsed_from_ffprobe_packets():
+    logging.info("Launching test_keyframes_are_parsed_from_ffprobe_packets")
+    assert parse_keyframes(FFPROBE_PACKETS) == pytest.approx([0,0.48,0.96])
+    # older ffprobe print two flags
+    assert parse_keyframes(FFPROBE_PACKETS.replace("__\n","_\n")) == pytest.approx([0,0.48,0.96])
+    assert parse_keyframes("") == []
+
+@pytest.mark.skipif(shutil.which("ffprobe") is None,reason="needs ffmpeg and ffprobe")
+def test_keyframes_only_are_timestamped_with_their_index(tmp_path):
+    logging.info("Launching test_keyframes_only_are_timestamped_with_their_index")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=60,width=160,height=96)
+    every = dict(sampled(filename,1,gop_size=1000))
+    source = VideoFileSource("video",filename,20,keyframes_only=True)
+    keyframes = [(f.framestamp,f.timestamp,f.frame.copy()) for f in source.frames()]
+    source.close()
+    assert len(keyframes) > 1
+    assert [c for c,_,_ in keyframes] == list(range(len(keyframes)))
+    for (_,t,_),(_,next_t,_) in zip(keyframes,keyframes[1:]):
+        assert next_t - t >= 20
+    for _,t,frame in keyframes:
+        # decoded by ffmpeg instead of opencv
+        assert np.abs(frame.astype(int) - every[t]).mean() < 2
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None,reason="needs ffmpeg")
+def test_frames_decoded_at_size_are_the_sampled_frames(tmp_path):
+    logging.info("Launching test_frames_decoded_at_size_are_the_sampled_frames")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=60,width=160,height=96)
+    every = dict(sampled(filename,1,gop_size=1000))
+    source = VideoFileSource("video",filename,7,size="80,48")
+    frames = [(f.timestamp,f.frame.copy()) for f in source.frames()]
+    source.close()
+    assert (source.width,source.height) == (80,48)
+    assert [t for t,_ in frames] == list(range(0,60,7))
+    for t,frame in frames:
+        assert frame.shape == (48,80,3)
+        expected = cv2.resize(every[t],(80,48),interpolation=cv2.INTER_AREA)
+        assert np.abs(frame.astype(int) - expected).mean() < 8
+
+def test_segments_decoded_in_parallel_come_in_order(tmp_path):
+    logging.info("Launching test_segments_decoded_in_parallel_come_in_order")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=60,width=160,height=96)
+    every = dict(sampled(filename,1,gop_size=1000))
+    for sample_every in [1,3]:
+        source = VideoFileSource("video",filename,sample_every,gop_size=12,workers=3)
+        frames = [(f.framestamp,f.timestamp,f.frame.copy(),slot_handle(f.frame)) for f in source.frames()]
+        # a segment by GOP, starting at a sample
+        starts = [start for start,_ in source.segments()]
+        source.close()
+        assert starts == [0,12,24,36,48]
+        assert [c for c,_,_,_ in frames] == list(range(len(frames)))
+        assert [t for _,t,_,_ in frames] == list(range(0,60,sample_every))
+        for _,t,frame,handle in frames:
+            assert np.array_equal(frame,every[t])
+            # written by the workers in the ring of the source
+            assert handle is not None
+
+def test_segments_longer_than_the_parallel_ring_are_cut(tmp_path,monkeypatch):
+    logging.info("Launching test_segments_longer_than_the_parallel_ring_are_cut")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=30,width=160,height=96)
+    every = dict(sampled(filename,1,gop_size=1000))
+    # a ring of 5 frames, GOPs of 12
+    monkeypatch.setattr(VideoFileSource,"PARALLEL_RING_BYTES",5*160*96*3)
+    source = VideoFileSource("video",filename,1,gop_size=12,workers=2)
+    frames = [(f.timestamp,f.frame.copy()) for f in source.frames()]
+    assert source._ring.nslots == 5
+    source.close()
+    assert [t for t,_ in frames] == list(range(30))
+    for t,frame in frames:
+        assert np.array_equal(frame,every[t])
+
+def test_motion_vectors_score_moving_zones(tmp_path):
+    logging.info("Launching test_motion_vectors_score_moving_zones")
+    pytest.importorskip("av")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=30,width=320,height=192)
+    # the whole frame and a zone off the frame, where nothing moves
+    zones = [[[0,0],[319,0],[319,191],[0,191]],[[400,400],[500,400],[500,500]]]
+    source = VideoFileSource("video",filename,5,motion_vectors=True,motion_zones=zones)
+    frames = list(source.frames())
+    source.close()
+    assert [f.timestamp for f in frames] == list(range(0,30,5))
+    assert frames[0].frame.shape == (192,320,3)
+    moving = frames[1:]
+    assert all(f.motion > 0 for f in moving)
+    assert all(f.zone_motion[0] > 0 and f.zone_motion[1] == 0 for f in moving)
+    # nothing is converted below the threshold, except the first frame
+    source = VideoFileSource("video",filename,5,motion_vectors=True,motion_threshold=1e9)
+    assert [f.timestamp for f in source.frames()] == [0]
+    source.close()
+
+def test_size_is_applied_or_refused_on_every_path(tmp_path):
+    logging.info("Launching test_size_is_applied_or_refused_on_every_path")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=10,width=320,height=192)
+    if importlib.util.find_spec("av") is not None:
+        source = VideoFileSource("video",filename,5,motion_vectors=True,size="160,96")
+        assert [f.frame.shape for f in source.frames()] == [(96,160,3)]*2
+        source.close()
+    with pytest.raises(ValueError):
+        VideoFileSource("video",filename,5,workers=2,size="160,96")
+    with pytest.raises(ValueError):
+        VideoFileSource("video",filename,5,workers=2,keyframes_only=True)
+    with pytest.raises(ValueError):
+        VideoFileSource("video",filename,5,workers=2,motion_vectors=True)
+
+def test_frames_convert_their_colors_once_when_read(tmp_path):
+    logging.info("Launching test_frames_convert_their_colors_once_when_read")
+    filename = make_video(str(tmp_path/"video.mp4"),nframes=6,width=160,height=96)
+    source = VideoFileSource("video",filename,1)
+    frame = next(source.frames())
+    source.close()
+    # decoded in BGR, RGB is only converted when read
+    assert frame._frame is None
+    rgb = frame.frame
+    assert np.array_equal(rgb,cv2.cvtColor(frame.frame_bgr,cv2.COLOR_BGR2RGB))
+    assert frame.frame is rgb
+    frame.set_frame(np.zeros_like(rgb))
+    assert frame._frame_bgr is None
+    assert not frame.frame_bgr.any()
@@ -0,0 +1,172 @@
+from ..analysis.node.node import Node
+from ..analysis.workflow.workflow import Workflow, WorkflowFactory
+from ..analysis.workflow.utils import topological_order
+from ..analysis.node.ai.detection import FalcoeyeDetection
+from ..analysis.node.source.source import FalcoeyeFrame
+from ..analysis.node.agg.spatial import ZonesCounter, ZoneCounter
+from ..analysis.node.controller import SequenceRunner
+from ..analysis.node.output.csv import CSVWriter
+from ..analysis.node.output.image import ImageWriter
+from ..analysis.node.output.finalize import Finalizer
+import numpy as np
+import pandas as pd
+import logging
+import threading
+import time
+import json
+import pytest
+
+
+class Counter(Node):
+    def __init__(self,name,n):
+        Node.__init__(self,name)
+        self._n = n
+
+    def frames(self):
+        for i in range(self._n):
+            yield i
+
+    def run(self):
+        for i in self.frames():
+            self.sink(i)
+
+class Doubler(Node):
+    stateless = True
+
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.peak = 0
+
+    def run(self):
+        self.peak = max(self.peak,self._data.qsize())
+        while self.more():
+            self.sink(self.run_on(self.get()))
+
+    def run_on(self,item):
+        return item*2
+
+class Collector(Node):
+    def __init__(self,name):
+        Node.__init__(self,name)
+        self.items = []
+        self.closed_with = None
+
+    def run(self):
+        while self.more():
+            self.items.append(self.get())
+
+    def close(self):
+        self.closed_with = len(self.items) + self._data.qsize()
+        Node.close(self)
+
+def test_topological_order_keeps_ties_in_place():
+    logging.info("Launching test_topological_order_keeps_ties_in_place")
+    names = ["writer","source","model","filter"]
+    edges = [["source","model"],["model","filter"],["filter","writer"]]
+    assert topological_order(names,edges) == ["source","model","filter","writer"]
+    assert topological_order(["a","b","c"],[["a","c"]]) == ["a","b","c"]
+
+def test_topological_order_ignores_members():
+    logging.info("Launching test_topological_order_ignores_members")
+    edges = [["source","runner"],["inner","writer"]]
+    assert topological_order(["writer","runner","source"],edges) == ["writer","source","runner"]
+
+def test_topological_order_rejects_cycles():
+    logging.info("Launching test_topological_order_rejects_cycles")
+    with pytest.raises(ValueError):
+        topological_order(["a","b"],[["a","b"],["b","a"]])
+
+def test_run_streaming_in_micro_batches():
+    logging.info("Launching test_run_streaming_in_micro_batches")
+    source = Counter("source",7)
+    doubler = Doubler("doubler")
+    collector = Collector("collector")
+    source.add_sink(doubler)
+    doubler.add_sink(collector)
+    nodes = {n.name: n for n in [source,doubler,collector]}
+    workflow = Workflow("streaming",nodes,[source],[source,doubler,collector],micro_batch=3)
+    workflow.run_streaming()
+    assert workflow.wait(0)
+    assert collector.items == [0,2,4,6,8,10,12]
+    assert doubler.peak <= 3
+    # everything upstream was flushed before the collector was closed
+    assert collector.closed_with == 7
+
+class Detections(Node):
+    def __init__(self,name,n):
+        Node.__init__(self,name)
+        self._n = n
+
+    def frames(self):
+        for i in range(self._n):
+            frame = FalcoeyeFrame(np.full((36,64,3),i,dtype=np.uint8),i,i,"frame")
+            yield FalcoeyeDetection(frame,[[0.1,0.1,0.2,0.2]]*i,[1]*i,[0]*i,("fish",))
+
+def test_run_streaming_finishes_outputs_once(tmp_path):
+    logging.info("Launching test_run_streaming_finishes_outputs_once")
+    prefix = str(tmp_path)
+    nodes = [Detections("source",5),ZonesCounter("zones","left:0,0,31,0,31,35,0,35;right:32,0,63,0,63,35,32,35",["fish"]),
+        CSVWriter("counts",prefix),ImageWriter("images",f"{prefix}/images"),Finalizer("finalizer",prefix)]
+    source,zones,counts,images,finalizer = nodes
+    wire({n.name: n for n in nodes},[["source","zones"],["zones","counts"],["source","images"]])
+    workflow = Workflow("streaming_outputs",{n.name: n for n in nodes},[source],nodes,micro_batch=2)
+    workflow.run_streaming()
+    assert workflow.wait(0)
+    # one table for the whole video, not one per micro batch
+    assert counts.metrics.snapshot()["items_in"] == 1
+    df = pd.read_csv(tmp_path/"counts.csv")
+    assert df["Zone"].tolist() == ["left","right"]*5
+    assert df.groupby("Zone")["fish"].sum().to_dict() == {"left": 10,"right": 0}
+    with open(tmp_path/"images"/"images_meta.json") as f:
+        assert sorted(json.load(f)["filenames"]) == [f"{i}.jpg" for i in range(5)]
+    with open(tmp_path/"meta.json") as f:
+        assert json.load(f) == {"type": "csv","filename": "counts.csv","x-axis": "","y-axis": ""}
+
+def test_async_runner_writes_counts_before_close(tmp_path):
+    logging.info("Launching test_async_runner_writes_counts_before_close")
+    counter = ZoneCounter("async_counter",[[0,0],[63,0],[63,35],[0,35]],["fish"])
+    writer = CSVWriter("async_counts",str(tmp_path))
+    counter.add_sink(writer)
+    runner = SequenceRunner("async_runner",[counter,writer],frequency=2)
+    done = threading.Event()
+    runner.run_async(lambda name: done.set(),lambda name,error: None)
+    for item in Detections("source",4).frames():
+        runner.put(item)
+    # a partial table every frequency items, as for a live stream
+    deadline = time.time() + 10
+    while not (tmp_path/"async_counts.csv").exists() and time.time() < deadline:
+        time.sleep(0.01)
+    assert (tmp_path/"async_counts.csv").exists()
+    assert len(counter._table) < 4
+    runner.close()
+    assert done.wait(10)
+    assert pd.read_csv(tmp_path/"async_counts.csv")["fish"].tolist() == [0,1,2,3]
+
+def wire(nodes,edges):
+    for f,t in edges:
+        nodes[f].add_sink(nodes[t])
+
+def test_fuse_linear_chain():
+    logging.info("Launching test_fuse_linear_chain")
+    nodes = {n.name: n for n in [Counter("source",3),Doubler("a"),Doubler("b"),Collector("collector")]}
+    edges = [["source","a"],["a","b"],["b","collector"]]
+    wire(nodes,edges)
+    run_order = WorkflowFactory.fuse(nodes,edges,{},["source","a","b","collector"])
+    assert run_order == ["source","a+b","collector"]
+    assert nodes["source"]._sinks == [nodes["a+b"]]
+    workflow = Workflow("fused",nodes,[nodes["source"]],[nodes[n] for n in run_order])
+    workflow.run_sequentially()
+    assert nodes["collector"].items == [0,4,8]
+
+def test_fuse_stops_at_fan_out_and_members():
+    logging.info("Launching test_fuse_stops_at_fan_out_and_members")
+    nodes = {n.name: n for n in [Counter("source",3),Doubler("a"),Doubler("b"),
+        Doubler("c"),Doubler("d"),Collector("collector")]}
+    edges = [["source","a"],["a","b"],["a","c"],["b","d"],["c","d"],["d","collector"]]
+    wire(nodes,edges)
+    order = ["source","a","b","c","d","collector"]
+    assert WorkflowFactory.fuse(nodes,edges,{},order) == order
+    # owned by another node, e.g. a valve
+    nodes = {n.name: n for n in [Doubler("a"),Doubler("b")]}
+    wire(nodes,[["a","b"]])
+    assert WorkflowFactory.fuse(nodes,[["a","b"]],{"b":"valve"},["a","b"]) == ["a","b"]